@@ -329,7 +329,7 @@ class Database(ABC):
         self.missing_values[tag] = get_missing_values(df, self.heuristic)
 
     @staticmethod
-    def _encode_df(df, mv, types, order=None, encode=None):
+    def _encode_df(df, mv, types, order=None, encode=None, encodings=None):
         logger.info(f'Encode mode: {encode}')
 
         common_features = [f for f in df.columns if f in types.index]
@@ -395,16 +395,16 @@ class Database(ABC):
 
         # Ordinal encode
         logger.info('Encoding: Ordinal encode.')
-        splitted_df, splitted_mv = ordinal_encode(splitted_df, splitted_mv, keys=to_ordinal_encode_ids, order=order)
+        splitted_df, splitted_mv = ordinal_encode(splitted_df, splitted_mv, keys=to_ordinal_encode_ids, order=order, encodings=encodings)
 
         # One hot encode
         logger.info('Encoding: One hot encode.')
-        splitted_df, splitted_mv, splitted_types, splitted_parent = one_hot_encode(splitted_df, splitted_mv, splitted_types, splitted_parent, keys=to_one_hot_encode_ids)
+        splitted_df, splitted_mv, splitted_types, splitted_parent = one_hot_encode(splitted_df, splitted_mv, splitted_types, splitted_parent, keys=to_one_hot_encode_ids, encodings=encodings)
 
         # Date encode
         logger.info('Encoding: Date encode.')
         splitted_df, splitted_mv, splitted_types, splitted_parent = date_encode(splitted_df, splitted_mv, splitted_types, splitted_parent, keys=to_date_encode_exp, method='explode', dayfirst=True)
-        splitted_df, splitted_mv, splitted_types, splitted_parent = date_encode(splitted_df, splitted_mv, splitted_types, splitted_parent, keys=to_date_encode_tim, method='timestamp', dayfirst=True)
+        splitted_df, splitted_mv, splitted_types, splitted_parent = date_encode(splitted_df, splitted_mv, splitted_types, splitted_parent, keys=to_date_encode_tim, method='timestamp', dayfirst=True, encodings=encodings)
 
         logger.info('Encoding: Fill missing values.')
         splitted_mv_bool = {k: mv != NOT_MISSING for k, mv in splitted_mv.items()}
@@ -1,9 +1,10 @@
-from argparse import Namespace
 from itertools import product
 
 from joblib import Parallel, delayed
 
-import prediction
+from prediction.SplitStore import SplitStore
+from prediction.strategies import strategies
+from prediction.tasks import tasks as task_accessor
 
 
 def run(args):
@@ -24,22 +25,21 @@ def run(args):
         'NHIS/income_pvals',
     ]
 
-    def run_one(task, T):
-        argv = {
-            'action': 'prediction',
-            'task_name': task,
-            'strategy_name': '0',
-            'T': str(T),
-            'RS': '0',
-            'dump_idx_only': True,
-            'n_top_pvals': 100,
-        }
+    strategy = list(strategies.values())[0]
 
+    def run_one(tag, T):
         # Only one trial for task having features manually selected (not _pvals)
-        if '_pvals' not in task and T != 0:
+        if '_pvals' not in tag and T != 0:
             return
 
-        args = Namespace(**argv)
-        prediction.run(args)
+        task = task_accessor.get(tag, n_top_pvals=100, RS=0, T=T)
+        store = SplitStore(task, RS=0, T=T)
+
+        # Checks the stored splits and adds the missing sizes, reusing the
+        # valid ones
+        store.generate(strategy.train_set_steps, strategy.n_splits,
+                       strategy.min_test_set)
+
+        store.export_all_csv('ids/')
 
     Parallel(n_jobs=-1)(delayed(run_one)(task, T) for task, T in product(tasks, range(5)))
@@ -41,9 +41,14 @@ def _df_type_handler(function, df_seq, keys=None, **kwargs):
     return function(*df_seq, **kwargs)
 
 
-def ordinal_encode(df, mv, keys=None, order=None):
+def _fitted_categories(df, encodings):
+    """Categories of the features of df, the fitted ones when in encodings."""
+    return [encodings.get(f, np.unique(df[f].values)) for f in df.columns]
 
-    def encode(df, mv, order=None):
+
+def ordinal_encode(df, mv, keys=None, order=None, encodings=None):
+
+    def encode(df, mv, order=None, encodings=None):
         categories = 'auto'
 
         if order is not None:
@@ -58,31 +63,45 @@ def ordinal_encode(df, mv, keys=None, order=None):
                     feature_order = list(np.unique(df[feature_name].values))
                 categories.append(feature_order)
 
-        enc = OrdinalEncoder(categories=categories)
-
         df = fill_df(df, mv != NOT_MISSING, MV_PLACEHOLDER)
 
         # Cast to str to prevent: "Found unknown categories ..." error
         # which occurs when float but order file is str
         df = df.astype(str)
 
+        if encodings is not None and encodings.keys() & set(df.columns):
+            # Categories fitted on the training rows, unknown ones set to NaN
+            if categories == 'auto':
+                categories = _fitted_categories(df, encodings)
+            else:
+                categories = [encodings.get(f, c)
+                              for f, c in zip(df.columns, categories)]
+            enc = OrdinalEncoder(categories=categories,
+                                 handle_unknown='use_encoded_value',
+                                 unknown_value=np.nan)
+        else:
+            enc = OrdinalEncoder(categories=categories)
+
         # Fit transform the encoder
         data_encoded = enc.fit_transform(df)
         df = fill_df(df, mv != NOT_MISSING, np.nan)
 
+        if encodings is not None:
+            for feature_name, c in zip(df.columns, enc.categories_):
+                encodings.setdefault(feature_name, list(c))
+
         df_encoded = pd.DataFrame(data_encoded,
                                   index=df.index, columns=df.columns)
 
         return df_encoded, mv
 
-    return _df_type_handler(encode, (df, mv), keys, order=order)
-
+    return _df_type_handler(encode, (df, mv), keys, order=order,
+                            encodings=encodings)
 
-def one_hot_encode(df, mv, types, parent, keys=None):
 
-    def encode(df, mv, types, parent):
-        enc = OneHotEncoder(sparse=False)
+def one_hot_encode(df, mv, types, parent, keys=None, encodings=None):
 
+    def encode(df, mv, types, parent, encodings=None):
         # Cast to str to prevent: "argument must be a string or number" error
         # which occurs when mixed types floats and str
         df = df.astype(str)
@@ -90,9 +109,21 @@ def one_hot_encode(df, mv, types, parent, keys=None):
         # Fill missing values with a placeholder
         df = fill_df(df, mv != NOT_MISSING, MV_PLACEHOLDER)
 
+        if encodings is not None and encodings.keys() & set(df.columns):
+            # Categories fitted on the training rows, unknown ones ignored
+            enc = OneHotEncoder(sparse=False,
+                                categories=_fitted_categories(df, encodings),
+                                handle_unknown='ignore')
+        else:
+            enc = OneHotEncoder(sparse=False)
+
         # Fit transform the encoder
         data_encoded = enc.fit_transform(df)
 
+        if encodings is not None:
+            for feature_name, c in zip(df.columns, enc.categories_):
+                encodings.setdefault(feature_name, list(c))
+
         df = fill_df(df, mv != NOT_MISSING, np.nan)
 
         feature_names = list(enc.get_feature_names(list(df.columns)))
@@ -116,12 +147,15 @@ def one_hot_encode(df, mv, types, parent, keys=None):
 
         return df_encoded, mv_encoded, types_encoded, parent
 
-    return _df_type_handler(encode, (df, mv, types, parent), keys=keys)
+    return _df_type_handler(encode, (df, mv, types, parent), keys=keys,
+                            encodings=encodings)
 
 
-def date_encode(df, mv, types, parent, keys=None, method='timestamp', dayfirst=False):
+def date_encode(df, mv, types, parent, keys=None, method='timestamp', dayfirst=False,
+                encodings=None):
 
-    def encode(df, mv, types, parent, method='timestamp', dayfirst=False):
+    def encode(df, mv, types, parent, method='timestamp', dayfirst=False,
+               encodings=None):
         df = fill_df(df, mv != NOT_MISSING, np.nan)
 
         if method == 'timestamp':
@@ -130,6 +164,9 @@ def date_encode(df, mv, types, parent, keys=None, method='timestamp', dayfirst=F
             for feature_name in df.columns:
                 dt_series = pd.to_datetime(df[feature_name], dayfirst=dayfirst)
                 dt_min = np.datetime64(dt_series.min())
+                if encodings is not None:
+                    # Origin fitted on the training rows
+                    dt_min = np.datetime64(encodings.setdefault(feature_name, str(dt_min)))
                 tdt = np.timedelta64(1, 'D')
                 data[feature_name] = np.subtract(dt_series.values, dt_min)/tdt
 
@@ -164,4 +201,4 @@ def date_encode(df, mv, types, parent, keys=None, method='timestamp', dayfirst=F
         return df_encoded, mv_encoded, types_encoded, parent
 
     return _df_type_handler(encode, (df, mv, types, parent), keys=keys, method=method,
-                            dayfirst=dayfirst)
+                            dayfirst=dayfirst, encodings=encodings)
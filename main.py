@@ -1,16 +1,21 @@
 """Main script. Configure logger and argparser. Launch scripts"""
 import os
 import argparse
+import importlib
 import logging
 import time
 
-import prediction
-import selection
-import statistics
-import pvals
-import whatsavailable
-import whosmissing
-import dump_ids
+
+def lazy(module, func):
+    """Return a script importing its module only when run.
+
+    The modules of the scripts are heavy to import, so that each subcommand
+    imports only the one it runs.
+    """
+    def run(args):
+        return getattr(importlib.import_module(module), func)(args)
+
+    return run
 
 
 if __name__ == '__main__':
@@ -36,7 +41,7 @@ if __name__ == '__main__':
     # Script 1: Compute pvals for feature selection with ANOVA
     p = subparsers.add_parser('select', description='Compute p-values for '
                               'feature selection with ANOVA')
-    p.set_defaults(func=selection.run)
+    p.set_defaults(func=lazy('selection', 'run'))
     p.add_argument('task_name', nargs='?', default=None)
     p.add_argument('--RS', dest='RS', default=0, nargs='?',
                    help='The random state to use.')
@@ -47,12 +52,12 @@ if __name__ == '__main__':
 
     # Script 2: Filter p-values
     p = subparsers.add_parser('filter', description='Filter all p-values.')
-    p.set_defaults(func=pvals.filter)
+    p.set_defaults(func=lazy('pvals', 'filter'))
 
     # Script 3: Run experiments
     p = subparsers.add_parser('predict', description='Launch experiment for '
                               '1 task, 1 method and 1 trial.')
-    p.set_defaults(func=prediction.run)
+    p.set_defaults(func=lazy('prediction', 'run'))
     p.add_argument('task_name', default=None, help='Name of the '
                    'task.')
     p.add_argument('strategy_name', default=None, help='Name or id of the '
@@ -70,19 +75,62 @@ if __name__ == '__main__':
     p.add_argument('--npermutation', type=int, default=None, dest='n_permutation')
     p.add_argument('--fold', type=int, default=None, dest='asked_fold')
     p.add_argument('--out', type=str, default=None, dest='results_folder')
+    p.add_argument('--bench', type=bool, default=False, const=True, nargs='?',
+                   help='Benchmark the inference on the test set.')
+    p.add_argument('--save-model', type=bool, default=False, const=True,
+                   nargs='?', dest='save_model',
+                   help='Dump the fitted estimator of each fold.')
+    p.add_argument('--backend', type=str, choices=['csv', 'sqlite'],
+                   default='csv', dest='backend',
+                   help='Dump results in csv files or in a SQLite database.')
+    p.add_argument('--binary', type=bool, default=False, const=True, nargs='?',
+                   help='Dump predictions and probas in compressed binary '
+                   'files instead of csv.')
+    p.add_argument('--keep-versions', type=int, default=5, dest='keep_versions',
+                   help='Number of runs of the strategy kept in the results '
+                   'folder.')
+    p.add_argument('--run-id', type=str, default=None, dest='run_id',
+                   help='Name of the version of the results. Give the same '
+                   'to the processes dumping the folds of a run with --fold.')
+
+    # Script 3.1: Predict new rows with a saved model
+    p = subparsers.add_parser('predict-batch', description='Predict the rows '
+                              'of a csv with a model saved by predict.')
+    p.set_defaults(func=lazy('prediction', 'run_predict_batch'))
+    p.add_argument('model_path', help='Path of the saved model.')
+    p.add_argument('csv_path', help='Csv of the rows to predict, with the '
+                   'columns of the initial data frame of the task.')
+    p.add_argument('--out', type=str, default='predictions.csv', dest='out')
+    p.add_argument('--chunksize', type=int, default=10000, dest='chunksize')
+    p.add_argument('--n_top_pvals', dest='n_top_pvals', type=int,
+                   default=None, help='The # of features selected, overrides '
+                   'the one the model was trained with.')
 
     # Script 4: Aggregate results
     p = subparsers.add_parser('aggregate', description='Aggregate results.')
-    p.set_defaults(func=prediction.aggregate_results)
+    p.set_defaults(func=lazy('prediction', 'aggregate_results'))
     p.add_argument('--root', type=str, help='The root folder where the '
-                   'results are stored.', default='results/', dest='root_folder')
+                   'results are stored, or the path of a SQLite results '
+                   'database.', default='results/', dest='root_folder')
     p.add_argument('-n', type=int, default=None, dest='n')
     p.add_argument('--out', type=str, default='test_scores', dest='out')
+    p.add_argument('--inference', type=bool, default=False, const=True,
+                   nargs='?', help='Aggregate the inference benchmarks.')
+    p.add_argument('--rescan', type=bool, default=False, const=True,
+                   nargs='?', help='Rebuild the manifest of the results '
+                   'folder by walking it.')
+    p.add_argument('--n_jobs', type=int, default=-1, dest='n_jobs',
+                   help='Number of processes computing the scores.')
+    p.add_argument('--no-cache', action='store_false', dest='cache',
+                   help='Compute again the scores of all the methods.')
+    p.add_argument('--bootstrap', type=int, default=None, dest='bootstrap',
+                   help='Number of resamples of the bootstrap confidence '
+                   'intervals of the scores, not computed if not given.')
 
     # Script 5: Figures and tables of the paper
     p = subparsers.add_parser('figs', description='Build figure and tables '
                               'of the paper.')
-    p.set_defaults(func=statistics.run)
+    p.set_defaults(func=lazy('statistics', 'run'))
     subp = p.add_subparsers(dest='action')
     parent_l = argparse.ArgumentParser(add_help=False)
     parent_l.add_argument('--linear', dest='linear', default=False, const=True,
@@ -95,6 +143,9 @@ if __name__ == '__main__':
     parent_a.add_argument('-a', dest='article', default=False, const=True,
                           nargs='?',
                           help='Whether to dump in article folder.')
+    parent_a.add_argument('--force', type=bool, default=False, const=True,
+                          nargs='?', help='Whether to build again the '
+                          'figures and tables whose inputs did not change.')
 
     p = subp.add_parser('wilcoxon', parents=[parent_l, parent_csv, parent_a],
                         description='Wilcoxon test.')
@@ -123,6 +174,11 @@ if __name__ == '__main__':
     p = subp.add_parser('breakout', parents=[parent_l, parent_a],
                         description='Plot broken out boxplots scores & times.')
 
+    p = subp.add_parser('inference', parents=[parent_l, parent_csv, parent_a],
+                        description='Plot inference throughput & latency.')
+    p.add_argument('--file', type=str, default='scores/scores_inference.csv',
+                   dest='filepath', help='Aggregated inference benchmarks.')
+
     p = subp.add_parser('mi', parents=[parent_l, parent_a], description='Plot multiple imputation results.')
     p.add_argument('-n', type=int, default=None)
     p.add_argument('--bagging', type=bool, nargs='?', default=False, const=True, dest='bagging_only')
@@ -133,11 +189,18 @@ if __name__ == '__main__':
     p.add_argument('--no-avg', type=bool, nargs='?', default=True, const=False, dest='average_folds')
     p.add_argument('--mode', type=str, choices=['abs', 'rel', 'percent', 'ratio'], default='abs', dest='mode')
     p.add_argument('--task', type=bool, nargs='?', default=False, const=True, dest='hue_by_task')
+    p.add_argument('--n_jobs', type=int, default=-1, dest='n_jobs',
+                   help='Number of processes reading the importances.')
+
+    p = subp.add_parser('all', parents=[parent_a], description='Build all '
+                        'the figures and tables, loading the scores once.')
+    p.add_argument('--n_jobs', type=int, default=-1, dest='n_jobs',
+                   help='Number of processes rendering the figures.')
 
     # Script 6: Data statistics
     p = subparsers.add_parser('datastats', description='Build figures and '
                               'tables of the paper on data statistics.')
-    p.set_defaults(func=statistics.run)
+    p.set_defaults(func=lazy('statistics', 'run'))
     subp = p.add_subparsers(dest='action')
 
     p = subp.add_parser('mv', help='Missing values distributions.')
@@ -171,13 +234,13 @@ if __name__ == '__main__':
                    nargs='?', help='Get task info.')
     p.add_argument('-m', dest='method', type=bool, default=False, const=True,
                    nargs='?', help='Get method info.')
-    p.set_defaults(func=whatsavailable.run)
+    p.set_defaults(func=lazy('whatsavailable', 'run'))
     p = subp.add_parser('missing', description='Who is missing in scores.')
-    p.set_defaults(func=whosmissing.run)
+    p.set_defaults(func=lazy('whosmissing', 'run'))
 
     # Script 8: Dump IDs
     p = subparsers.add_parser('ids', description='Dump all IDs used.')
-    p.set_defaults(func=dump_ids.run)
+    p.set_defaults(func=lazy('dump_ids', 'run'))
 
     # Start run
     logger.info('Started run')
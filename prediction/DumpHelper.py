@@ -1,22 +1,38 @@
 """Class to dump task info and fit results into csv/yaml files."""
+import gzip
 import logging
 import os
+import re
 import shutil
+import time
 from datetime import datetime
+from io import BytesIO
 from os.path import join
 
 import numpy as np
 import pandas as pd
 import yaml
 
+from .file_utils import append_file, hold, in_use, locked, write_atomic
+from .Manifest import VERSIONS_FOLDER, Manifest
+from .persist import dump_model
+from .ResultsDB import FRAME_KINDS, ResultsDB
+
+
 # results_folder = 'results/'
 logger = logging.getLogger(__name__)
 
+# Column identifying the successive dumps of the folds in the csv files
+WRITE_ID = 'write_id'
+
+# Extension of the binary result files and results that can be binary
+BINARY_EXT = '.npy.gz'
+BINARY_RESULTS = ['prediction', 'probas']
+
 
 def _dump_yaml(data, filepath):
     data = listify(data)
-    with open(filepath, 'w') as file:
-        file.write(yaml.dump(data, allow_unicode=True))
+    write_atomic(filepath, yaml.dump(data, allow_unicode=True))
 
 
 def _dump_infos(item, filepath):
@@ -64,6 +80,91 @@ def listify(d):
         return d
 
 
+def binary_filepath(filepath):
+    """Path of the binary version of a csv result file."""
+    return re.sub(r'\.csv$', BINARY_EXT, filepath)
+
+
+def append_binary(filepath, df, fold=None):
+    """Append the frame of a fold to a compressed binary file.
+
+    Each dump is appended as a new gzip member containing np.save records:
+    the fold and write id, the index name and columns, the index and the
+    values as float32.
+    """
+    fold = -1 if fold is None else int(fold)
+    names = np.array([str(df.index.name or '')] + [str(c) for c in df.columns])
+    index = df.index.to_numpy()
+    if index.dtype == object:
+        index = index.astype(str)
+
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as file:
+        np.save(file, np.array([fold, time.time_ns()], dtype=np.int64))
+        np.save(file, names)
+        np.save(file, index)
+        np.save(file, df.to_numpy(dtype=np.float32))
+
+    with locked(os.path.dirname(filepath)):
+        append_file(filepath, buffer.getvalue())
+
+
+def read_binary(filepath):
+    """Read a binary file of appended folds as read_folds reads a csv."""
+    dfs = []
+    with gzip.open(filepath, 'rb') as file:
+        while file.peek(1):
+            (fold, write_id), names, index, values = (
+                np.load(file) for _ in range(4))
+            df = pd.DataFrame(values, columns=names[1:],
+                              index=pd.Index(index, name=names[0] or None))
+            df['fold'] = None if fold == -1 else fold
+            df[WRITE_ID] = write_id
+            dfs.append(df)
+
+    if not dfs:
+        raise pd.errors.EmptyDataError(f'No data in {filepath}.')
+
+    return pd.concat(dfs)
+
+
+def read_folds(filepath, **kwargs):
+    """Read a csv dumped fold by fold, keeping the last write of each fold.
+
+    Csv files are appended to at each dump, with a write id. When a fold is
+    dumped again, its previous rows are discarded here at read time. Files
+    without write id (dumped by a previous version) are returned as is.
+    If the csv does not exist but its binary version does, the binary file
+    is read instead and the kwargs are ignored.
+
+    Parameters
+    ----------
+    filepath : str
+        Path of the csv file.
+    **kwargs
+        Passed to pd.read_csv.
+
+    Returns
+    -------
+    pd.DataFrame
+
+    """
+    bin_filepath = binary_filepath(filepath)
+    if not os.path.exists(filepath) and os.path.exists(bin_filepath):
+        df = read_binary(bin_filepath)
+    else:
+        df = pd.read_csv(filepath, **kwargs)
+
+    if WRITE_ID not in df.columns:
+        return df
+
+    folds = df['fold'].astype(str)
+    last_write = df[WRITE_ID].groupby(folds).transform('max')
+    df = df[df[WRITE_ID] == last_write]
+
+    return df.drop(WRITE_ID, axis=1)
+
+
 def get_tag(RS, T):
     RS_tag = '' if RS is None else f'RS{RS}_'
     T_tag = '' if T is None else f'T{T}_'
@@ -73,13 +174,27 @@ def get_tag(RS, T):
 class DumpHelper:
     """Class used to dump prediction results."""
 
-    def __init__(self, task, strat, RS=None, T=None, n_bagging=None, results_folder=None):
+    def __init__(self, task, strat, RS=None, T=None, n_bagging=None, results_folder=None,
+                 backend='csv', binary=False, keep_versions=5, run_id=None):
         self.task = task
         self.strat = strat
         self.RS = RS
         self.T = T
         self.n_bagging = n_bagging
         self.results_folder = results_folder if results_folder is not None else 'results'
+        self.binary = binary  # Predictions and probas in binary files
+        self.keep_versions = keep_versions  # Runs kept per method, None: all
+        self._in_use = None  # Lock held on the version of the run
+
+        # Where to dump: csv and yml files in a directory tree or SQLite db
+        if backend not in ['csv', 'sqlite']:
+            raise ValueError(f'Unknown backend {backend}.')
+        self.store = None
+        self.manifest = None  # Index of the files of the results folder
+        if backend == 'sqlite':
+            self.store = ResultsDB(join(self.results_folder, 'results.sqlite'))
+        else:
+            self.manifest = Manifest(self.results_folder)
 
         # self.db_folder = f'{results_folder}{self.task.meta.db}/'
         self.db_folder = join(self.results_folder, self.task.meta.db)
@@ -90,12 +205,22 @@ class DumpHelper:
         self.task_folder = join(self.db_folder, self.task.meta.name)
         logger.info(f'Task folder: {self.task_folder}')
 
-        # self.backup_folder = f'{self.task_folder}backup/'
-        self.backup_folder = join(self.task_folder, 'backup')
+        # Processes dumping the folds of one run share its run id
+        if run_id is None:
+            time_tag = datetime.now().strftime("%Y-%m-%d_%H:%M:%S.%f")
+            run_id = f'{time_tag}_{os.getpid()}'
+        self.run_id = str(run_id)
 
+        self.method = ''
         if strat is not None:
             name = strat.name if n_bagging is None else f'{strat.name}_Bagged{self.n_bagging}'
-            self.strat_folder = join(self.task_folder, f'{tag}{name}')
+            self.method = f'{tag}{name}'
+            # Pointer to the latest run of the method, where results are read
+            self.method_folder = join(self.task_folder, self.method)
+            # Runs of the method, the results of this run are dumped in
+            # the strat folder
+            self.versions_folder = join(self.task_folder, VERSIONS_FOLDER, self.method)
+            self.strat_folder = join(self.versions_folder, self.run_id)
             logger.info(f'Strat folder: {self.strat_folder}')
 
         self._dump_infos()
@@ -103,20 +228,34 @@ class DumpHelper:
 
     def _dump_infos(self):
         """Dump the infos of the task and strategy used."""
-        if self.strat is not None:
-            # Check if task directory already exists
-            if os.path.isdir(self.strat_folder):
-                # Move it in the backup folder
-                os.makedirs(self.backup_folder, exist_ok=True)
-                time_tag = datetime.now().strftime("%Y-%m-%d_%H:%M:%S.%f")
-                dest = join(self.backup_folder, f'{self.strat.name}_{time_tag}')
-
-                # Move lead to error on next dumping so copy + delete
-                shutil.copytree(self.strat_folder, dest)
-                shutil.rmtree(self.strat_folder)
+        if self.store is not None:
+            db, task = self.task.meta.db, self.task.meta.name
+            if self.strat is not None:
+                # New run of the method: the results of the previous one are
+                # deleted, as a new version is linked in the directory tree
+                self.store.start_run(db, task, self.method, self.run_id)
+            self.store.put_infos(db, task, self.method, 'task_infos',
+                                 listify(self.task.get_infos()))
+            if self.strat is not None:
+                strat_infos = self.strat.get_infos()
+                strat_infos['n_bagging'] = self.n_bagging
+                self.store.put_infos(db, task, self.method, 'strat_infos',
+                                     listify(strat_infos))
+            return
 
-            # Create all necessary folders and ignore if already exist
-            os.makedirs(self.strat_folder, exist_ok=True)
+        if self.strat is not None:
+            # New version of the results of the method, previous ones are
+            # kept aside without copying anything. The version is held while
+            # this process runs so that it is not pruned by others.
+            with locked(join(self.task_folder, VERSIONS_FOLDER)):
+                os.makedirs(self.strat_folder, exist_ok=True)
+                self._in_use = hold(self.strat_folder)
+                # Already the latest if another process of the run linked it
+                if not self._is_latest():
+                    self._switch_latest()
+                    self.manifest.reset(self.task.meta.db, self.task.meta.name,
+                                        self.method)
+                self._prune_versions()
 
             # Update infos of the task if using bagging
             strat_infos = self.strat.get_infos()
@@ -126,20 +265,84 @@ class DumpHelper:
 
             _dump_yaml(self.task.get_infos(), join(self.strat_folder, 'task_infos.yml'))
             _dump_yaml(strat_infos, join(self.strat_folder, 'strat_infos.yml'))
+            self._record('task_infos.yml')
+            self._record('strat_infos.yml')
 
         else:
             # Create all necessary folders and ignore if already exist
             os.makedirs(self.task_folder, exist_ok=True)
 
             _dump_yaml(self.task.get_infos(), join(self.task_folder, 'task_infos.yml'))
+            self._record('task_infos.yml')
+
+    def _is_latest(self):
+        """Tell if the method folder points to the run."""
+        return (os.path.islink(self.method_folder) and
+                os.path.realpath(self.method_folder) == os.path.realpath(self.strat_folder))
+
+    def _switch_latest(self):
+        """Point the method folder to the run, atomically.
+
+        The method folder is a symlink to the run being dumped. A method
+        folder dumped by a previous version (a real directory) is moved among
+        the versions first.
+        """
+        if os.path.isdir(self.method_folder) and not os.path.islink(self.method_folder):
+            mtime = datetime.fromtimestamp(os.path.getmtime(self.method_folder))
+            time_tag = mtime.strftime("%Y-%m-%d_%H:%M:%S.%f")
+            os.rename(self.method_folder, join(self.versions_folder, f'{time_tag}_legacy'))
+
+        target = os.path.relpath(self.strat_folder, self.task_folder)
+        tmp_link = f'{self.method_folder}.{os.getpid()}.tmp'
+        os.symlink(target, tmp_link)
+        os.replace(tmp_link, self.method_folder)
+
+    def _prune_versions(self):
+        """Remove the oldest runs, keeping keep_versions of them.
+
+        Only the finished runs are removed: the latest one and the ones still
+        held by a process are kept.
+        """
+        if self.keep_versions is None:
+            return
+
+        # Sorted by last write, run ids being given by the user
+        versions = sorted(os.listdir(self.versions_folder),
+                          key=lambda v: os.path.getmtime(join(self.versions_folder, v)))
+        current = os.path.basename(self.strat_folder)
+        previous = [v for v in versions if v != current]
+        n_kept = max(self.keep_versions - 1, 0)  # The current one is kept
+
+        for version in previous[:len(previous)-n_kept]:
+            if in_use(join(self.versions_folder, version)):
+                continue
+            logger.info(f'Remove old version {version} of {self.method_folder}')
+            shutil.rmtree(join(self.versions_folder, version), ignore_errors=True)
 
     def _dump_features(self):
+        if self.store is not None:
+            self.store.put_infos(self.task.meta.db, self.task.meta.name,
+                                 self.method, 'features',
+                                 listify(list(self.task.X.columns)))
+            return
+
         filepath = join(self.strat_folder, 'features.yml')
         _dump_yaml(list(self.task.X.columns), filepath)
+        self._record('features.yml')
 
     def _filepath(self, filename):
         return join(self.strat_folder, filename)
 
+    def _record(self, filename):
+        """Record a file dumped in the strat folder in the manifest."""
+        if self.manifest is None:
+            return
+
+        folder = self.task_folder if self.strat is None else self.strat_folder
+        mtime = os.path.getmtime(join(folder, filename))
+        self.manifest.add(self.task.meta.db, self.task.meta.name, self.method,
+                          filename, mtime)
+
     @staticmethod
     def _load_content(filepath):
         """Used to load a yaml or csv file as dict or df respectively.
@@ -170,7 +373,10 @@ class DumpHelper:
             if not os.path.exists(filepath):
                 return pd.DataFrame()
             # If exists
-            return pd.read_csv(filepath, index_col=0, dtype=str)
+            try:
+                return read_folds(filepath, index_col=0)
+            except pd.errors.EmptyDataError:
+                return pd.DataFrame()
 
         else:
             raise ValueError(f'Extension {ext} not supported.')
@@ -183,8 +389,9 @@ class DumpHelper:
         been dumped for the same fold number, the newer one will replace it.
         To keep track of the fold number, the data is stored in a dict with
         fold number as key (if data is dict). If data is dataframe, an extra
-        fold columns is added and the dataframe is concatenated to the existing
-        after removing the existing data having the same fold number.
+        fold column and a write id column are added and the dataframe is
+        appended to the file. The rows of a fold dumped several times are
+        resolved when reading the file with read_folds.
 
         Parameters
         ----------
@@ -196,32 +403,78 @@ class DumpHelper:
             The fold number of the data.
 
         """
-        content = DumpHelper._load_content(filepath)
-
-        if isinstance(content, dict):
-            content[fold] = data
-            _dump_yaml(content, filepath)
-
-        elif isinstance(content, pd.DataFrame):
-            if not isinstance(data, pd.DataFrame):
-                raise ValueError('Dumping to csv require pandas df as data.')
-
-            # Remove previous results of same fold number
-            if not content.empty:
-                # Df is supposed to have fold column if not empty
-                content = content[content.fold != fold]
+        _, ext = os.path.splitext(filepath)
 
-            # Add new results
-            data = data.copy()
-            data['fold'] = fold
+        if ext != '.csv':
+            with locked(os.path.dirname(filepath)):
+                content = DumpHelper._load_content(filepath)
+                content[fold] = data
+                _dump_yaml(content, filepath)
+            return
+
+        if not isinstance(data, pd.DataFrame):
+            raise ValueError('Dumping to csv require pandas df as data.')
+
+        data = data.copy()
+        data['fold'] = fold
+        data[WRITE_ID] = time.time_ns()
+
+        # Processes dumping folds in the same file wait for each other
+        with locked(os.path.dirname(filepath)):
+            try:
+                columns = pd.read_csv(filepath, index_col=0, nrows=0).columns
+            except (FileNotFoundError, pd.errors.EmptyDataError):
+                write_atomic(filepath, data.to_csv())
+                return
+
+            if list(columns) == list(data.columns):
+                append_file(filepath, data.to_csv(header=False))
+                return
+
+            # Different layout, eg file dumped by a previous version: rewrite
+            content = DumpHelper._load_content(filepath)
+            content = content[content['fold'] != fold]
+            if WRITE_ID not in content.columns:
+                content[WRITE_ID] = 0
             content = pd.concat([content, data])
-
-            content.to_csv(filepath)
+            write_atomic(filepath, content.to_csv())
 
     def _dump(self, data, filename, fold=None):
         """Wraper to dump data (dict or df) in a file."""
+        if self.store is not None:
+            self._dump_store(data, filename, fold=fold)
+            return
+
         filepath = self._filepath(filename)
+
+        # Keep appending in the format of an existing file
+        name, ext = os.path.splitext(filename)
+        bin_filepath = binary_filepath(filepath)
+        if ext == '.csv' and (os.path.exists(bin_filepath) or (
+                self.binary and name.partition('_')[2] in BINARY_RESULTS
+                and not os.path.exists(filepath))):
+            append_binary(bin_filepath, data, fold=fold)
+            self._record(os.path.basename(bin_filepath))
+            return
+
         DumpHelper._append_fold(filepath, data, fold=fold)
+        self._record(filename)
+
+    def _dump_store(self, data, filename, fold=None):
+        """Dump data (dict or df) in the SQLite store."""
+        db, task = self.task.meta.db, self.task.meta.name
+        name, ext = os.path.splitext(filename)
+
+        if ext == '.csv':
+            size, _, kind = name.partition('_')
+            if kind not in FRAME_KINDS:
+                raise ValueError(f'{filename} not supported by the sqlite backend.')
+            self.store.put_frame(kind, db, task, self.method, size, self.T,
+                                 fold, data)
+        else:
+            content = self.store.get_infos(db, task, self.method, name) or dict()
+            content[fold] = data
+            self.store.put_infos(db, task, self.method, name, listify(content))
 
     def dump_prediction(self, y_pred, y_true, fold=None, tag=None):
         df = pd.DataFrame({
@@ -293,10 +546,10 @@ class DumpHelper:
         self._dump(learning_curve, 'learning_curve.yml', fold=fold)
 
     def dump_pvals(self, pvals):
-        pvals.to_csv(self.task_folder+'pvals.csv', header=False)
+        write_atomic(self.task_folder+'pvals.csv', pvals.to_csv(header=False))
 
     def dump_times(self, imputation_time, tuning_time, imputation_pt,
-                   tuning_pt, fold=None, tag=None):
+                   tuning_pt, fold=None, tag=None, profile=None):
         df = pd.DataFrame({
             'imputation_WCT': [imputation_time],
             'tuning_WCT': [tuning_time],
@@ -304,7 +557,30 @@ class DumpHelper:
             'tuning_PT': [tuning_pt],
         })
 
+        # Profile of the pipeline steps (perf_counter, thread time, peak RSS)
+        if profile is not None:
+            for k, v in profile.items():
+                df[k] = [None if v is None else round(v, 6)]
+
         if tag is None:
             tag = ''
 
         self._dump(df, f'{tag}_times.csv', fold=fold)
+
+    def dump_model(self, estimator, columns, fold=None, tag=None):
+        if tag is None:
+            tag = ''
+
+        filepath = join(self.strat_folder, 'models', f'{tag}_fold{fold}.joblib')
+        dump_model(estimator, columns, filepath, task=self.task.meta.tag,
+                   strategy=self.strat.name, RS=self.RS, T=self.T,
+                   n_bagging=self.n_bagging, size=tag, fold=fold,
+                   n_top_pvals=self.task.n_top_pvals,
+                   encodings=self.task.encodings)
+        self._record(f'models/{tag}_fold{fold}.joblib')
+
+    def dump_inference(self, df, fold=None, tag=None):
+        if tag is None:
+            tag = ''
+
+        self._dump(df, f'{tag}_inference.csv', fold=fold)
@@ -0,0 +1,54 @@
+"""Implement the FoldData class."""
+import numpy as np
+import pandas as pd
+
+
+class FoldData:
+    """Materialize the train and test sets of the folds from index arrays.
+
+    X is converted once to a contiguous float array. The rows of a fold are
+    then gathered with np.take into buffers that are reused by all the folds
+    having the same train and test sizes, instead of building new data frames
+    with X.iloc for each fold.
+    """
+
+    def __init__(self, X, y):
+        self.columns = X.columns
+        self.index = X.index
+        self.X = np.ascontiguousarray(
+            X.to_numpy(dtype=np.float64, na_value=np.nan))
+        self.y = y.to_numpy()
+        self.y_name = y.name
+        self._buffers = dict()
+
+    def _gather(self, key, idx):
+        """Gather the rows idx of X into the buffer associated to key."""
+        n_rows = len(idx)
+        buffer = self._buffers.get(key, None)
+
+        if buffer is None or buffer.shape[0] != n_rows:
+            buffer = np.empty((n_rows, self.X.shape[1]), dtype=self.X.dtype)
+            self._buffers[key] = buffer
+
+        np.take(self.X, idx, axis=0, out=buffer)
+
+        return buffer
+
+    def train(self, idx):
+        """Return X_train and y_train as arrays.
+
+        X_train is a view on a buffer overwritten by the next call.
+        """
+        return self._gather('train', idx), self.y[idx]
+
+    def test(self, idx):
+        """Return X_test as array and y_test as series indexed by the ids.
+
+        X_test is a view on a buffer overwritten by the next call.
+        """
+        y_test = pd.Series(self.y[idx], index=self.index[idx], name=self.y_name)
+        return self._gather('test', idx), y_test
+
+    def mv_props(self, X):
+        """Proportion of missing values of each feature of a gathered X."""
+        return pd.Series(np.isnan(X).mean(axis=0), index=self.columns)
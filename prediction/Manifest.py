@@ -0,0 +1,175 @@
+"""Implement the Manifest class."""
+import logging
+import os
+import re
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from .file_utils import (IN_USE_FILENAME, LOCK_FILENAME, append_file, locked,
+                         write_atomic)
+
+
+logger = logging.getLogger(__name__)
+
+# Folder of the task folders where the runs of the methods are versioned
+VERSIONS_FOLDER = 'versions'
+
+MANIFEST_FILENAME = 'manifest.csv'
+
+COLUMNS = ['op', 'db', 'task', 'method', 'filename', 'size', 'trial', 'mtime']
+
+
+def _size(filename):
+    """Train size of a result file named {size}_{kind}.csv, '' if none."""
+    size = filename.split('_')[0]
+    return size if size.isdigit() else ''
+
+
+def _trial(method):
+    """Trial of a method named RS{RS}_T{T}_{name}, '' if none."""
+    res = re.search(r'(?:^|_)T(\d+)_', method)
+    return '' if res is None else res.group(1)
+
+
+class Manifest:
+    """Index of the result files of a results folder.
+
+    Each file dumped in the results folder is recorded by a line appended to
+    the manifest csv at its root, with its db, task, method, size, trial and
+    modification time. A new run of a method appends a reset line (tombstone)
+    discarding the files of the previous run. Readers then list the results
+    from the manifest instead of walking the results folder.
+
+    A missing manifest is built by scanning the results folder once.
+    """
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        self.filepath = join(root_folder, MANIFEST_FILENAME)
+
+    @staticmethod
+    def _records(op, db, task, method, filenames, mtimes):
+        return pd.DataFrame({
+            'op': op,
+            'db': db,
+            'task': task,
+            'method': method,
+            'filename': filenames,
+            'size': [_size(f) for f in filenames],
+            'trial': _trial(method),
+            'mtime': mtimes,
+        }, columns=COLUMNS)
+
+    def _append(self, df):
+        with locked(self.root_folder):
+            if not os.path.exists(self.filepath):
+                self._build()
+            append_file(self.filepath, df.to_csv(index=False, header=False))
+
+    def add(self, db, task, method, filename, mtime):
+        """Record a file dumped in db/task/method/filename at time mtime."""
+        mtime = round(mtime, 6)
+        self._append(self._records('add', db, task, method, [filename], [mtime]))
+
+    def reset(self, db, task, method):
+        """Discard the files recorded for a method, eg when it is rerun."""
+        self._append(self._records('reset', db, task, method, [''], [np.nan]))
+
+    def scan(self):
+        """Return the records of the files found by walking the folder."""
+        dfs = []
+        for root, dirnames, filenames in os.walk(self.root_folder, followlinks=True):
+            # Only the latest versions, linked by the method folders
+            if VERSIONS_FOLDER in dirnames:
+                dirnames.remove(VERSIONS_FOLDER)
+
+            parts = os.path.relpath(root, self.root_folder).split(os.sep)
+            if len(parts) < 2 or parts[0] == '.':
+                continue
+
+            filenames = [f for f in filenames
+                         if f not in (LOCK_FILENAME, IN_USE_FILENAME)
+                         and not f.endswith('.tmp')]
+            if not filenames:
+                continue
+
+            db, task = parts[:2]
+            method = parts[2] if len(parts) > 2 else ''
+            prefix = '/'.join(parts[3:])
+            mtimes = [round(os.path.getmtime(join(root, f)), 6) for f in filenames]
+            filenames = [f'{prefix}/{f}' if prefix else f for f in filenames]
+            dfs.append(self._records('add', db, task, method, filenames, mtimes))
+
+        if not dfs:
+            return pd.DataFrame(columns=COLUMNS)
+
+        return pd.concat(dfs, ignore_index=True)
+
+    def _build(self):
+        logger.info(f'Build manifest {self.filepath}')
+        write_atomic(self.filepath, self.scan().to_csv(index=False))
+
+    def build(self):
+        """Build the manifest from a scan of the folder, replacing it."""
+        with locked(self.root_folder):
+            self._build()
+
+    def _read(self):
+        """Return all the records and the ones of the files in the folder."""
+        df = pd.read_csv(self.filepath, dtype=str, keep_default_na=False,
+                         on_bad_lines='skip')
+        df = df[df['op'].isin(['add', 'reset'])]
+
+        # Discard the files recorded before the last reset of their method
+        key = ['db', 'task', 'method']
+        order = pd.Series(np.arange(df.shape[0]), index=df.index)
+        last_reset = order.where(df['op'] == 'reset').groupby(
+            [df[k] for k in key]).transform('max').fillna(-1)
+        live = df[(df['op'] == 'add') & (order > last_reset)]
+
+        # Files dumped several times: keep the last record
+        live = live.drop_duplicates(key + ['filename'], keep='last')
+
+        return df, live
+
+    def load(self):
+        """Return the records of the files currently in the folder.
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns db, task, method, filename, size, trial and mtime.
+
+        """
+        if not os.path.exists(self.filepath):
+            try:
+                self.build()
+            except OSError:  # Eg read only results: scan without saving
+                logger.warning(f'Could not write manifest {self.filepath}.')
+                return self.scan().drop('op', axis=1)
+
+        df, live = self._read()
+
+        # Compact the manifest if mostly made of outdated records
+        if df.shape[0] > 2*live.shape[0] + 1000:
+            with locked(self.root_folder):
+                df, live = self._read()
+                write_atomic(self.filepath, live.to_csv(index=False))
+
+        live = live.drop('op', axis=1).reset_index(drop=True)
+        live['mtime'] = pd.to_numeric(live['mtime'])
+
+        return live
+
+    def mtimes(self):
+        """Map the relative paths db/task/method/filename to their mtime."""
+        df = self.load()
+        parts = df[['db', 'task', 'method', 'filename']].to_numpy()
+        paths = ['/'.join(p for p in row if p) for row in parts]
+        return dict(zip(paths, df['mtime']))
+
+    def paths(self):
+        """Return the relative paths db/task/method/filename of the files."""
+        return list(self.mtimes())
@@ -4,47 +4,62 @@ import re
 import shutil
 from decimal import Decimal
 
+import joblib
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import yaml
-from sklearn.metrics import r2_score, roc_auc_score
+from joblib import Parallel, delayed
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 from prediction.df_utils import aggregate, assert_equal, get_ranks_tab
+from prediction.DumpHelper import binary_filepath, read_folds
+from prediction.Manifest import Manifest
+from prediction.ResultsDB import ResultsDB
+from prediction.scoring import SCORERS, bootstrap_ci
+from prediction.TimerStep import PROFILE_COLUMNS
 
 
 class PlotHelper(object):
     """Plot the train4 results."""
 
-    def __init__(self, root_folder, rename={}, reference_method=None):
+    def __init__(self, root_folder, rename={}, reference_method=None,
+                 rescan=False, scores_filepath=None):
         """Init."""
         # Stepe 1: Check and register root_path
         root_folder = root_folder.rstrip('/')  # Remove trailing '/'
         self.root_folder = root_folder
         self._rename = rename
         self._reference_method = reference_method
-
-        if not os.path.isdir(self.root_folder):
+        self._reference_score = dict()  # Memoized scores of the reference
+        self._scores_filepath = scores_filepath  # Aggregated scores, if any
+        self._scores = None
+
+        # Results stored in a SQLite database instead of a directory tree
+        self._store = None
+        self._manifest = None
+        self._mtimes = None  # Modification time of the result files
+        if os.path.isfile(self.root_folder):
+            self._store = ResultsDB(self.root_folder)
+
+        elif not os.path.isdir(self.root_folder):
             raise ValueError(f'No dir at specified path: {self.root_folder}')
 
         # Step 2: Get the relative path of all subdirs in the structure
-        walk = os.walk(self.root_folder)
-
-        abs_dirpaths = []
-        abs_filepaths = []
-        for root, dirnames, filenames in walk:
-            if dirnames:
-                for dirname in dirnames:
-                    abs_dirpaths.append(f'{root}/{dirname}')
-            if filenames:
-                for filename in filenames:
-                    abs_filepaths.append(f'{root}/{filename}')
+        if self._store is not None:
+            rel_file_paths = self._store.listing()
+            rel_dir_paths = sorted({os.path.dirname(p) for p in rel_file_paths})
 
-        rel_dir_paths = [os.path.relpath(p, root_folder) for p in abs_dirpaths]
-        rel_file_paths = [os.path.relpath(p, root_folder) for p in abs_filepaths]
+        else:
+            # Files listed in the manifest, built by walking the folder once
+            self._manifest = Manifest(self.root_folder)
+            if rescan:
+                self._manifest.build()
+            self._mtimes = self._manifest.mtimes()
+            rel_file_paths = list(self._mtimes)
+            rel_dir_paths = sorted({os.path.dirname(p) for p in rel_file_paths})
 
         # Step 3.1: Convert relative paths to nested python dictionnary (dirs)
         nested_dir_dict = {}
@@ -66,23 +81,51 @@ class PlotHelper(object):
         self._nested_dir_dict = nested_dir_dict
         self._nested_file_dict = nested_file_dict
 
-        # Step 5: Compute scores for reference method
-        if self._reference_method:
-            self._reference_score = dict()
-            for size in self.existing_sizes():
-                scores_size = self._reference_score.get(size, dict())
-                for db in self.databases():
-                    scores = scores_size.get(db, dict())
-                    for t in self.tasks(db):
-                        score = None
-                        for m in self.availale_methods_by_size(db, t, size):
-                            if self._is_reference_method(m):
-                                score = self.score(db, t, m, size, mean=True)
-                                break
-                        scores[t] = score
-                    scores_size[db] = scores
-
-                self._reference_score[size] = scores_size
+    def _aggregated_scores(self):
+        """The scores dumped by dump, read once. None if not given."""
+        if self._scores is None and self._scores_filepath is not None:
+            if os.path.exists(self._scores_filepath):
+                self._scores = pd.read_csv(self._scores_filepath, index_col=0)
+        return self._scores
+
+    def reference_score(self, db, t, size):
+        """Mean score of the reference method on a given db, task, size.
+
+        Computed on first access and memoized. Read from the aggregated
+        scores if available, computed from the result files otherwise.
+
+        Returns
+        -------
+        tuple or None
+            (score, scorer name) as returned by score with mean=True. None
+            if no reference method or if it has no results.
+
+        """
+        key = (db, t, str(size))
+        if not self._reference_method:
+            return None
+
+        if key not in self._reference_score:
+            self._reference_score[key] = self._compute_reference_score(*key)
+
+        return self._reference_score[key]
+
+    def _compute_reference_score(self, db, t, size):
+        scores = self._aggregated_scores()
+        if scores is not None:
+            scores = scores[(scores['size'] == int(size)) & (scores['db'] == db)
+                            & (scores['task'] == t)
+                            & (scores['method'] == self._reference_method)]
+            if not scores.empty:
+                # Results of the first trial as computed from the files
+                scores = scores[scores['trial'] == scores['trial'].min()]
+                return scores['score'].mean(), scores['scorer'].iloc[0]
+
+        for m in sorted(self.availale_methods_by_size(db, t, size)):
+            if self._is_reference_method(m):
+                return self.score(db, t, m, size, mean=True)
+
+        return None
 
     def databases(self):
         """Return the databases found in the root folder."""
@@ -104,14 +147,35 @@ class PlotHelper(object):
         if 'Regression' not in m and 'Classification' not in m:
             return False
 
-        path = f'{self.root_folder}/{db}/{t}/{m}/'
-        if not os.path.exists(path):
-            return False
-
-        _, _, filenames = next(os.walk(path))
+        filenames = self._nested_file_dict.get(db, {}).get(t, {}).get(m, {})
 
         return len(filenames) > 1  # always strat_infos.yml in m folder
 
+    def _read_csv(self, db, t, m, filename):
+        """Read the table of a result file, whatever the backend.
+
+        Raises FileNotFoundError if the file does not exist.
+        """
+        if self._store is not None:
+            size, _, kind = os.path.splitext(filename)[0].partition('_')
+            return self._store.get_frame(kind, db, t, m, size)
+
+        return read_folds(f'{self.root_folder}/{db}/{t}/{m}/{filename}', index_col=0)
+
+    def _read_yaml(self, db, t, m, filename):
+        """Read the infos of a result yml file, whatever the backend."""
+        if self._store is not None:
+            infos = self._store.get_infos(db, t, m, os.path.splitext(filename)[0])
+            if infos is None:
+                raise ValueError(f'Infos {db}/{t}/{m}/{filename} doesn\'t exist.')
+            return infos
+
+        path = f'{self.root_folder}/{db}/{t}/{m}/{filename}'
+        if not os.path.exists(path):
+            raise ValueError(f'Path {path} doesn\'t exist.')
+        with open(path, 'r') as file:
+            return yaml.safe_load(file)
+
     def _is_reference_method(self, m):
         if not hasattr(self, '_reference_method'):
             return False
@@ -161,7 +225,7 @@ class PlotHelper(object):
             for t in self.tasks(db):
                 for m in self.methods(db, t):
                     for filename in nfd[db][t][m].keys():
-                        s = filename.split('_prediction.csv')
+                        s = re.split(r'_prediction\.(?:csv|npy\.gz)$', filename)
                         if len(s) > 1:  # Pattern found
                             size = s[0]  # size is the first part
                             sizes.add(size)
@@ -197,32 +261,11 @@ class PlotHelper(object):
 
         """
         print(f'Compute score of {db}/{t}/{m}/{size}')
-        method_path = f'{self.root_folder}/{db}/{t}/{m}/'
-        strat_infos_path = method_path+'strat_infos.yml'
-
-        if not os.path.exists(strat_infos_path):
-            raise ValueError(f'Path {strat_infos_path} doesn\'t exist.')
-
-        with open(strat_infos_path, 'r') as file:
-            strat_infos = yaml.safe_load(file)
-
-        is_classif = strat_infos['classification']
-
-        if is_classif:
-            scorer = roc_auc_score
-            scorer_name = 'roc_auc_score'
-            df_path = f'{method_path}{size}_probas.csv'
-            y_true_col = 'y_true'
-            y_col = f'proba_{true_class}'
-        else:
-            scorer = r2_score
-            scorer_name = 'r2_score'
-            df_path = f'{method_path}{size}_prediction.csv'
-            y_true_col = 'y_true'
-            y_col = 'y_pred'
+        scorer_name, filename, y_true_col, y_col = self._scored_columns(
+            db, t, m, size, true_class)
 
         try:
-            df = pd.read_csv(df_path)
+            df = self._read_csv(db, t, m, filename)
         except pd.errors.EmptyDataError:
             if mean:
                 return None, None
@@ -232,20 +275,86 @@ class PlotHelper(object):
                 return None, None
             return dict(), None
 
-        scores = dict()
-
-        for fold, df_gb in df.groupby('fold'):
-            y_true = df_gb[y_true_col]
-            y = df_gb[y_col]
-
-            score = scorer(y_true, y)
-            scores[fold] = score
+        # Score all the folds at once
+        df = df[df['fold'].notna()]
+        folds, scores = SCORERS[scorer_name](df['fold'].to_numpy(),
+                                             df[y_true_col].to_numpy(),
+                                             df[y_col].to_numpy())
+        scores = dict(zip(folds.tolist(), scores))
 
         if mean:
             scores = np.mean(list(scores.values()))
 
         return scores, scorer_name
 
+    def _scored_columns(self, db, t, m, size, true_class='1'):
+        """Return the scorer, the file and the columns scored for a method."""
+        strat_infos = self._read_yaml(db, t, m, 'strat_infos.yml')
+
+        if strat_infos['classification']:
+            return ('roc_auc_score', f'{size}_probas.csv', 'y_true',
+                    f'proba_{true_class}')
+
+        return 'r2_score', f'{size}_prediction.csv', 'y_true', 'y_pred'
+
+    def score_ci(self, db, t, methods, size, n_bootstrap=1000, alpha=0.05,
+                 true_class='1'):
+        """Bootstrap confidence interval of the mean score over the trials.
+
+        The trials of a method are the method folders differing by their
+        RS and T. The rows of the folds of all the trials are resampled
+        together from the stored predictions, see bootstrap_ci, so that the
+        interval is the one of the score averaged over the folds then the
+        trials. The resampling is seeded so that the intervals are
+        reproducible.
+
+        Parameters
+        ----------
+        db, t, size : str
+            As in score.
+        methods : list of str
+            Names of the method folders of the trials.
+        n_bootstrap : int
+            Number of resamples.
+        alpha : float
+            The interval covers 1 - alpha of the resampled scores.
+        true_class : str
+            Name of the true class (if classification).
+
+        Return
+        ------
+        low, high : float
+            Bounds of the interval, None if there are no predictions.
+
+        """
+        dfs = []
+        for trial, m in enumerate(methods):
+            print(f'Bootstrap score of {db}/{t}/{m}/{size}')
+            scorer_name, filename, y_true_col, y_col = self._scored_columns(
+                db, t, m, size, true_class)
+
+            try:
+                df = self._read_csv(db, t, m, filename)
+            except (pd.errors.EmptyDataError, FileNotFoundError):
+                continue
+
+            df = df[df['fold'].notna()]
+            dfs.append(pd.DataFrame({
+                'trial': trial,
+                'fold': df['fold'].to_numpy(),
+                'y_true': df[y_true_col].to_numpy(),
+                'y': df[y_col].to_numpy(),
+            }))
+
+        if not dfs:
+            return None, None
+
+        df = pd.concat(dfs, ignore_index=True)
+        return bootstrap_ci(scorer_name, df['fold'].to_numpy(),
+                            df['y_true'].to_numpy(), df['y'].to_numpy(),
+                            n_bootstrap=n_bootstrap, alpha=alpha,
+                            trials=df['trial'].to_numpy())
+
     def times(self, db, t, m, size):
         """Compute time of a given db, task, method, size.
 
@@ -262,17 +371,17 @@ class PlotHelper(object):
 
         Return
         ------
-        imputation_times : dict
-            Dict of imputation time of each fold.
-        tuning_times : dict
-            Dict of tuning time of each fold.
+        times : dict
+            Dict of the times of each fold for each of the imputation_WCT,
+            tuning_WCT, imputation_PT and tuning_PT columns. Also contains
+            the profile columns (perf_counter, thread time and peak RSS of
+            each step) when they were dumped.
 
 
         """
         print(f'Compute time of {db}/{t}/{m}/{size}')
-        df_path = f'{self.root_folder}/{db}/{t}/{m}/{size}_times.csv'
         try:
-            df = pd.read_csv(df_path)
+            df = self._read_csv(db, t, m, f'{size}_times.csv')
         except pd.errors.EmptyDataError:
             return None, None
 
@@ -281,6 +390,7 @@ class PlotHelper(object):
         tuning_wct = dict()
         imputation_pt = dict()
         tuning_pt = dict()
+        profile = {c: dict() for c in PROFILE_COLUMNS if c in cols}
 
         for fold, df_gb in df.groupby('fold'):
 
@@ -296,11 +406,15 @@ class PlotHelper(object):
                 imputation_wct[fold] = float(df_gb['imputation'])
                 tuning_wct[fold] = float(df_gb['tuning'])
 
+            for c, values in profile.items():
+                values[fold] = float(df_gb[c])
+
         return {
             'imputation_WCT': imputation_wct,
             'tuning_WCT': tuning_wct,
             'imputation_PT': imputation_pt,
-            'tuning_PT': tuning_pt
+            'tuning_PT': tuning_pt,
+            **profile,
         }
 
     def absolute_scores(self, db, t, methods, size, mean=True):
@@ -376,12 +490,105 @@ class PlotHelper(object):
                 for m in methods:
                     subpath = f'{db}/{t}/{m}/{size}_prediction.csv'
                     df_path = f'{self.root_folder}/{subpath}'
+                    if not os.path.exists(df_path):
+                        subpath = binary_filepath(subpath)
+                        df_path = binary_filepath(df_path)
                     print(df_path)
                     r_subpath = subpath.replace('/', '_')
                     shutil.copyfile(df_path, dump_dir+r_subpath)
 
-    def dump(self, filepath, n=None):
-        """Scan results in result_folder and compute scores."""
+    def _signature(self, db, t, m, size):
+        """Modification times of the files the scores of a method depend on.
+
+        None if unknown (results in a SQLite database).
+        """
+        if self._mtimes is None:
+            return None
+
+        filenames = [f for f in self._nested_file_dict[db][t][m]
+                     if f.startswith(f'{size}_') or f.endswith('_infos.yml')]
+
+        return tuple(sorted((f, self._mtimes[f'{db}/{t}/{m}/{f}'])
+                            for f in filenames))
+
+    def _dump_rows(self, db, t, m, size):
+        """Rows of the scores of a given db, task, method, size.
+
+        The method of the rows is the short method name, not renamed.
+        """
+        scores, scorer = self.score(db, t, m, size, mean=False)
+        times = self.times(db, t, m, size)
+
+        # Load strat info
+        strat_infos = self._read_yaml(db, t, m, 'strat_infos.yml')
+        is_classif = strat_infos['classification']
+        task_type = 'Classification' if is_classif else 'Regression'
+
+        # Load task info
+        task_infos = self._read_yaml(db, t, m, 'task_infos.yml')
+        X_shape = task_infos['X.shape']
+        # Convert representation of tuple (str) to tuple
+        X_shape = X_shape.replace('(', '')
+        X_shape = X_shape.replace(')', '')
+        X_shape = X_shape.replace(' ', '')
+        n, p = X_shape.split(',')
+
+        rows = []
+        for fold, s in scores.items():
+            if s is None:
+                print(f'Skipping {db}/{t}/{m}')
+                continue
+            if 'Regression' in m:
+                tag = m.split('Regression')[0]
+            elif 'Classification' in m:
+                tag = m.split('Classification')[0]
+            else:
+                tag = 'Error while retrieving tag'
+                print(tag)
+            params = re.search('RS(.+?)_T(.+?)_', tag)
+            T = params.group(2)
+            short_m = self.short_method_name(m)
+            selection = 'ANOVA' if '_pvals' in t else 'manual'
+            imp_wct = times['imputation_WCT'][fold]
+            tun_wct = times['tuning_WCT'][fold]
+            imp_pt = times['imputation_PT'].get(fold, None)
+            tun_pt = times['tuning_PT'].get(fold, None)
+            prof = [times.get(c, {}).get(fold, None) for c in PROFILE_COLUMNS]
+
+            rows.append(
+                (size, db, t, short_m, T, fold, s, scorer, selection, n, p, task_type, imp_wct, tun_wct, imp_pt, tun_pt, *prof)
+            )
+
+        return rows
+
+    def dump(self, filepath, n=None, n_jobs=1, cache=True, n_bootstrap=None):
+        """Scan results in result_folder and compute scores.
+
+        The scores of the methods are computed in parallel. The rows of each
+        (size, db, task, method) are cached next to the dumped file, along
+        with the modification times of the result files they come from: on
+        the next dump, only the methods whose files changed are scored again.
+
+        If n_bootstrap is given, the bootstrap confidence interval of the
+        mean score over the folds and the trials of each method is added to
+        its rows, in the score_ci_low and score_ci_high columns. They are
+        cached as the scores, along with the signatures of the trials.
+
+        Parameters
+        ----------
+        filepath : str
+            Path of the csv file of the scores.
+        n : int
+            Dump only the scores of this train size.
+        n_jobs : int
+            Number of processes computing the scores.
+        cache : bool
+            Whether to reuse the rows of the previous dumps.
+        n_bootstrap : int
+            Number of resamples of the confidence intervals, None to not
+            compute them.
+
+        """
         existing_sizes = self.existing_sizes()
         if n is not None and str(n) not in existing_sizes:
             raise ValueError(f'Asked n={n} not in existing sizes: {existing_sizes}')
@@ -390,78 +597,143 @@ class PlotHelper(object):
         else:
             sizes = existing_sizes
 
-        rows = []
-        for i, size in enumerate(sizes):
-            for db in self.databases():
-                for t in self.tasks(db):
-                    methods = self.availale_methods_by_size(db, t, size)
-                    abs_scores = self.absolute_scores(db, t, methods, size,
-                                                      mean=False)
-                    for m, (scores, scorer) in abs_scores.items():
-                        times = self.times(db, t, m, size)
-
-                        method_path = f'{self.root_folder}/{db}/{t}/{m}/'
-
-                        # Load strat info
-                        strat_infos_path = method_path+'strat_infos.yml'
-                        if not os.path.exists(strat_infos_path):
-                            raise ValueError(f'Path {strat_infos_path} doesn\'t exist.')
-                        with open(strat_infos_path, 'r') as file:
-                            strat_infos = yaml.safe_load(file)
-                        is_classif = strat_infos['classification']
-                        task_type = 'Classification' if is_classif else 'Regression'
-
-                        # Load task info
-                        task_infos_path = method_path+'task_infos.yml'
-                        if not os.path.exists(task_infos_path):
-                            raise ValueError(f'Path {task_infos_path} doesn\'t exist.')
-                        with open(task_infos_path, 'r') as file:
-                            task_infos = yaml.safe_load(file)
-                        X_shape = task_infos['X.shape']
-                        # Convert representation of tuple (str) to tuple
-                        X_shape = X_shape.replace('(', '')
-                        X_shape = X_shape.replace(')', '')
-                        X_shape = X_shape.replace(' ', '')
-                        n, p = X_shape.split(',')
-
-                        for fold, s in scores.items():
-                            if s is None:
-                                print(f'Skipping {db}/{t}/{m}')
-                                continue
-                            if 'Regression' in m:
-                                tag = m.split('Regression')[0]
-                            elif 'Classification' in m:
-                                tag = m.split('Classification')[0]
-                            else:
-                                tag = 'Error while retrieving tag'
-                                print(tag)
-                            params = re.search('RS(.+?)_T(.+?)_', tag)
-                            T = params.group(2)
-                            short_m = self.short_method_name(m)
-                            renamed_m = self.rename(short_m)
-                            selection = 'ANOVA' if '_pvals' in t else 'manual'
-                            imp_wct = times['imputation_WCT'][fold]
-                            tun_wct = times['tuning_WCT'][fold]
-                            imp_pt = times['imputation_PT'].get(fold, None)
-                            tun_pt = times['tuning_PT'].get(fold, None)
-
-                            rows.append(
-                                (size, db, t, renamed_m, T, fold, s, scorer, selection, n, p, task_type, imp_wct, tun_wct, imp_pt, tun_pt)
-                            )
-
-        cols = ['size', 'db', 'task', 'method', 'trial', 'fold', 'score', 'scorer', 'selection', 'n', 'p', 'type', 'imputation_WCT', 'tuning_WCT', 'imputation_PT', 'tuning_PT']
+        keys = [(size, db, t, m) for size in sizes for db in self.databases()
+                for t in self.tasks(db)
+                for m in sorted(self.availale_methods_by_size(db, t, size))]
+
+        cache_filepath = f'{os.path.splitext(filepath)[0]}_cache.joblib'
+        cached = dict()
+        if cache and os.path.exists(cache_filepath):
+            cached = joblib.load(cache_filepath)
+
+        signatures = {(size, db, t, m): self._signature(db, t, m, size)
+                      for size, db, t, m in keys}
+
+        def is_cached(k):
+            c = cached.get((self.root_folder, *k), None)
+            return c is not None and signatures[k] is not None and c[0] == signatures[k]
+
+        todo = [k for k in keys if not is_cached(k)]
+        print(f'Compute scores of {len(todo)}/{len(keys)} methods')
+
+        all_rows = Parallel(n_jobs=n_jobs)(
+            delayed(self._dump_rows)(db, t, m, size) for size, db, t, m in todo
+        )
+
+        for k, rows in zip(todo, all_rows):
+            cached[(self.root_folder, *k)] = (signatures[k], rows)
+
+        cis = {k: () for k in keys}
+        if n_bootstrap is not None:
+            # The trials of each method are resampled together
+            trials = dict()
+            for size, db, t, m in keys:
+                group = (size, db, t, self.short_method_name(m))
+                trials.setdefault(group, []).append(m)
+
+            def ci_key(group):
+                return (self.root_folder, 'ci', n_bootstrap, *group)
+
+            def ci_signature(group):
+                size, db, t, _ = group
+                return tuple(signatures[(size, db, t, m)] for m in trials[group])
+
+            def is_ci_cached(group):
+                c = cached.get(ci_key(group), None)
+                return c is not None and None not in ci_signature(group) and c[0] == ci_signature(group)
+
+            todo = [g for g in trials if not is_ci_cached(g)]
+            print(f'Bootstrap scores of {len(todo)}/{len(trials)} methods')
+
+            all_cis = Parallel(n_jobs=n_jobs)(
+                delayed(self.score_ci)(db, t, trials[(size, db, t, short_m)], size,
+                                       n_bootstrap=n_bootstrap)
+                for size, db, t, short_m in todo
+            )
+
+            for g, ci in zip(todo, all_cis):
+                cached[ci_key(g)] = (ci_signature(g), ci)
+
+            cis = {(size, db, t, m): cached[ci_key((size, db, t, self.short_method_name(m)))][1]
+                   for size, db, t, m in keys}
+
+        if cache:
+            os.makedirs(os.path.dirname(cache_filepath) or '.', exist_ok=True)
+            tmp_filepath = f'{cache_filepath}.{os.getpid()}.tmp'
+            joblib.dump(cached, tmp_filepath)
+            os.replace(tmp_filepath, cache_filepath)
+
+        rows = [row + tuple(cis[k]) for k in keys
+                for row in cached[(self.root_folder, *k)][1]]
+
+        cols = ['size', 'db', 'task', 'method', 'trial', 'fold', 'score', 'scorer', 'selection', 'n', 'p', 'type', 'imputation_WCT', 'tuning_WCT', 'imputation_PT', 'tuning_PT'] + PROFILE_COLUMNS
+        if n_bootstrap is not None:
+            cols += ['score_ci_low', 'score_ci_high']
 
         df = pd.DataFrame(rows, columns=cols).astype({
             'size': int,
             'trial': int,
             'fold': int,
             })
+        df['method'] = df['method'].map(self.rename)
         df.sort_values(by=['size', 'db', 'task', 'method', 'trial', 'fold'],
                        inplace=True, ignore_index=True)
         print(df)
 
         df.to_csv(filepath)
 
+    def inference(self, db, t, m, size):
+        """Load the inference benchmark of a given db, task, method, size.
+
+        Returns None if the benchmark was not run for these results.
+        """
+        try:
+            return self._read_csv(db, t, m, f'{size}_inference.csv')
+        except FileNotFoundError:
+            return None
+
+    def dump_inference(self, filepath, n=None):
+        """Scan results in result_folder and gather inference benchmarks."""
+        existing_sizes = self.existing_sizes()
+        if n is not None and str(n) not in existing_sizes:
+            raise ValueError(f'Asked n={n} not in existing sizes: {existing_sizes}')
+        elif n is not None:
+            sizes = [str(n)]
+        else:
+            sizes = existing_sizes
+
+        dfs = []
+        for size in sizes:
+            for db in self.databases():
+                for t in self.tasks(db):
+                    for m in self.availale_methods_by_size(db, t, size):
+                        df = self.inference(db, t, m, size)
+                        if df is None:
+                            continue
+
+                        params = re.search('RS(.+?)_T(.+?)_', m)
+                        df.insert(0, 'trial', params.group(2))
+                        df.insert(0, 'method', self.rename(self.short_method_name(m)))
+                        df.insert(0, 'task', t)
+                        df.insert(0, 'db', db)
+                        df.insert(0, 'size', size)
+                        dfs.append(df)
+
+        if not dfs:
+            raise ValueError('No inference benchmark found. Use predict --bench.')
+
+        df = pd.concat(dfs, axis=0).astype({
+            'size': int,
+            'trial': int,
+            'fold': int,
+            })
+        df.sort_values(by=['size', 'db', 'task', 'method', 'trial', 'fold',
+                           'call', 'batch_size'],
+                       inplace=True, ignore_index=True)
+        print(df)
+
+        df.to_csv(filepath)
+
     @staticmethod
     def get_task_description(filepath):
         """Build and dump a csv that will explain each task once completed."""
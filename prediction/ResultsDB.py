@@ -0,0 +1,207 @@
+"""Implement the ResultsDB class."""
+import os
+import sqlite3
+import time
+from io import StringIO
+
+import pandas as pd
+import yaml
+
+
+# Tables of the frames dumped fold by fold, named as the suffix of the csv
+# files of the directory tree backend
+FRAME_KINDS = [
+    'prediction',
+    'probas',
+    'times',
+    'importances',
+    'mv_props',
+    'inference',
+]
+
+KEY = ['db', 'task', 'method', 'size', 'trial', 'fold']
+
+
+class ResultsDB:
+    """Store the results in a SQLite database instead of a directory tree.
+
+    Each kind of frame dumped by fold (predictions, probas, times...) has
+    its own table indexed on (db, task, method, size, trial, fold), storing
+    the frame of each fold as csv text. The infos of the tasks and methods
+    are stored as yaml text in the infos table. The runs table stores the
+    id of the run of each method.
+
+    The database is opened in WAL mode with a busy timeout: several worker
+    processes of one machine can write concurrently, each write being a short
+    transaction replacing the rows of the same fold.
+    """
+
+    def __init__(self, filepath, timeout=600):
+        self.filepath = filepath
+        self.timeout = timeout
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self):
+        """Connection to the database, opened once per process."""
+        if self._conn is None or self._pid != os.getpid():
+            dirname = os.path.dirname(self.filepath)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            conn = sqlite3.connect(self.filepath, timeout=self.timeout)
+            conn.execute(f'PRAGMA busy_timeout = {int(1000*self.timeout)}')
+            self._init(conn)
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _init(self, conn):
+        """Switch to WAL mode and create the tables.
+
+        Processes opening a new database at the same time may fail to switch
+        it to WAL without waiting for the busy timeout: retry until it.
+        """
+        start = time.monotonic()
+        while True:
+            try:
+                conn.execute('PRAGMA journal_mode = WAL')
+                self._create_tables(conn)
+                return
+            except sqlite3.OperationalError as e:
+                if ('locked' not in str(e)
+                        or time.monotonic() - start > self.timeout):
+                    raise
+                time.sleep(0.05)
+
+    @staticmethod
+    def _create_tables(conn):
+        with conn:
+            for kind in FRAME_KINDS:
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {kind} ('
+                    'db TEXT NOT NULL, task TEXT NOT NULL, '
+                    'method TEXT NOT NULL, size TEXT NOT NULL, '
+                    'trial TEXT NOT NULL, fold INTEGER NOT NULL, '
+                    'data TEXT NOT NULL, '
+                    'PRIMARY KEY (db, task, method, size, trial, fold))'
+                )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS infos ('
+                'db TEXT NOT NULL, task TEXT NOT NULL, method TEXT NOT NULL, '
+                'name TEXT NOT NULL, content TEXT NOT NULL, '
+                'PRIMARY KEY (db, task, method, name))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'db TEXT NOT NULL, task TEXT NOT NULL, method TEXT NOT NULL, '
+                'run_id TEXT NOT NULL, PRIMARY KEY (db, task, method))'
+            )
+
+    def __getstate__(self):
+        # The connection is opened again by the processes unpickling the db
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def start_run(self, db, task, method, run_id):
+        """Delete the results of a method when a new run of it starts.
+
+        The rows of the method are deleted from all the tables in one
+        transaction, unless its current run is already run_id: the processes
+        dumping the folds of a run share its run id.
+        """
+        key = (db, task, method)
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')  # Starts wait for each other
+            row = self.conn.execute(
+                'SELECT run_id FROM runs WHERE db = ? AND task = ? AND method = ?',
+                key
+            ).fetchone()
+            if row is not None and row[0] == str(run_id):
+                return
+
+            for table in FRAME_KINDS + ['infos']:
+                self.conn.execute(
+                    f'DELETE FROM {table} WHERE db = ? AND task = ? AND method = ?',
+                    key
+                )
+            self.conn.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)',
+                              (*key, str(run_id)))
+
+    def put_frame(self, kind, db, task, method, size, trial, fold, df):
+        """Insert the frame of a fold, replacing a previous one if any."""
+        fold = -1 if fold is None else int(fold)
+        with self.conn:
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO {kind} VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (db, task, method, str(size), str(trial), fold, df.to_csv())
+            )
+
+    def get_frame(self, kind, db, task, method, size):
+        """Return the frames of all the folds with a fold column.
+
+        Raises FileNotFoundError if no fold is stored, as reading a missing
+        csv file of the directory tree backend.
+        """
+        rows = self.conn.execute(
+            f'SELECT fold, data FROM {kind} WHERE db = ? AND task = ? '
+            'AND method = ? AND size = ? ORDER BY fold',
+            (db, task, method, str(size))
+        ).fetchall()
+
+        if not rows:
+            raise FileNotFoundError(f'No {kind} for {db}/{task}/{method}/{size}.')
+
+        dfs = []
+        for fold, data in rows:
+            df = pd.read_csv(StringIO(data), index_col=0)
+            df['fold'] = fold
+            dfs.append(df)
+
+        return pd.concat(dfs)
+
+    def put_infos(self, db, task, method, name, content):
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO infos VALUES (?, ?, ?, ?, ?)',
+                (db, task, method, name, yaml.dump(content, allow_unicode=True))
+            )
+
+    def get_infos(self, db, task, method, name):
+        """Return the infos stored under name, None if not stored."""
+        row = self.conn.execute(
+            'SELECT content FROM infos WHERE db = ? AND task = ? '
+            'AND method = ? AND name = ?',
+            (db, task, method, name)
+        ).fetchone()
+
+        return None if row is None else yaml.safe_load(row[0])
+
+    def listing(self):
+        """List the stored results as the paths of the directory tree backend.
+
+        Returns
+        -------
+        list of str
+            Relative paths db/task/method/filename of the csv and yml files
+            the directory tree backend would have written.
+        """
+        paths = []
+        for kind in FRAME_KINDS:
+            rows = self.conn.execute(
+                f'SELECT DISTINCT db, task, method, size FROM {kind}'
+            ).fetchall()
+            paths += [f'{db}/{t}/{m}/{size}_{kind}.csv' for db, t, m, size in rows]
+
+        rows = self.conn.execute('SELECT db, task, method, name FROM infos')
+        paths += [f'{db}/{t}/{m}/{name}.yml' for db, t, m, name in rows]
+
+        return paths
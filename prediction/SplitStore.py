@@ -0,0 +1,179 @@
+"""Implement the SplitStore class."""
+import logging
+import os
+from os.path import join
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import ShuffleSplit, StratifiedShuffleSplit
+
+from .file_utils import fingerprint
+
+
+logger = logging.getLogger(__name__)
+
+
+def _index_array(index):
+    """Convert an index to an array storable without pickling."""
+    if isinstance(index, pd.MultiIndex) or index.dtype == object:
+        return np.array([str(i) for i in index])
+    return np.asarray(index)
+
+
+class SplitStore:
+    """Store the train and test indices of the folds of a task.
+
+    The splits of a task for a given random state and trial are computed once
+    and stored in a single npz file as int32 positional index arrays, along
+    with the row index and the columns of X. All the strategies then read the
+    same splits instead of recomputing them, and the ids can be exported as
+    csv without loading the task.
+
+    The stored splits are valid as long as the files the task is loaded from
+    are unchanged: the task is only loaded to compute the missing sizes.
+    """
+
+    def __init__(self, task, RS=None, T=0, root_folder='splits'):
+        self.task = task
+        self.RS = RS
+        self.T = T
+        self.filepath = join(root_folder, task.meta.db, task.meta.name,
+                             f'RS{RS}-T{T}.npz')
+        self._arrays = None
+
+    @property
+    def arrays(self):
+        """The arrays of the store, loaded on first access."""
+        if self._arrays is None:
+            self._arrays = dict()
+            if os.path.exists(self.filepath):
+                with np.load(self.filepath) as f:
+                    self._arrays = dict(f)
+        return self._arrays
+
+    @property
+    def index(self):
+        return self.arrays.get('index', None)
+
+    @property
+    def columns(self):
+        return self.arrays.get('columns', None)
+
+    def sizes(self):
+        """Return the train sizes stored."""
+        return sorted({int(k.split('_')[1]) for k in self.arrays
+                       if k.startswith('train_')})
+
+    def _dump(self):
+        """Write the arrays in the npz file, atomically."""
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        tmp_filepath = f'{self.filepath}.{os.getpid()}.tmp'
+        with open(tmp_filepath, 'wb') as file:
+            np.savez(file, **self.arrays)
+        os.replace(tmp_filepath, self.filepath)
+
+    def _fingerprint(self):
+        """Identify the files the task is loaded from."""
+        paths = self.task.meta.source_files(RS=self.RS, T=self.T)
+        return repr(fingerprint(paths))
+
+    def _check(self, n_splits):
+        """Drop the stored splits if computed on other data or parameters."""
+        arrays = self.arrays
+        if not arrays:
+            return
+
+        if ('fingerprint' not in arrays
+                or str(arrays['fingerprint']) != self._fingerprint()
+                or int(arrays['n_splits']) != n_splits
+                or bool(arrays['stratified']) != self.task.is_classif()):
+            logger.info(f'Stored splits {self.filepath} are outdated.')
+            self._arrays = dict()
+
+    def _split(self, X, y, n, n_splits):
+        """Compute the splits of a given train size."""
+        n_tot = X.shape[0]
+
+        # Choose right splitter depending on classification or regression
+        if self.task.is_classif():
+            ss = StratifiedShuffleSplit(n_splits=n_splits, test_size=n_tot-n,
+                                        random_state=self.RS)
+        else:
+            ss = ShuffleSplit(n_splits=n_splits, test_size=n_tot-n,
+                              random_state=self.RS)
+
+        return list(ss.split(X, y))
+
+    def get(self, n, n_splits):
+        """Return the (train_idx, test_idx) of the folds of a train size.
+
+        The splits are computed and stored if not already.
+        """
+        self._check(n_splits)
+        arrays = self.arrays
+
+        if f'train_{n}_0' not in arrays:
+            logger.info(f'Compute splits of size {n} in {self.filepath}')
+            X, y = self.task.X, self.task.y
+            arrays['fingerprint'] = np.array(self._fingerprint())
+            arrays['index'] = _index_array(X.index)
+            arrays['columns'] = np.array([str(c) for c in X.columns])
+            if X.index.name is not None:
+                arrays['index_name'] = np.array(str(X.index.name))
+            arrays['n_splits'] = np.array(n_splits)
+            arrays['stratified'] = np.array(self.task.is_classif())
+            for i, (train_idx, test_idx) in enumerate(self._split(X, y, n, n_splits)):
+                arrays[f'train_{n}_{i}'] = train_idx.astype(np.int32)
+                arrays[f'test_{n}_{i}'] = test_idx.astype(np.int32)
+            self._dump()
+
+        return [(arrays[f'train_{n}_{i}'], arrays[f'test_{n}_{i}'])
+                for i in range(int(arrays['n_splits']))]
+
+    def generate(self, sizes, n_splits, min_test_set):
+        """Return the folds of each train size leaving a large enough test set.
+
+        Parameters
+        ----------
+        sizes : list of int
+            The train sizes.
+        n_splits : int
+            Number of folds of each size.
+        min_test_set : float
+            Minimum proportion of rows in the test set. Sizes leaving a
+            smaller test set are skipped.
+
+        Returns
+        -------
+        dict
+            Map train sizes to their list of (train_idx, test_idx).
+
+        """
+        self._check(n_splits)
+        index = self.index
+        n_tot = self.task.X.shape[0] if index is None else index.shape[0]
+        return {n: self.get(n, n_splits) for n in sizes
+                if n_tot - n >= min_test_set*n_tot}
+
+    def export_csv(self, n, i, folder='ids/'):
+        """Export the ids and columns of a fold as csv files."""
+        os.makedirs(folder, exist_ok=True)
+        name = self.task.meta.name.replace('pvals', 'screening')
+        trial = int(self.T) + 1
+        fold = i + 1
+        common = f'{self.task.meta.db}-{name}-size{n}-trial{trial}-fold{fold}'
+        index_name = self.arrays.get('index_name', None)
+        if index_name is not None:
+            index_name = str(index_name)
+        columns = pd.Series(self.columns)
+
+        for s in ['train', 'test']:
+            idx = self.arrays[f'{s}_{n}_{i}']
+            pd.Series(self.index[idx], name=index_name).to_csv(join(folder, f'{common}-{s}-idx.csv'), index=False)
+            columns.to_csv(join(folder, f'{common}-{s}-col.csv'), index=False, header=False)
+
+    def export_all_csv(self, folder='ids/'):
+        """Export the ids and columns of all the stored folds as csv files."""
+        for n in self.sizes():
+            for i in range(int(self.arrays['n_splits'])):
+                self.export_csv(n, i, folder=folder)
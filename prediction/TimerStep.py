@@ -1,44 +1,147 @@
 """Implement the TimerStep class."""
+import sys
 import time
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# Stages of the pipeline that are profiled and metrics recorded for each
+PROFILED_STAGES = ['imputation', 'tuning', 'transform', 'predict']
+PROFILED_METRICS = ['PC', 'TT', 'RSS']
+PROFILE_COLUMNS = [f'{s}_{m}' for s in PROFILED_STAGES for m in PROFILED_METRICS]
+
+
+def _peak_rss():
+    """Peak resident set size of the process in MB."""
+    if resource is None:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss/2**20 if sys.platform == 'darwin' else rss/2**10
+
+
+def snapshot():
+    """Record the clocks and the peak memory of the process.
+
+    Returns
+    -------
+    dict
+        WCT: wall-clock time, PT: process time, PC: perf_counter wall time,
+        TT: CPU time of the current thread, RSS: peak RSS in MB.
+
+    """
+    return {
+        'WCT': time.time(),
+        'PT': time.process_time(),
+        'PC': time.perf_counter(),
+        'TT': time.thread_time(),
+        'RSS': _peak_rss(),
+    }
+
+
+def profile(starts, ends):
+    """Sum the differences of paired snapshots.
+
+    Parameters
+    ----------
+    starts : list of dict
+        Snapshots taken at the beginning of the stage.
+    ends : list of dict
+        Snapshots taken at the end of the stage. Paired with starts.
+
+    Returns
+    -------
+    dict or None
+        Elapsed time on each clock and increase of the peak RSS. None if no
+        pair of snapshots is given, ie the stage did not occur.
+
+    """
+    pairs = list(zip(starts, ends))
+    if not pairs:
+        return None
+
+    return {k: sum(e[k] - s[k] for s, e in pairs) for k in pairs[0][0]}
+
+
+def subtract(total, part):
+    """Subtract the profile of a sub stage from the profile of a stage."""
+    if part is None:
+        return total
+    return {k: total[k] - part[k] for k in total}
+
+
+def profile_columns(**stages):
+    """Flatten the profiles of the stages into the dumped columns."""
+    return {
+        f'{s}_{m}': None if stages.get(s) is None else stages[s][m]
+        for s in PROFILED_STAGES for m in PROFILED_METRICS
+    }
+
 
 class TimerStep:
-    """Record timestamps as part of a scikit-learn Pipeline step."""
+    """Record timestamps as part of a scikit-learn Pipeline step.
+
+    A snapshot of the clocks and memory is recorded at each call of fit and
+    transform. Copies of the step share the records of the original so that
+    the timers still record when the pipeline is cloned, eg by bagging.
+    """
     def __init__(self, name):
         self.name = name
-        self.fit_timestamps = []
-        self.transform_timestamps = []
-        self.fit_pts = []
-        self.transform_pts = []
+        self.fit_records = []
+        self.transform_records = []
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def reset(self):
+        self.fit_records = []
+        self.transform_records = []
+
+    @property
+    def fit_timestamps(self):
+        return [r['WCT'] for r in self.fit_records]
+
+    @property
+    def transform_timestamps(self):
+        return [r['WCT'] for r in self.transform_records]
+
+    @property
+    def fit_pts(self):
+        return [r['PT'] for r in self.fit_records]
+
+    @property
+    def transform_pts(self):
+        return [r['PT'] for r in self.transform_records]
 
     @property
     def last_fit_timestamp(self):
-        if self.fit_timestamps:
-            return self.fit_timestamps[-1]
+        if self.fit_records:
+            return self.fit_records[-1]['WCT']
 
     @property
     def last_transform_timestamp(self):
-        if self.transform_timestamps:
-            return self.transform_timestamps[-1]
+        if self.transform_records:
+            return self.transform_records[-1]['WCT']
 
     @property
     def last_fit_pt(self):
-        if self.fit_pts:
-            return self.fit_pts[-1]
+        if self.fit_records:
+            return self.fit_records[-1]['PT']
 
     @property
     def last_transform_pt(self):
-        if self.transform_pts:
-            return self.transform_pts[-1]
+        if self.transform_records:
+            return self.transform_records[-1]['PT']
 
     def fit(self, X, y):
-        self.fit_timestamps.append(time.time())
-        self.fit_pts.append(time.process_time())
+        self.fit_records.append(snapshot())
 
         return self
 
     def transform(self, X):
-        self.transform_timestamps.append(time.time())
-        self.transform_pts.append(time.process_time())
+        self.transform_records.append(snapshot())
 
         return X
@@ -1,10 +1,9 @@
-"""Run the predicitons."""
-import logging
+"""Run the predicitons.
 
-from .strategies import strategies
-from .tasks import tasks
-from .train import train
-from .PlotHelper import PlotHelper
+The scripts import their modules when run, so that importing a submodule
+such as prediction.tasks does not import all the others.
+"""
+import logging
 
 
 logger = logging.getLogger(__name__)
@@ -12,6 +11,10 @@ logger.addHandler(logging.StreamHandler())  # Print also in console.
 
 
 def run(args):
+    from .strategies import strategies
+    from .tasks import tasks
+    from .train import train
+
     task_name = args.task_name
     strategy_name = args.strategy_name
     RS = args.RS
@@ -40,7 +43,10 @@ def run(args):
     train(task, strategy, RS=RS, T=T, dump_idx_only=dump_idx_only,
           n_bagging=args.n_bagging, train_size=args.train_size,
           n_permutation=args.n_permutation, asked_fold=args.asked_fold,
-          results_folder=args.results_folder)
+          results_folder=args.results_folder, bench=args.bench,
+          save_model=args.save_model, backend=args.backend,
+          binary=args.binary, keep_versions=args.keep_versions,
+          run_id=args.run_id)
 
 
 rename = {
@@ -76,5 +82,21 @@ rename = {
 
 
 def aggregate_results(args):
-    ph = PlotHelper(root_folder=args.root_folder, rename=rename)
-    ph.dump(f'scores/{args.out}.csv', n=args.n)
+    from .PlotHelper import PlotHelper
+
+    ph = PlotHelper(root_folder=args.root_folder, rename=rename,
+                    rescan=args.rescan)
+    if args.inference:
+        ph.dump_inference(f'scores/{args.out}_inference.csv', n=args.n)
+    else:
+        ph.dump(f'scores/{args.out}.csv', n=args.n, n_jobs=args.n_jobs,
+                cache=args.cache, n_bootstrap=args.bootstrap)
+
+
+def run_predict_batch(args):
+    from .persist import predict_batch
+
+    n_rows = predict_batch(args.model_path, args.csv_path, args.out,
+                           chunksize=args.chunksize,
+                           n_top_pvals=args.n_top_pvals)
+    logger.info(f'Dumped predictions of {n_rows} rows in {args.out}')
@@ -0,0 +1,89 @@
+"""Benchmark the inference cost of fitted estimators."""
+import time
+
+import numpy as np
+import pandas as pd
+
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def benchmark_inference(estimator, X, calls=('predict',), batch_sizes=None,
+                        max_calls=100, min_calls=5, max_time=10):
+    """Time the predictions of a fitted estimator on batches of X.
+
+    For each batch size, the estimator is called on consecutive batches of
+    rows of X (wrapping around X if needed) until max_calls calls are done
+    or max_time seconds are spent. The whole X is always benchmarked as the
+    largest batch size.
+
+    Parameters
+    ----------
+    estimator : fitted estimator
+        The estimator to benchmark.
+    X : np.array
+        The data to predict on, typically the test set of a fold.
+    calls : list of str
+        The methods of the estimator to time, eg predict and predict_proba.
+    batch_sizes : list of int
+        The batch sizes to benchmark. Sizes greater than the number of rows
+        of X are ignored. Default BATCH_SIZES.
+    max_calls : int
+        Maximum number of timed calls for each batch size.
+    min_calls : int
+        Minimum number of timed calls for each batch size.
+    max_time : float
+        Time budget in seconds of each batch size, checked after min_calls.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per method and batch size with the number of timed calls,
+        the throughput in rows per second and the median and 99th percentile
+        of the latency of a call in seconds.
+
+    """
+    if batch_sizes is None:
+        batch_sizes = BATCH_SIZES
+
+    n_rows = X.shape[0]
+    batch_sizes = sorted({b for b in batch_sizes if b < n_rows} | {n_rows})
+
+    rows = []
+    for call in calls:
+        f = getattr(estimator, call)
+        f(X[:1])  # Warm up, not timed
+
+        for b in batch_sizes:
+            latencies = []
+            start = 0
+            t_start = time.perf_counter()
+            while len(latencies) < max_calls:
+                if start + b <= n_rows:
+                    batch = X[start:start + b]
+                else:
+                    batch = X[np.arange(start, start + b) % n_rows]
+
+                t0 = time.perf_counter()
+                f(batch)
+                latencies.append(time.perf_counter() - t0)
+
+                start = (start + b) % n_rows
+                if (len(latencies) >= min_calls and
+                        time.perf_counter() - t_start > max_time):
+                    break
+
+            latencies = np.array(latencies)
+            rows.append((
+                call,
+                b,
+                len(latencies),
+                b*len(latencies)/latencies.sum(),
+                np.percentile(latencies, 50),
+                np.percentile(latencies, 99),
+            ))
+
+    cols = ['call', 'batch_size', 'n_calls', 'rows_per_sec', 'latency_p50',
+            'latency_p99']
+
+    return pd.DataFrame(rows, columns=cols)
@@ -15,41 +15,61 @@ def assert_equal(s):
     return s.iloc[0]
 
 
+def _assert_constant(df, dfgb, columns):
+    """Check the columns are constant in each group, as assert_equal."""
+    for c in columns:
+        if df[c].isnull().any() or (df[c] != dfgb[c].transform('first')).any():
+            raise ValueError(
+                f'Values differ but supposed to be constant. Col: {c}.'
+            )
+
+
+# Bounds of the bootstrap confidence intervals of the scores, if dumped
+CI_COLUMNS = ['score_ci_low', 'score_ci_high']
+
+
 def aggregate(df, value):
     # Agregate accross folds by averaging
     df['n_folds'] = 1
+    # Interval of the score averaged over the folds and the trials, constant
+    # on the rows of a method
+    ci = {c: 'first' for c in CI_COLUMNS if c in df}
     dfgb = df.groupby(['size', 'db', 'task', 'method', 'trial'])
+    _assert_constant(df, dfgb, ['scorer', 'selection', 'n', 'p', 'type'])
     df = dfgb.agg({
         value: 'mean',
         'n_folds': 'sum',
-        'scorer': assert_equal,  # first and assert equal
-        'selection': assert_equal,
-        'n': assert_equal,
-        'p': assert_equal,
-        'type': assert_equal,
+        'scorer': 'first',  # constant, checked above
+        'selection': 'first',
+        'n': 'first',
+        'p': 'first',
+        'type': 'first',
         'imputation_WCT': 'mean',
         'tuning_WCT': 'mean',
         'imputation_PT': 'mean',
         'tuning_PT': 'mean',
+        **ci,
     })
 
     # Agregate accross trials by averaging
     df = df.reset_index()
     df['n_trials'] = 1  # Add a count column to keep track of # of trials
     dfgb = df.groupby(['size', 'db', 'task', 'method'])
+    _assert_constant(df, dfgb, ['scorer', 'selection', 'n', 'type'])
     df = dfgb.agg({
         value: 'mean',
         'n_trials': 'sum',
         'n_folds': 'sum',
-        'scorer': assert_equal,  # first and assert equal
-        'selection': assert_equal,
-        'n': assert_equal,
-        'p': 'mean',  #assert_equal,
-        'type': assert_equal,
+        'scorer': 'first',  # constant, checked above
+        'selection': 'first',
+        'n': 'first',
+        'p': 'mean',
+        'type': 'first',
         'imputation_WCT': 'mean',
         'tuning_WCT': 'mean',
         'imputation_PT': 'mean',
         'tuning_PT': 'mean',
+        **ci,
     })
 
     # Reset index to addlevel of the multi index to the columns of the df
@@ -58,10 +78,62 @@ def aggregate(df, value):
     return df
 
 
+def _format(df, fmt):
+    """Format the non null values of a df with a %-format string."""
+    values = df.to_numpy(dtype=float)
+    null = np.isnan(values)
+    formatted = np.char.mod(fmt, np.where(null, 0, values)).astype(object)
+    return df.mask(~null, formatted)
+
+
+def _space(df, positive=True):
+    """Prefix the non negative formatted values of a df with a sign."""
+    values = df.to_numpy(dtype=object)
+    notnull = ~pd.isnull(values)
+    strings = values[notnull].astype(str)
+
+    positive_str = '+' if positive else r'\hphantom{-}'
+    prefix = np.where(strings.astype(float) < 0, '', positive_str)
+
+    spaced = values.copy()
+    spaced[notnull] = np.char.add(prefix, strings).astype(object)
+
+    return df.mask(notnull, spaced)
+
+
+def _add_empty_methods(df, method_order):
+    """Add NaN rows for the methods without results at a size."""
+    sizes = df.index.get_level_values(0).unique().sort_values()
+    index = pd.MultiIndex.from_product([sizes, method_order],
+                                       names=df.index.names)
+    return df.reindex(index)
+
+
+def _format_scores(df, relative):
+    """Format the scores, or the relative scores in scientific notation."""
+    if not relative:
+        return _format(df, '%.2f')
+
+    df = _format(df, '%.0e')
+    # Remove the 0 from the exponent
+    return df.apply(lambda c: c.str.replace(r'e([+-])0(\d)$', r'e\1\2', regex=True)
+                    if c.dtype == object else c)
+
+
 def get_scores_tab(scores_raw, method_order=None, db_order=None, relative=False,
                    average_sizes=True, formatting=True, positive=True,
-                   add_empty_methods=True):
-    """Compute article scores tab from raw scores."""
+                   add_empty_methods=True, ci=False):
+    """Compute article scores tab from raw scores.
+
+    If ci, the bootstrap confidence intervals dumped with the scores are
+    appended to the formatted scores, as [low, high].
+    """
+    if ci and not formatting:
+        raise ValueError('Confidence intervals are only added to formatted scores.')
+    if ci and not set(CI_COLUMNS).issubset(scores_raw.columns):
+        raise ValueError('No confidence intervals in the scores, dump them '
+                         'with aggregate --bootstrap.')
+
     df = scores_raw.copy()
 
     if method_order is not None:
@@ -70,20 +142,24 @@ def get_scores_tab(scores_raw, method_order=None, db_order=None, relative=False,
     df = aggregate(df, 'score')
     df.set_index(['size', 'db', 'task', 'method'], inplace=True)
 
-    df = pd.pivot_table(df, values='score', index=['size', 'method'], columns=['db', 'task'])
+    scores = df
+    df = pd.pivot_table(scores, values='score', index=['size', 'method'], columns=['db', 'task'])
 
     if add_empty_methods and method_order is not None:
         # Add methods that have no results at specified size (eg KNN for n = 100000)
-        for size, subdf in df.groupby('size'):
-            for m in method_order:
-                if (size, m) not in subdf.index:
-                    df.loc[(size, m), :] = np.nan
-
-        df = df.reindex(method_order, level=1)
+        df = _add_empty_methods(df, method_order)
 
     if db_order is not None:
         df = df.reindex(db_order, level=0, axis=1)
 
+    bounds = []
+    if ci:
+        bounds = [
+            pd.pivot_table(scores, values=c, index=['size', 'method'],
+                           columns=['db', 'task'], dropna=False).reindex_like(df)
+            for c in CI_COLUMNS
+        ]
+
     avg_by_size = df.mean(level=0)
     # avg_by_size = df.groupby(level=0).mean()
     avg_by_size.loc['Average'] = avg_by_size.mean(skipna=True)
@@ -94,42 +170,19 @@ def get_scores_tab(scores_raw, method_order=None, db_order=None, relative=False,
 
     if relative:
         df = df.sub(avg_by_size.droplevel(1, axis=0), level=0)
+        bounds = [b.sub(avg_by_size.droplevel(1, axis=0), level=0) for b in bounds]
 
     if formatting:
-        if relative:
-            def myround(x):
-                if pd.isnull(x):
-                    return x
-                else:
-                    s1 = f'{x:.0e}'
-                    # Remove the 0 from the exponent
-                    if s1[-2] == '0':
-                        s2 = s1[:-2] + s1[-1]
-                    else:
-                        s2 = s1
-                    assert np.isclose(float(s1), float(s2)).all()
-                    return s2
-
-            df = df.applymap(myround)
-
-        else:
-            df = df.applymap(lambda x: x if pd.isnull(x) else f'{x:.2f}')
-
-    def space(x, positive=True):
-        if pd.isnull(x):
-            return x
-        else:
-            positive_str = '+' if positive else r'\hphantom{-}'
-            space = '' if float(x) < 0 else positive_str
-            return f'{space}{x}'
+        df = _space(_format_scores(df, relative))
 
-    if formatting:
-        df = df.applymap(space)
+        if ci:
+            low, high = [_format_scores(b, relative) for b in bounds]
+            df = df.mask(low.notnull(), df + ' [' + low + ', ' + high + ']')
 
     if average_sizes:
         if formatting:
-            avg_by_size = avg_by_size.applymap(lambda x: x if pd.isnull(x) else f'{x:.2f}')
-            avg_by_size = avg_by_size.applymap(lambda x: space(x, positive=False))
+            avg_by_size = _format(avg_by_size, '%.2f')
+            avg_by_size = _space(avg_by_size, positive=False)
         df = pd.concat([df, avg_by_size], axis=0)
         df = df.reindex(list(size_order)+['Average'], level=0)
 
@@ -161,12 +214,7 @@ def get_ranks_tab(scores_raw, method_order=None, db_order=None, average_sizes=Tr
 
     if add_empty_methods and method_order is not None:
         # Add methods that have no results at specified size (eg KNN for n = 100000)
-        for size, subdf in df.groupby('size'):
-            for m in method_order:
-                if (size, m) not in subdf.index:
-                    df.loc[(size, m), :] = np.nan
-
-        df = df.reindex(method_order, level=1)
+        df = _add_empty_methods(df, method_order)
 
     if db_order is not None:
         df = df.reindex(db_order, level=0, axis=1)
@@ -183,13 +231,7 @@ def get_ranks_tab(scores_raw, method_order=None, db_order=None, average_sizes=Tr
         df_with_avg_dbs = df
 
 
-    def to_int(x):  # Convert to int and robust to NaN
-        try:
-            return str(int(x))
-        except:
-            return x
-
-    df = df.applymap(to_int)
+    df = _format(df, '%d')  # Convert to int and robust to NaN
 
     if average_sizes:
         avg_on_sizes = avg_on_sizes.round(1)
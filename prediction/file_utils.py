@@ -0,0 +1,105 @@
+"""Functions to write files shared by several processes."""
+import os
+from contextlib import contextmanager
+from os.path import join
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+
+# Lock file of the folders written by several processes
+LOCK_FILENAME = '.lock'
+
+# Lock file held by the processes using a folder
+IN_USE_FILENAME = '.in_use'
+
+
+@contextmanager
+def locked(folder):
+    """Hold an exclusive lock on a folder while in the context.
+
+    The lock is an flock on a lock file of the folder, so that the processes
+    dumping in the same folder wait for each other. No lock is taken where
+    fcntl is not available.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(folder, exist_ok=True)
+    with open(join(folder, LOCK_FILENAME), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def hold(folder):
+    """Hold a shared lock on a folder until the returned file is closed.
+
+    Tells the other processes that the folder is in use, see in_use. The
+    lock is released when the file is closed or the process ends, even if it
+    crashes.
+    """
+    file = open(join(folder, IN_USE_FILENAME), 'a')
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_SH)
+    return file
+
+
+def in_use(folder):
+    """Tell if a process holds the folder with hold.
+
+    Always False where fcntl is not available.
+    """
+    filepath = join(folder, IN_USE_FILENAME)
+    if fcntl is None or not os.path.exists(filepath):
+        return False
+
+    with open(filepath, 'a') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(file, fcntl.LOCK_UN)
+
+    return False
+
+
+def fingerprint(paths):
+    """Identify files by their path, size and mtime, None if missing."""
+    res = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            res.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:  # Missing file
+            res.append((path, None, None))
+
+    return tuple(res)
+
+
+def write_atomic(filepath, content):
+    """Write a str or bytes content in a temp file renamed to filepath.
+
+    Readers see either the previous or the new file, never a partial one.
+    """
+    mode = 'wb' if isinstance(content, bytes) else 'w'
+    tmp_filepath = f'{filepath}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_filepath, mode) as file:
+            file.write(content)
+        os.replace(tmp_filepath, filepath)
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
+
+def append_file(filepath, content):
+    """Append a str or bytes content to a file in a single write."""
+    mode = 'ab' if isinstance(content, bytes) else 'a'
+    with open(filepath, mode) as file:
+        file.write(content)
@@ -0,0 +1,171 @@
+"""Persist fitted pipelines and predict new rows in batch with them."""
+import logging
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from database import dbs
+from .tasks import tasks
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the content of the dumped payload changes
+MODEL_VERSION = 2
+
+
+def dump_model(estimator, columns, filepath, compress=3, **infos):
+    """Dump a fitted estimator with the columns it was fitted on.
+
+    Parameters
+    ----------
+    estimator : fitted estimator
+        The fitted pipeline.
+    columns : list
+        The columns of X the estimator was fitted on, in order.
+    filepath : str
+        Where to dump the model.
+    compress : int
+        Compression level of joblib (zlib).
+    **infos
+        Extra infos stored with the model (task tag, RS, T, size, fold...).
+
+    """
+    payload = {
+        'version': MODEL_VERSION,
+        'sklearn_version': sklearn.__version__,
+        'columns': list(columns),
+        'infos': infos,
+        'estimator': estimator,
+    }
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+    # Dumped aside then renamed: a model being dumped is never loaded
+    tmp_filepath = f'{filepath}.{os.getpid()}.tmp'
+    joblib.dump(payload, tmp_filepath, compress=compress)
+    os.replace(tmp_filepath, filepath)
+
+
+def load_model(filepath):
+    """Load a model dumped with dump_model and check its version stamp."""
+    payload = joblib.load(filepath)
+
+    version = payload.get('version', None)
+    if version != MODEL_VERSION:
+        raise ValueError(f'Model {filepath} has version {version}, '
+                         f'expected {MODEL_VERSION}.')
+
+    if payload['sklearn_version'] != sklearn.__version__:
+        warnings.warn(f'Model {filepath} was fitted with scikit-learn '
+                      f'{payload["sklearn_version"]}, loaded with '
+                      f'{sklearn.__version__}.')
+
+    return payload
+
+
+def align_columns(X, columns, raw_columns):
+    """Reindex encoded rows on the columns the model was fitted on.
+
+    A column missing from X is filled with 0 if it comes from the one hot
+    encoding of a raw feature (the category does not appear in the rows),
+    with NaN otherwise (the feature is missing from the rows). A warning
+    lists the added columns.
+    """
+    raw_columns = [str(c) for c in raw_columns]
+    missing = [c for c in columns if c not in X.columns]
+    one_hot = {c for c in missing
+               if any(str(c).startswith(f'{f}_') for f in raw_columns
+                      if f not in X.columns)}
+    X = X.reindex(columns, axis=1)
+    if one_hot:
+        X[list(one_hot)] = X[list(one_hot)].fillna(0)
+        warnings.warn(f'Categories absent from the rows, one hot columns '
+                      f'set to 0: {sorted(one_hot, key=str)}.')
+
+    nan_filled = [c for c in missing if c not in one_hot]
+    if nan_filled:
+        warnings.warn(f'Features missing from the rows, set to NaN: '
+                      f'{nan_filled}.')
+
+    return X
+
+
+def predict_batch(model_path, csv_path, out_path, chunksize=10000,
+                  n_top_pvals=None):
+    """Stream rows of a csv through a saved model and dump the predictions.
+
+    The rows are read by chunks from a csv having the columns of the initial
+    data frame of the task. Each chunk goes through the missing values
+    heuristic and the encodings of the task fitted at training, is aligned on
+    the columns of the model and predicted. The training data is not loaded.
+
+    Parameters
+    ----------
+    model_path : str
+        Path of the model dumped with dump_model.
+    csv_path : str
+        Path of the csv of the rows to predict.
+    out_path : str
+        Path of the csv where to dump the predictions.
+    chunksize : int
+        Number of rows predicted at once.
+    n_top_pvals : int
+        Number of features selected by the task when it uses the p-values.
+        Overrides the one the model was trained with.
+
+    Returns
+    -------
+    int
+        Number of predicted rows.
+
+    """
+    payload = load_model(model_path)
+    estimator = payload['estimator']
+    columns = payload['columns']
+    infos = payload['infos']
+
+    if n_top_pvals is None:
+        if 'n_top_pvals' not in infos:
+            raise ValueError(f'Model {model_path} does not store the number '
+                             f'of features selected, give n_top_pvals.')
+        n_top_pvals = infos['n_top_pvals']
+
+    elif n_top_pvals != infos.get('n_top_pvals', n_top_pvals):
+        warnings.warn(f'Model {model_path} was trained with n_top_pvals='
+                      f'{infos["n_top_pvals"]}, overridden with {n_top_pvals}.')
+
+    # Only the meta of the task is built, the data is not loaded
+    task = tasks.get(infos['task'], n_top_pvals=n_top_pvals,
+                     RS=infos['RS'], T=infos['T'])
+    classif = task.is_classif()
+
+    db = dbs[task.meta.db]
+    index_col = task.meta.idx_column or None
+    reader = pd.read_csv(csv_path, sep=db._sep, encoding=db._encoding,
+                         index_col=index_col, chunksize=chunksize,
+                         low_memory=False)
+
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+    n_rows = 0
+    for chunk in reader:
+        X = task.encode_raw(chunk, infos['encodings'])
+        X = align_columns(X, columns, chunk.columns)
+        X_arr = X.to_numpy(dtype=np.float64, na_value=np.nan)
+
+        df = pd.DataFrame({'y_pred': estimator.predict(X_arr)}, index=X.index)
+        if classif and hasattr(estimator, 'predict_proba'):
+            probas = estimator.predict_proba(X_arr)
+            for c in range(probas.shape[1]):
+                df[f'proba_{c}'] = probas[:, c]
+
+        df.to_csv(out_path, mode='a', header=n_rows == 0)
+        n_rows += df.shape[0]
+        logger.info(f'Predicted {n_rows} rows.')
+
+    return n_rows
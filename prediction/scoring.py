@@ -0,0 +1,408 @@
+"""Score the predictions of all the folds of a result file at once."""
+import numpy as np
+
+
+def _fold_index(folds):
+    """Return the sorted unique folds and the index of each row in them."""
+    folds = np.asarray(folds)
+    return np.unique(folds, return_inverse=True)
+
+
+def roc_auc_by_fold(folds, y_true, y_score):
+    """Compute the ROC AUC of each fold, as roc_auc_score on each fold.
+
+    The AUC is computed from the Mann-Whitney U statistic: the rows are
+    sorted by fold and score once and the sum of the ranks of the positive
+    rows is taken in each fold, tied scores getting their average rank.
+
+    Parameters
+    ----------
+    folds : array-like of shape (n_samples,)
+        Fold of each row.
+    y_true : array-like of shape (n_samples,)
+        Binary true labels, the greatest being the positive class.
+    y_score : array-like of shape (n_samples,)
+        Scores of the positive class.
+
+    Returns
+    -------
+    folds : np.ndarray
+        Sorted unique folds.
+    scores : np.ndarray
+        ROC AUC of each fold.
+
+    """
+    unique_folds, fold_idx = _fold_index(folds)
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score, dtype=np.float64)
+
+    if np.isnan(y_score).any():
+        raise ValueError('Input contains NaN.')
+
+    classes = np.unique(y_true)
+    if classes.shape[0] == 0:  # No rows
+        return unique_folds, np.array([])
+    if classes.shape[0] > 2:
+        raise ValueError(f'Only binary y_true is supported, got {classes}.')
+    pos = y_true == classes[-1]
+
+    n_folds = unique_folds.shape[0]
+    n_pos = np.bincount(fold_idx, weights=pos, minlength=n_folds)
+    n_neg = np.bincount(fold_idx, minlength=n_folds) - n_pos
+
+    if ((n_pos == 0) | (n_neg == 0)).any():
+        raise ValueError('Only one class present in y_true of a fold. '
+                         'ROC AUC score is not defined in that case.')
+
+    # Sort by fold then score
+    order = np.lexsort((y_score, fold_idx))
+    f_sorted = fold_idx[order]
+    s_sorted = y_score[order]
+
+    # Runs of equal (fold, score) get the average of their positions
+    n = order.shape[0]
+    pos_sorted = np.arange(n)
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (f_sorted[1:] != f_sorted[:-1]) | (s_sorted[1:] != s_sorted[:-1])
+    run_id = np.cumsum(new_run) - 1
+    run_first = pos_sorted[new_run]
+    run_last = np.append(run_first[1:], n) - 1
+    avg_pos = (run_first[run_id] + run_last[run_id])/2
+
+    # Ranks start at 1 in each fold
+    fold_first = np.searchsorted(f_sorted, np.arange(n_folds))
+    ranks = avg_pos - fold_first[f_sorted] + 1
+
+    rank_sum = np.bincount(f_sorted, weights=ranks*pos[order], minlength=n_folds)
+    U = rank_sum - n_pos*(n_pos + 1)/2
+
+    return unique_folds, U/(n_pos*n_neg)
+
+
+def r2_by_fold(folds, y_true, y_pred):
+    """Compute the R2 of each fold, as r2_score on each fold.
+
+    As r2_score, a fold with constant y_true scores 1 if perfectly predicted
+    and 0 otherwise.
+
+    Parameters
+    ----------
+    folds : array-like of shape (n_samples,)
+        Fold of each row.
+    y_true : array-like of shape (n_samples,)
+        True values.
+    y_pred : array-like of shape (n_samples,)
+        Predicted values.
+
+    Returns
+    -------
+    folds : np.ndarray
+        Sorted unique folds.
+    scores : np.ndarray
+        R2 of each fold.
+
+    """
+    unique_folds, fold_idx = _fold_index(folds)
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+
+    if np.isnan(y_true).any() or np.isnan(y_pred).any():
+        raise ValueError('Input contains NaN.')
+
+    n_folds = unique_folds.shape[0]
+    counts = np.bincount(fold_idx, minlength=n_folds)
+    mean = np.bincount(fold_idx, weights=y_true, minlength=n_folds)/counts
+
+    ss_res = np.bincount(fold_idx, weights=(y_true - y_pred)**2, minlength=n_folds)
+    ss_tot = np.bincount(fold_idx, weights=(y_true - mean[fold_idx])**2, minlength=n_folds)
+
+    scores = np.ones(n_folds)
+    nonzero = ss_tot != 0
+    scores[nonzero] = 1 - ss_res[nonzero]/ss_tot[nonzero]
+    scores[~nonzero & (ss_res != 0)] = 0.
+
+    return unique_folds, scores
+
+
+# Vectorized scorers by name of the scikit-learn scorer they replace
+SCORERS = {
+    'roc_auc_score': roc_auc_by_fold,
+    'r2_score': r2_by_fold,
+}
+
+
+def _runs(fold_idx, y_score):
+    """Sort the rows by fold then score and find the runs of equal keys.
+
+    Returns the sorting order of the rows, the first sorted position of each
+    run of equal (fold, score), the fold of each run and the first run of
+    each fold.
+    """
+    order = np.lexsort((y_score, fold_idx))
+    f_sorted = fold_idx[order]
+    s_sorted = y_score[order]
+
+    n = order.shape[0]
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (f_sorted[1:] != f_sorted[:-1]) | (s_sorted[1:] != s_sorted[:-1])
+    run_first = np.flatnonzero(new_run)
+    run_fold = f_sorted[run_first]
+    fold_first_run = np.flatnonzero(np.append(True, run_fold[1:] != run_fold[:-1]))
+
+    return order, run_first, run_fold, fold_first_run
+
+
+def weighted_roc_auc_by_fold(folds, y_true, y_score, weights):
+    """Compute the ROC AUC of each fold for several weightings of the rows.
+
+    Each row of weights gives a weighting of the rows, as the sample_weight
+    of roc_auc_score. The rows are sorted by fold and score once for all the
+    weightings: the U statistic is the weight of the (positive, negative)
+    pairs ordered by the scores, ties counting for one half.
+
+    Parameters
+    ----------
+    folds : array-like of shape (n_samples,)
+        Fold of each row.
+    y_true : array-like of shape (n_samples,)
+        Binary true labels, the greatest being the positive class.
+    y_score : array-like of shape (n_samples,)
+        Scores of the positive class.
+    weights : array-like of shape (n_weightings, n_samples)
+        Weights of the rows.
+
+    Returns
+    -------
+    folds : np.ndarray
+        Sorted unique folds.
+    scores : np.ndarray of shape (n_weightings, n_folds)
+        ROC AUC of each fold, NaN if a class has no weight in the fold.
+
+    """
+    unique_folds, fold_idx = _fold_index(folds)
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score, dtype=np.float64)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+    if np.isnan(y_score).any():
+        raise ValueError('Input contains NaN.')
+
+    classes = np.unique(y_true)
+    if classes.shape[0] == 0:  # No rows
+        return unique_folds, np.empty((weights.shape[0], 0))
+    if classes.shape[0] > 2:
+        raise ValueError(f'Only binary y_true is supported, got {classes}.')
+    pos = y_true == classes[-1]
+
+    order, run_first, run_fold, fold_first_run = _runs(fold_idx, y_score)
+    w_sorted = weights[:, order]
+    pos_sorted = pos[order]
+
+    # Weights of the positive and negative rows of each run
+    w_pos = np.add.reduceat(w_sorted*pos_sorted, run_first, axis=1)
+    w_neg = np.add.reduceat(w_sorted*~pos_sorted, run_first, axis=1)
+
+    # Negative weight of the lower scores of the same fold
+    below = np.cumsum(w_neg, axis=1) - w_neg
+    below -= below[:, fold_first_run[run_fold]]
+
+    U = np.add.reduceat(w_pos*(below + w_neg/2), fold_first_run, axis=1)
+    n_pos = np.add.reduceat(w_pos, fold_first_run, axis=1)
+    n_neg = np.add.reduceat(w_neg, fold_first_run, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = U/(n_pos*n_neg)
+    scores[(n_pos == 0) | (n_neg == 0)] = np.nan
+
+    return unique_folds, scores
+
+
+def weighted_r2_by_fold(folds, y_true, y_pred, weights):
+    """Compute the R2 of each fold for several weightings of the rows.
+
+    Each row of weights gives a weighting of the rows, as the sample_weight
+    of r2_score. The weighted sums of each fold are taken for all the
+    weightings at once.
+
+    Parameters
+    ----------
+    folds : array-like of shape (n_samples,)
+        Fold of each row.
+    y_true : array-like of shape (n_samples,)
+        True values.
+    y_pred : array-like of shape (n_samples,)
+        Predicted values.
+    weights : array-like of shape (n_weightings, n_samples)
+        Weights of the rows.
+
+    Returns
+    -------
+    folds : np.ndarray
+        Sorted unique folds.
+    scores : np.ndarray of shape (n_weightings, n_folds)
+        R2 of each fold.
+
+    """
+    unique_folds, fold_idx = _fold_index(folds)
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+    if np.isnan(y_true).any() or np.isnan(y_pred).any():
+        raise ValueError('Input contains NaN.')
+
+    n_folds = unique_folds.shape[0]
+    if n_folds == 0:
+        return unique_folds, np.empty((weights.shape[0], 0))
+
+    # Center on the fold means so that constant folds have exactly no variance
+    counts = np.bincount(fold_idx, minlength=n_folds)
+    mean = np.bincount(fold_idx, weights=y_true, minlength=n_folds)/counts
+    residuals = y_true - y_pred
+    y_true = y_true - mean[fold_idx]
+
+    order = np.argsort(fold_idx, kind='stable')
+    fold_first = np.searchsorted(fold_idx[order], np.arange(n_folds))
+    w_sorted = weights[:, order]
+
+    def wsum(values):
+        return np.add.reduceat(w_sorted*values[order], fold_first, axis=1)
+
+    w = wsum(np.ones_like(y_true))
+    sum_y = wsum(y_true)
+    sum_y2 = wsum(y_true**2)
+    ss_res = wsum(residuals**2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss_tot = np.where(w > 0, sum_y2 - sum_y**2/w, 0.)
+    # Resamples of equal values have no variance, up to rounding errors
+    ss_tot[ss_tot <= 1e-12*sum_y2] = 0.
+
+    scores = np.ones_like(ss_tot)
+    nonzero = ss_tot != 0
+    scores[nonzero] = 1 - ss_res[nonzero]/ss_tot[nonzero]
+    scores[~nonzero & (ss_res != 0)] = 0.
+
+    return unique_folds, scores
+
+
+# Weighted vectorized scorers by name of the scikit-learn scorer they replace
+WEIGHTED_SCORERS = {
+    'roc_auc_score': weighted_roc_auc_by_fold,
+    'r2_score': weighted_r2_by_fold,
+}
+
+
+def bootstrap_by_fold(scorer_name, folds, y_true, y_score, n_bootstrap=1000,
+                      random_state=None, max_values=2*10**6, trials=None):
+    """Bootstrap the mean over the trials of the mean score over the folds.
+
+    The rows of each fold of each trial are resampled with replacement,
+    keeping the size of the folds. A resample weights each row by the number
+    of times it is drawn, so that the resamples are scored all at once by
+    the weighted scorers, by blocks of at most max_values weights.
+
+    Parameters
+    ----------
+    scorer_name : str
+        Name of the scikit-learn scorer, key of WEIGHTED_SCORERS.
+    folds : array-like of shape (n_samples,)
+        Fold of each row.
+    y_true : array-like of shape (n_samples,)
+        True values.
+    y_score : array-like of shape (n_samples,)
+        Predicted values or scores of the positive class.
+    n_bootstrap : int
+        Number of resamples.
+    random_state : int or None
+        Seed of the resampling.
+    max_values : int
+        Maximum number of weights held in memory at once.
+    trials : array-like of shape (n_samples,)
+        Trial of each row, a single trial if None.
+
+    Returns
+    -------
+    np.ndarray of shape (n_bootstrap,)
+        Mean over the trials of the mean score over the folds of each
+        resample, ignoring the folds where the score is not defined.
+
+    """
+    scorer = WEIGHTED_SCORERS[scorer_name]
+    rng = np.random.default_rng(random_state)
+
+    # Resampled and scored groups: the folds of each trial
+    _, fold_idx = _fold_index(folds)
+    if trials is None:
+        trial_idx = np.zeros_like(fold_idx)
+    else:
+        _, trial_idx = _fold_index(trials)
+    groups, group_idx = _fold_index(trial_idx*(fold_idx.max(initial=0) + 1) + fold_idx)
+    n_groups = groups.shape[0]
+    rows = [np.flatnonzero(group_idx == i) for i in range(n_groups)]
+
+    # Trial of each group
+    group_trial = np.zeros(n_groups, dtype=int)
+    group_trial[group_idx] = trial_idx
+    trial_onehot = np.eye(trial_idx.max(initial=0) + 1)[group_trial]
+
+    n = fold_idx.shape[0]
+    block_size = max(1, max_values//max(n, 1))
+    means = np.full(n_bootstrap, np.nan)
+
+    for start in range(0, n_bootstrap, block_size):
+        stop = min(start + block_size, n_bootstrap)
+        b = stop - start
+        draws = np.concatenate([
+            idx[rng.integers(0, idx.shape[0], size=(b, idx.shape[0]))]
+            for idx in rows
+        ], axis=1)
+        # Number of draws of each row in each resample
+        draws += np.arange(b)[:, None]*n
+        weights = np.bincount(draws.ravel(), minlength=b*n).reshape(b, n)
+
+        _, scores = scorer(group_idx, y_true, y_score, weights)
+        defined = ~np.isnan(scores)
+        n_defined = defined @ trial_onehot
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trial_means = (np.where(defined, scores, 0) @ trial_onehot)/n_defined
+            trial_defined = n_defined > 0
+            means[start:stop] = np.where(trial_defined, trial_means, 0).sum(axis=1)/trial_defined.sum(axis=1)
+
+    return means
+
+
+def bootstrap_ci(scorer_name, folds, y_true, y_score, n_bootstrap=1000,
+                 alpha=0.05, random_state=0, trials=None):
+    """Percentile bootstrap confidence interval of the mean score.
+
+    The score is averaged over the folds of each trial, then over the
+    trials, as in the tables of scores.
+
+    Parameters
+    ----------
+    scorer_name : str
+        Name of the scikit-learn scorer, key of WEIGHTED_SCORERS.
+    folds, y_true, y_score, trials : array-like of shape (n_samples,)
+        As in bootstrap_by_fold.
+    n_bootstrap : int
+        Number of resamples.
+    alpha : float
+        The interval covers 1 - alpha of the resampled scores.
+    random_state : int or None
+        Seed of the resampling.
+
+    Returns
+    -------
+    low, high : float
+        Bounds of the interval, NaN if no resample could be scored.
+
+    """
+    means = bootstrap_by_fold(scorer_name, folds, y_true, y_score,
+                              n_bootstrap=n_bootstrap,
+                              random_state=random_state, trials=trials)
+    means = means[~np.isnan(means)]
+    if means.shape[0] == 0:
+        return np.nan, np.nan
+
+    low, high = np.percentile(means, [100*alpha/2, 100*(1 - alpha/2)])
+    return low, high
@@ -1,30 +1,106 @@
 """Prediction tasks for MIMIC."""
+import hashlib
+import io
 import os
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-from dask import dataframe as dd
 
 from .task import TaskMeta
 from .transform import Transform
 from database import dbs
+from prediction.file_utils import write_atomic
 
 
 # Define overall tables
 MIMIC = dbs['MIMIC']
-try:
-    patients = dd.read_csv(MIMIC.frame_paths['patients']).set_index('ROW_ID')
-    diagnoses_icd = dd.read_csv(MIMIC.frame_paths['diagnoses_icd'], assume_missing=True).set_index('ROW_ID')
-    patients_diagnosis = patients.merge(diagnoses_icd.drop(['SEQ_NUM'], axis=1), how='left', on='SUBJECT_ID')
 
-    # Tasks specific tables
-    septic_shock = dd.from_pandas(pd.DataFrame({'ICD9_CODE': ['78552']}), npartitions=1)
-    hemo_shock = dd.from_pandas(pd.DataFrame({'ICD9_CODE': ['78559', '99809', '9584']}), npartitions=1)
 
-except FileNotFoundError:
-    patients = None
-    diagnoses_icd = None
-    patients_diagnosis = None
-    septic_shock = None
-    hemo_shock = None
+# Positive SUBJECT_ID of the tasks, by ICD9 codes and source files
+LABELS_CACHE_FOLDER = 'joblib_cache/labels/MIMIC/'
+
+
+def _fingerprint(paths):
+    """Identify files by their size and mtime."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:  # Missing file
+            fingerprint.append((path, None, None))
+
+    return tuple(fingerprint)
+
+
+def get_positives(codes):
+    """Return the SUBJECT_ID of the patients diagnosed with one of the codes.
+
+    The sorted ids are computed once per codes and version of the patients
+    and diagnoses tables, then stored as npy in LABELS_CACHE_FOLDER so that
+    the trials, the strategies and the selection reuse them.
+
+    Parameters
+    ----------
+    codes : list of str
+        ICD9 codes defining the positive class.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted SUBJECT_ID of the positives.
+
+    """
+    paths = (MIMIC.frame_paths['patients'], MIMIC.frame_paths['diagnoses_icd'])
+    return _load_positives(tuple(sorted(codes)), _fingerprint(paths))
+
+
+@lru_cache(maxsize=None)
+def _load_positives(codes, fingerprint):
+    key = hashlib.sha256(repr((codes, fingerprint)).encode()).hexdigest()
+    filepath = os.path.join(LABELS_CACHE_FOLDER, f'{key}.npy')
+    try:
+        return np.load(filepath)
+    except (OSError, ValueError):  # Not cached yet
+        pass
+
+    patients = pd.read_csv(MIMIC.frame_paths['patients'],
+                           usecols=['SUBJECT_ID'])
+    diagnoses_icd = pd.read_csv(MIMIC.frame_paths['diagnoses_icd'],
+                                usecols=['SUBJECT_ID', 'ICD9_CODE'],
+                                dtype={'ICD9_CODE': str})
+    diagnosed = diagnoses_icd.loc[diagnoses_icd['ICD9_CODE'].isin(codes), 'SUBJECT_ID']
+    positives = np.intersect1d(patients['SUBJECT_ID'], diagnosed).astype(np.int64)
+
+    os.makedirs(LABELS_CACHE_FOLDER, exist_ok=True)
+    buffer = io.BytesIO()
+    np.save(buffer, positives)
+    write_atomic(filepath, buffer.getvalue())
+
+    return positives
+
+
+def define_y(df, codes):
+    """Compute y of the rows of df from the diagnoses of the patients."""
+    positives_idx = pd.Index(get_positives(codes))
+
+    # Get full idx from df and set the complementary to 0
+    idx = df.index
+    # need to intersect because one index of positives_idx is not in idx
+    negatives_idx = idx.difference(positives_idx).intersection(idx)
+    positives_idx = positives_idx.intersection(idx)
+
+    positives = pd.DataFrame({'y': 1}, index=positives_idx)
+    negatives = pd.DataFrame({'y': 0}, index=negatives_idx)
+    df = pd.concat((positives, negatives), axis=0).sort_index()
+
+    return df
+
+
+# Tasks specific ICD9 codes
+SEPTIC_SHOCK_CODES = ['78552']
+HEMO_SHOCK_CODES = ['78559', '99809', '9584']
 
 
 # Task 1: Septic shock prediciton
@@ -34,23 +110,7 @@ def septic_task(**kwargs):
     # Define y
     def define_predict_septic(df):
         """Compute y from patients table."""
-        # Ignore given df
-        positives = patients_diagnosis.merge(septic_shock, how='inner', on='ICD9_CODE')
-        positives = positives.drop_duplicates(subset=['SUBJECT_ID']).set_index('SUBJECT_ID').index
-        positives_idx = positives.compute()
-
-        # Get full idx from df and set the complementary to 0
-        # idx = patients.set_index('SUBJECT_ID').index.compute()
-        idx = df.index
-        # need to intersect because one index of positives_idx is not in idx
-        negatives_idx = idx.difference(positives_idx).intersection(idx)
-        positives_idx = positives_idx.intersection(idx)
-
-        positives = pd.DataFrame({'y': 1}, index=positives_idx)
-        negatives = pd.DataFrame({'y': 0}, index=negatives_idx)
-        df = pd.concat((positives, negatives), axis=0).sort_index()
-
-        return df
+        return define_y(df, SEPTIC_SHOCK_CODES)
 
     septic_predict_transform = Transform(
         input_features=[],
@@ -119,23 +179,7 @@ def hemo_task(**kwargs):
     # Define y
     def define_predict_hemo(df):
         """Compute y from patients table."""
-        # Ignore given df
-        positives = patients_diagnosis.merge(hemo_shock, how='inner', on='ICD9_CODE')
-        positives = positives.drop_duplicates(subset=['SUBJECT_ID']).set_index('SUBJECT_ID').index
-        positives_idx = positives.compute()
-
-        # Get full idx from df and set the complementary to 0
-        # idx = patients.set_index('SUBJECT_ID').index.compute()
-        idx = df.index
-        # need to intersect because one index of positives_idx is not in idx
-        negatives_idx = idx.difference(positives_idx).intersection(idx)
-        positives_idx = positives_idx.intersection(idx)
-
-        positives = pd.DataFrame({'y': 1}, index=positives_idx)
-        negatives = pd.DataFrame({'y': 0}, index=negatives_idx)
-        df = pd.concat((positives, negatives), axis=0).sort_index()
-
-        return df
+        return define_y(df, HEMO_SHOCK_CODES)
 
     hemo_predict_transform = Transform(
         input_features=[],
@@ -29,7 +29,7 @@ class _TaskAccessor(object):
             'RS': RS,
             'T': T,
         }
-        return Task(task_meta[name](**kwargs))
+        return Task(task_meta[name](**kwargs), n_top_pvals=n_top_pvals)
 
     def __getitem__(self, tag):
         """Access a task with default parameters."""
@@ -1,12 +1,15 @@
 """Implement the new way of coding Tasks."""
 import pandas as pd
 import numpy as np
+import os
 from dataclasses import dataclass, field
+from glob import glob
 from typing import Set
 import logging
 
 from df_utils import fill_df, get_missing_values
 from database import dbs, _load_feature_types
+from database.constants import METADATA_PATH
 from .transform import Transform
 from encode import ordinal_encode
 
@@ -72,13 +75,33 @@ class TaskMeta(object):
         """Return db_name/task_name."""
         return f'{self.db}/{self.name}'
 
+    def source_files(self, RS=0, T=0):
+        """Return the paths of the files the task is loaded from.
+
+        The raw data frame, the features' metadata and the pvals of the
+        given random state and trial.
+        """
+        db = dbs[self.db]
+        df_path = db.frame_paths[self.df_name]
+        basename, _ = os.path.splitext(os.path.basename(df_path))
+
+        paths = [
+            df_path,
+            f'{METADATA_PATH}features_types/{db.acronym}/{basename}.csv',
+            f'{METADATA_PATH}ordinal_orders/{db.acronym}/{self.df_name}.yml',
+        ]
+        paths += sorted(glob(f'pvals/{self.tag}/RS{RS}-T{T}-*'))
+
+        return paths
+
 
 class Task(object):
     """Gather a TaskMeta and a dataframe."""
 
-    def __init__(self, meta):
+    def __init__(self, meta, n_top_pvals=None):
         """Init."""
         self.meta = meta
+        self.n_top_pvals = n_top_pvals  # Number of features selected, if any
 
         # Store the features availables in each dataframe
         self._f_init = None
@@ -98,6 +121,9 @@ class Task(object):
 
         self._rows_to_drop = None
 
+        # Encodings fitted on the rows of the task, by encoded dataframe
+        self.encodings = {'select': {}, 'transform': {}}
+
     @property
     def X(self):
         """Input dataset."""
@@ -358,7 +384,8 @@ class Task(object):
             db._load_ordinal_orders(self.meta)
             order = db.ordinal_orders.get(self.meta.tag, None)
             df, _, _, _ = db._encode_df(df, mv, types, order=order,
-                                        encode=self.meta.encode_transform)
+                                        encode=self.meta.encode_transform,
+                                        encodings=self.encodings['transform'])
             self._X_extra_base = df
             self._X_extra_base.sort_index(inplace=True)
 
@@ -369,7 +396,8 @@ class Task(object):
             db._load_ordinal_orders(self.meta)
             order = db.ordinal_orders.get(self.meta.tag, None)
             df, _, _, _ = db._encode_df(df, mv, types, order=order,
-                                        encode=self.meta.encode_select)
+                                        encode=self.meta.encode_select,
+                                        encodings=self.encodings['select'])
             self._X_select_base = df
             self._X_select_base.sort_index(inplace=True)
 
@@ -410,6 +438,77 @@ class Task(object):
 
         self.check_index_consistency()
 
+    def encode_raw(self, df, encodings):
+        """Apply the missing values heuristic and encoding to new raw rows.
+
+        Used at inference on rows having the columns of the initial data
+        frame, without loading the training data. The rows are encoded with
+        the encodings fitted on the training rows, so that their codes do not
+        depend on the rows given. The returned columns must then be aligned
+        on the ones the model was fitted on.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Raw rows indexed by the index column of the task.
+        encodings : dict
+            The encodings attribute of the task the model was trained on.
+
+        Returns
+        -------
+        pd.DataFrame
+            The encoded rows.
+
+        """
+        db = dbs[self.meta.db]
+        df_name = self.meta.df_name
+
+        mv = get_missing_values(df, db.heuristic)
+        df = fill_df(df, mv != 0, np.nan)
+
+        types = _load_feature_types(db, df_name, anonymized=False)
+        db._load_ordinal_orders(self.meta)
+        order = db.ordinal_orders.get(self.meta.tag, None)
+
+        def encode(df, encode, key):
+            if not encode:
+                return df
+            mv = get_missing_values(df, db.heuristic)
+            # Copied: the features unknown at training are not fitted in place
+            df, _, _, _ = db._encode_df(df, mv, types, order=order,
+                                        encode=encode,
+                                        encodings=dict(encodings[key]))
+            return df
+
+        dfs = []
+        select = self.meta.select
+        transform = self.meta.transform
+
+        if select:
+            if select.output_features:
+                select_f = select.get_parent(select.output_features)
+            else:
+                select_f = select.input_features
+            select_f = [f for f in df.columns if f in set(select_f)]
+            dfs.append(encode(df[select_f], self.meta.encode_select, 'select'))
+
+        if transform:
+            transform_f = [f for f in df.columns
+                           if f in set(transform.input_features)]
+            df_transform = encode(df[transform_f], self.meta.encode_transform,
+                                  'transform')
+            missing = set(transform.input_features) - set(df_transform.columns)
+            if missing:
+                raise ValueError(f'Features {missing} needed by the transform '
+                                 f'of {self.meta.tag} are not available.')
+            df_transform = transform.transform(df_transform)
+            dfs.append(df_transform[transform.output_features])
+
+        if not select and not transform:
+            dfs.append(encode(df, self.meta.encode_select, 'select'))
+
+        return pd.concat(dfs, axis=1)
+
     def check_index_consistency(self):
         """Check whether all indexes are equal."""
         dfs = [self._y, self._X_extra, self._X_extra_base, self._X_extra_unenc,
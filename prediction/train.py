@@ -1,24 +1,26 @@
 """Pipeline to train model, find best parameters, give results."""
 import logging
-import os
-import time
-from os.path import join, relpath
+from os.path import relpath
 
 import pandas as pd
 from sklearn.ensemble import BaggingClassifier, BaggingRegressor
 from sklearn.inspection import permutation_importance
-from sklearn.model_selection import ShuffleSplit, StratifiedShuffleSplit
 from sklearn.pipeline import Pipeline
 
+from .benchmark import benchmark_inference
 from .DumpHelper import DumpHelper
-from .TimerStep import TimerStep
+from .FoldData import FoldData
+from .SplitStore import SplitStore
+from .TimerStep import (TimerStep, profile, profile_columns, snapshot,
+                        subtract)
 
 logger = logging.getLogger(__name__)
 
 
 def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
           train_size=None, n_permutation=None, asked_fold=None,
-          results_folder=None):
+          results_folder=None, bench=False, save_model=False, backend='csv',
+          binary=False, keep_versions=5, run_id=None):
     """Train a model (strategy) on some data (task) and dump results.
 
     Parameters
@@ -35,6 +37,26 @@ def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
         Used only for names of folder when dumping results.
     n_bagging : bool
         Whether to use bagging.
+    bench : bool
+        Whether to benchmark the inference of the fitted estimator on the
+        test set for several batch sizes.
+    save_model : bool
+        Whether to dump the fitted estimator of each fold.
+    backend : str
+        Where to dump the results: 'csv' for csv and yml files in the
+        results folder tree, 'sqlite' for a SQLite database in the results
+        folder.
+    binary : bool
+        Whether to dump the predictions and probas in compressed binary files
+        (float32) instead of csv. Only for the csv backend.
+    keep_versions : int
+        Number of runs of the strategy kept in the results folder, the
+        oldest are removed. None to keep them all. Only for the csv backend.
+    run_id : str
+        Id of the run the results are dumped in, the name of its version
+        with the csv backend. The processes dumping the folds of a run in
+        parallel (with asked_fold) must share it, otherwise each one starts
+        a new run, discarding the results of the previous ones.
 
     """
     if task.is_classif() != strategy.is_classification() and not dump_idx_only:
@@ -51,12 +73,21 @@ def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
         logger.info(f'Resetting strategy RS to {RS}')
         strategy.reset_RS(RS)  # Must be done before init DumpHelper
 
+    if asked_fold is not None and run_id is None:
+        logger.warning('Fold dumped in its own run: only the folds of the '
+                       'latest run are read, give a run_id shared by the '
+                       'processes of the run.')
+
     dh = DumpHelper(task, strategy, RS=RS, T=T, n_bagging=n_bagging,
-                    results_folder=results_folder)  # Used to dump results
+                    results_folder=results_folder,
+                    backend=backend, binary=binary,
+                    keep_versions=keep_versions,
+                    run_id=run_id)  # Used to dump results
 
     # Create timer steps used in the pipeline to time training time
     timer_start = TimerStep('start')
     timer_mid = TimerStep('mid')
+    timers = [timer_start, timer_mid]
 
     # Create pipeline with imputation and hyper-parameters tuning
     if strategy.imputer is not None:  # Has an imputation step
@@ -78,6 +109,7 @@ def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
 
     if n_bagging is not None:
         global_timer_start = TimerStep('global_start')
+        timers.append(global_timer_start)
         Bagging = BaggingClassifier if strategy.is_classification() else BaggingRegressor
         estimator = Bagging(estimator, n_estimators=n_bagging, random_state=RS)
         estimator = Pipeline([
@@ -86,111 +118,64 @@ def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
         ])
         print(f'Using {Bagging} with {n_bagging} estimators and RS={RS}.')
 
+    # Convert X to numpy once, folds are gathered from index arrays
+    fold_data = None if dump_idx_only else FoldData(X, y)
+
+    # Splits are computed once per task, RS and trial and shared by strategies
+    store = SplitStore(task, RS=RS, T=T)
+
     logger.info('Before size loop')
     # Size of the train set
     train_set_steps = strategy.train_set_steps if train_size is None else [train_size]
-    for n in train_set_steps:
+    folds_by_size = store.generate(train_set_steps, strategy.n_splits,
+                                   strategy.min_test_set)
+    for n, folds in folds_by_size.items():
         print(f'SIZE {n}')
         logger.info(f'Size {n}')
-        n_tot = X.shape[0]
-        if n_tot - n < strategy.min_test_set*n_tot:
-            # Size of the test set too small, skipping
-            continue
-
-        # Choose right splitter depending on classification or regression
-        if task.is_classif():
-            ss = StratifiedShuffleSplit(n_splits=strategy.n_splits,
-                                        test_size=n_tot-n,
-                                        random_state=RS)
-        else:
-            ss = ShuffleSplit(n_splits=strategy.n_splits, test_size=n_tot-n,
-                              random_state=RS)
 
         # Repetedly draw train and test sets
-        for i, (train_idx, test_idx) in enumerate(ss.split(X, y)):
+        for i, (train_idx, test_idx) in enumerate(folds):
             print(f'FOLD {i}')
             if asked_fold is not None and i != asked_fold:
                 print('skipped')
                 continue
 
-            X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
-            y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
-
-
             # Used to save the IDs of the sub-sampled dataset.
             if dump_idx_only:
                 logger.info(f'Dumped IDs of {task.meta.tag}, size={n}, trial={T}, fold={i}')
-                folder = relpath('ids/')
-                os.makedirs(folder, exist_ok=True)
-                name = task.meta.name.replace('pvals', 'screening')
-                trial = int(T) + 1
-                fold = i + 1
-                common = f'{task.meta.db}-{name}-size{n}-trial{trial}-fold{fold}'
-                filepath_idx_train = join(folder, f'{common}-train-idx.csv')
-                filepath_idx_test = join(folder, f'{common}-test-idx.csv')
-                filepath_col_train = join(folder, f'{common}-train-col.csv')
-                filepath_col_test = join(folder, f'{common}-test-col.csv')
-                pd.Series(X_train.index).to_csv(filepath_idx_train, index=False)
-                pd.Series(X_test.index).to_csv(filepath_idx_test, index=False)
-                pd.Series(X_train.columns).to_csv(filepath_col_train, index=False, header=False)
-                pd.Series(X_test.columns).to_csv(filepath_col_test, index=False, header=False)
+                store.export_csv(n, i, folder=relpath('ids/'))
                 continue  # when dumping IDs, we skip prediction
 
+            X_train, y_train = fold_data.train(train_idx)
+            X_test, y_test = fold_data.test(test_idx)
+
+            for timer in timers:
+                timer.reset()
+
             logger.info(f'Fold {i}: Started fitting the estimator')
             estimator.fit(X_train, y_train)
             logger.info('Ended fitting the estimator')
+            end = snapshot()
 
-            def compute_times(start, mid, end):
-                return {
-                    'imputation': round(mid - start, 6) if start else None,
-                    'tuning': round(end - mid, 6),
-                }
-
+            # Retrieve fit profiles from the snapshots of the timer steps.
+            # Under bagging, the timers are shared by the bagged pipelines
+            # and record once per estimator.
+            imputation = profile(timer_start.fit_records, timer_mid.fit_records)
             if n_bagging is None:
-                # Retrieve fit times from timestamps
-                end_ts = time.time()  # Wall-clock time
-                start_ts = timer_start.last_fit_timestamp
-                mid_ts = timer_mid.last_fit_timestamp
-
-                end_pt = time.process_time()  # Process time (!= Wall-clock time)
-                start_pt = timer_start.last_fit_pt
-                mid_pt = timer_mid.last_fit_pt
-
-                times = compute_times(start_ts, mid_ts, end_ts)
-                pts = compute_times(start_pt, mid_pt, end_pt)
-                imputation_time = times['imputation']
-                tuning_time = times['tuning']
-                imputation_pt = pts['imputation']
-                tuning_pt = pts['tuning']
-
+                tuning = profile(timer_mid.fit_records[-1:], [end])
             else:
-                end_ts = time.time()  # Wall-clock time
-                start_ts = global_timer_start.last_fit_timestamp
-
-                end_pt = time.process_time()  # Process time (!= Wall-clock time)
-                start_pt = global_timer_start.last_fit_pt
-
-                # No mid_timer for bagged estimator
-                times = compute_times(start_ts, start_ts, end_ts)
-                pts = compute_times(start_pt, start_pt, end_pt)
-                imputation_time = times['imputation']
-                tuning_time = times['tuning']
-                imputation_pt = pts['imputation']
-                tuning_pt = pts['tuning']
+                fit = profile(global_timer_start.fit_records, [end])
+                tuning = subtract(fit, imputation)
 
-            # Dump fit times
-            dh.dump_times(imputation_time, tuning_time,
-                          imputation_pt, tuning_pt,
-                          fold=i, tag=str(n))
+            for timer in timers:
+                timer.reset()
 
             # Predict
+            start = snapshot()
             if strategy.is_classification() and strategy.roc:  # ROC asked
                 # Compute probas for retrieving ROC curve
-                probas = estimator.predict_proba(X_test)
                 logger.info('Started predict_proba')
-                # y_pred = np.argmax(probas, axis=1)
-                dh.dump_probas(y_test, probas, fold=i, tag=str(n))
-                y_pred = estimator.predict(X_test)
+                probas = estimator.predict_proba(X_test)
             else:
                 # No need for probas, only predictions
                 if not strategy.is_classification():
@@ -199,25 +184,64 @@ def train(task, strategy, RS=None, dump_idx_only=False, T=0, n_bagging=None,
                     logger.info('ROC: not wanted.')
 
                 logger.info('Started predict')
+                probas = None
+                y_pred = estimator.predict(X_test)
+            end = snapshot()
+
+            # The transform of the imputer is timed by the timer steps,
+            # the remaining time of the call is the prediction itself
+            transform = profile(timer_start.transform_records,
+                                timer_mid.transform_records)
+            predict = subtract(profile([start], [end]), transform)
+
+            def get(p, k):
+                return round(p[k], 6) if p is not None else None
+
+            # Dump fit times and profile of the steps
+            dh.dump_times(get(imputation, 'WCT'), get(tuning, 'WCT'),
+                          get(imputation, 'PT'), get(tuning, 'PT'),
+                          fold=i, tag=str(n),
+                          profile=profile_columns(imputation=imputation,
+                                                  tuning=tuning,
+                                                  transform=transform,
+                                                  predict=predict))
+
+            if probas is not None:
+                # y_pred = np.argmax(probas, axis=1)
+                dh.dump_probas(y_test, probas, fold=i, tag=str(n))
                 y_pred = estimator.predict(X_test)
 
             # Dump results
             logger.info(f'Fold {i}: Ended predict.')
             dh.dump_prediction(y_pred, y_test, fold=i, tag=str(n))
 
+            if save_model:
+                for timer in timers:
+                    timer.reset()
+                dh.dump_model(estimator, fold_data.columns, fold=i,
+                              tag=str(n))
+
+            if bench:
+                logger.info(f'Fold {i}: Started inference benchmark')
+                calls = ['predict']
+                if strategy.is_classification():
+                    calls.append('predict_proba')
+                inference = benchmark_inference(estimator, X_test, calls)
+                dh.dump_inference(inference, fold=i, tag=str(n))
+
             if n_permutation is not None:
                 scoring = 'roc_auc' if strategy.is_classification() else 'r2'
                 r = permutation_importance(estimator, X_test, y_test,
                                            n_repeats=n_permutation,
                                            random_state=RS, scoring=scoring)
 
-                importances = pd.DataFrame(r.importances.T, columns=X_train.columns)
+                importances = pd.DataFrame(r.importances.T, columns=fold_data.columns)
                 importances.index.rename('repeat', inplace=True)
                 importances = importances.reindex(sorted(importances.columns), axis=1)
 
                 dh.dump_importances(importances, fold=i, tag=str(n))
 
-                mv_props = X_test.isna().sum(axis=0)/X_test.shape[0]
+                mv_props = fold_data.mv_props(X_test)
                 mv_props.rename(i, inplace=True)
                 mv_props = mv_props.to_frame().T
                 mv_props = mv_props.reindex(sorted(mv_props.columns), axis=1)
@@ -1,6 +1,6 @@
 """Run the Anova feature selection of scikit-learn."""
 import csv
-import functools
+import io
 import logging
 import os
 from tqdm import tqdm
@@ -10,12 +10,10 @@ import pandas as pd
 from database import dbs
 from database.constants import (BINARY, CATEGORICAL, CONTINUE_I, CONTINUE_R,
                                 ORDINAL)
-from joblib import Parallel, delayed
 from prediction.tasks import tasks
 from prediction.tasks.transform import Transform
-from sklearn.feature_selection import f_classif, f_regression
+from scipy import special, stats
 from sklearn.model_selection import ShuffleSplit, StratifiedShuffleSplit
-from sklearn.preprocessing import OneHotEncoder
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +31,6 @@ def run(args):
     task_name = args.task_name
     task = tasks.get(task_name, n_top_pvals=None)
 
-    temp_dir = f'selected/{task.meta.tag}/temp/'
-
     logger.info('Retreiving db')
     db = dbs[task.meta.db]
 
@@ -44,13 +40,11 @@ def run(args):
 
     if task.is_classif():
         logger.info('Classification, using f_classif')
-        f_callable = f_classif
         ss = StratifiedShuffleSplit(n_splits=TMAX,
                                     test_size=2/3,
                                     random_state=RS)
     else:
         logger.info('Regression, using f_regression')
-        f_callable = f_regression
         ss = ShuffleSplit(n_splits=TMAX, test_size=2/3,
                           random_state=RS)
 
@@ -91,114 +85,222 @@ def run(args):
     y = task.y
     logger.info(f'y reloaded with shape {y.shape}')
 
-    index = y.index
-
-    temp_df_transposed_path = temp_dir+f'RS{RS}-T{T}-X_transposed.csv'
-
     logger.info('Retrieving X')
     X = task.X
     logger.info(f'X loaded with shape {X.shape}')
-    n_features = X.shape[1]
-
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # Little trick here, to iterate efficiently over the features, data is
-    # transposed so that features are now in the place of rows.
-    # This is useful because it is less memory expensive to iterate over
-    # rows than features (rows are loaded on the fly from the file).
-    # Particularly usefull with big datasets that doesn't fit in memory.
-    X_t = X.transpose()
-    X_t.to_csv(temp_df_transposed_path, quoting=csv.QUOTE_ALL)
-
-    # Here we create an iterator over the rows (features, since its transposed)
-    # Data is loaded row by row (since chunksize=1) when the iterator is called
-    X_t = pd.read_csv(temp_df_transposed_path, iterator=True, chunksize=1,
-                      index_col=0)
 
     # Load types
     logger.info('Loading types')
     db._load_feature_types(task.meta)
     types = db.feature_types[task.meta.tag]
 
-    def pval_one_feature(x, y):
-        # Drop rows wih missing values both in f and y
-        x = pd.Series(x, index=index)
-        x.replace(to_replace='', value=np.nan, inplace=True)
-        x = x.astype(float)
-        idx_to_drop = set(x.index[x.isna()])
-        x = x.drop(idx_to_drop, axis=0)
-        y_dropped = y.drop(idx_to_drop, axis=0)
-
-        x = x.to_numpy().reshape(-1, 1)
-        y_dropped = y_dropped.to_numpy().reshape(-1)
-
-        assert x.shape[0] == y_dropped.shape[0]
-
-        if x.shape[0] < 0.01*index.size:  # Not enough sample, skipping
-            return None
-
-        _, pval = f_callable(x, y_dropped)
-
-        # Keep only 6 significant digits (not the same as keeping 6 digits)
-        # eg 1.23456789e-10 -> 1.234567e-10
-        return float(f'{pval[0]:.6g}')
-
-    def handler(row, y):
-        name = row.index[0]
-        x = np.squeeze(np.transpose(row.to_numpy()))
-        logger.info(name)
-
-        if name == '':
-            return
-
-        t = types[name]
-
-        if t == CATEGORICAL or t == BINARY:
-            # categorical encode
-            df = pd.DataFrame({name: x})
-            df = df.astype(str)
-            df.replace(to_replace='', value=np.nan, inplace=True)
+    pvals = anova_pvals(X, y, types, classif=task.is_classif())
 
-            enc = OneHotEncoder(sparse=False)
+    # Keep only 6 significant digits (not the same as keeping 6 digits)
+    # eg 1.23456789e-10 -> 1.234567e-10
+    pvals = pvals.map(lambda p: float(f'{p:.6g}'))
 
-            # Cast to str to prevent: "argument must be a string or number"
-            # error which occurs when mixed types floats and str
-
-            # Fill missing values with a placeholder
-            df.fillna('MISSING_VALUE', inplace=True)
-
-            # Fit transform the encoder
-            data_encoded = enc.fit_transform(df)
-
-            feature_names = list(enc.get_feature_names(list(df.columns)))
-
-            df_encoded = pd.DataFrame(data_encoded,
-                                      index=df.index,
-                                      columns=feature_names
-                                      )
-            L = []
-            for f in df_encoded:
-                L.append((f, pval_one_feature(df_encoded[f], y)))
-            return L
-
-        elif t == CONTINUE_R or t == CONTINUE_I or t == ORDINAL:
-            return [(name, pval_one_feature(x, y))]
-
-        logger.info(f'"{name}" ignored ')
+    dump_path = f'pvals/{task.meta.tag}/RS{RS}-T{T}-pvals.csv'
+    os.makedirs(os.path.dirname(dump_path), exist_ok=True)
+    pvals.to_csv(dump_path, header=False)
+    logger.info(f'p-values of {task.meta.tag} dumped in {dump_path}')
 
-    res = Parallel(
-        n_jobs=-1,
-        require='sharedmem'
-    )(delayed(handler)(r, y) for r in tqdm(X_t, total=n_features))
 
-    res = [r for r in res if r is not None]
+def _classif_stats(X, classes, n_classes):
+    """Count and sum the non missing values of the columns by class."""
+    observed = ~np.isnan(X)
+    X = np.where(observed, X, 0.)
+    onehot = np.eye(n_classes)[classes]
+
+    return onehot.T @ observed, onehot.T @ X, (X**2).sum(axis=0)
+
 
-    res = functools.reduce(lambda x, y: x+y, res)
+def f_oneway_stats(counts, sums, sum_squares):
+    """Compute the p-values of the one-way ANOVA of columns, as f_classif.
 
-    names, pvals = zip(*res)
+    The classes without values in a column are not counted in it, as the
+    classes of y absent once the missing values dropped in f_classif.
 
-    pvals = pd.Series(pvals, index=names)
-    dump_path = f'pvals/{task.meta.tag}/RS{RS}-T{T}-pvals.csv'
-    os.makedirs(os.path.dirname(dump_path), exist_ok=True)
-    pvals.to_csv(dump_path, header=False)
-    logger.info(f'p-values of {task.meta.tag} dumped in {dump_path}')
+    Parameters
+    ----------
+    counts : np.ndarray of shape (n_classes, n_features)
+        Number of values of each class in each column.
+    sums : np.ndarray of shape (n_classes, n_features)
+        Sum of the values of each class in each column.
+    sum_squares : np.ndarray of shape (n_features,)
+        Sum of the squared values of each column.
+
+    Returns
+    -------
+    np.ndarray of shape (n_features,)
+        p-values.
+
+    """
+    n = counts.sum(axis=0)
+    n_classes = (counts > 0).sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        square_of_sums = sums.sum(axis=0)**2
+        ss_tot = sum_squares - square_of_sums/n
+        ssbn = np.where(counts > 0, sums**2/counts, 0.).sum(axis=0) - square_of_sums/n
+        sswn = ss_tot - ssbn
+        dfbn = n_classes - 1
+        dfwn = n - n_classes
+        f = (ssbn/dfbn)/(sswn/dfwn)
+
+    return special.fdtrc(dfbn, dfwn, f)
+
+
+def _regression_stats(X, y):
+    """Sum the non missing values of the columns and the matching y."""
+    observed = (~np.isnan(X)).astype(float)
+    X = np.where(observed, X, 0.)
+
+    return (observed.sum(axis=0), X.sum(axis=0), (X**2).sum(axis=0),
+            y @ observed, y**2 @ observed, y @ X)
+
+
+def f_regression_stats(n, sx, sxx, sy, syy, sxy):
+    """Compute the p-values of the univariate regressions, as f_regression.
+
+    As f_regression, the features or targets with no variance get a p-value
+    of 1.
+
+    Parameters
+    ----------
+    n : np.ndarray of shape (n_features,)
+        Number of values of each column.
+    sx, sxx : np.ndarray of shape (n_features,)
+        Sum of the values and of the squared values of each column.
+    sy, syy : np.ndarray of shape (n_features,)
+        Sum of y and of y squared on the values of each column.
+    sxy : np.ndarray of shape (n_features,)
+        Sum of the products of the values of each column and y.
+
+    Returns
+    -------
+    np.ndarray of shape (n_features,)
+        p-values.
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = sx/n
+        y_mean = sy/n
+        x_norm = np.sqrt(sxx - n*x_mean**2)
+        y_norm = np.sqrt(np.maximum(syy - n*y_mean**2, 0.))
+        corr = (sxy - y_mean*sx)/x_norm/y_norm
+
+        dof = n - 2
+        corr2 = corr**2
+        f = corr2/(1 - corr2)*dof
+        pvals = stats.f.sf(f, 1, dof)
+
+    pvals[np.isnan(f)] = 1.
+    return pvals
+
+
+def _csv_categories(x):
+    """Return the categories of the values, as former transposed csv gave.
+
+    The values were written to a csv and each one read back alone, so that
+    eg 1 and '1' both give '1' and the missing values give 'nan'. Done on the
+    unique values only.
+    """
+    uniques = x.drop_duplicates()
+    buffer = io.StringIO()
+    uniques.to_frame().transpose().to_csv(buffer, quoting=csv.QUOTE_ALL)
+    buffer.seek(0)
+    read = pd.read_csv(buffer, index_col=0).to_numpy().reshape(-1).astype(str)
+
+    categories, codes = np.unique(read, return_inverse=True)
+    return categories, codes[pd.Index(uniques).get_indexer(x)]
+
+
+def anova_pvals(X, y, types, classif, min_prop=0.01, max_values=2*10**7):
+    """Compute the ANOVA p-values of the features of X against y.
+
+    The continuous and ordinal features are screened by blocks of columns:
+    the F statistics of a block are computed at once from the sums of the
+    non missing values by class (classification) or from their covariance
+    with y (regression), as f_classif and f_regression on the rows where
+    each feature is not missing. The categorical features are one-hot
+    encoded, the missing values being a category, and their one-hot columns
+    screened from the counts of the categories.
+
+    Parameters
+    ----------
+    X : pd.DataFrame
+        Features.
+    y : array-like of shape (n_samples,)
+        Target.
+    types : pd.Series
+        Type of each feature. The features not continuous, ordinal,
+        categorical or binary are ignored.
+    classif : bool
+        Whether y is a class, else a continuous target.
+    min_prop : float
+        Minimum proportion of non missing values of a feature, its p-value
+        is NaN below.
+    max_values : int
+        Maximum number of values of a block of columns.
+
+    Returns
+    -------
+    pd.Series
+        p-value of the features, the categorical ones being one-hot encoded
+        as name_category.
+
+    """
+    y = np.asarray(y).reshape(-1)
+    n = y.shape[0]
+
+    if classif:
+        _, classes = np.unique(y, return_inverse=True)
+        n_classes = classes.max() + 1
+        class_counts = np.bincount(classes, minlength=n_classes)
+    else:
+        y = y.astype(float)
+        y = y - y.mean()
+
+    numeric = [f for f in X.columns if f != '' and types[f] in (CONTINUE_R, CONTINUE_I, ORDINAL)]
+    categorical = [f for f in X.columns if f != '' and types[f] in (CATEGORICAL, BINARY)]
+    for f in X.columns.difference(numeric + categorical):
+        logger.info(f'"{f}" ignored ')
+
+    results = dict()  # List of (name, p-value) of each feature
+    block_size = max(1, max_values//max(n, 1))
+    for start in tqdm(range(0, len(numeric), block_size)):
+        block = numeric[start:start+block_size]
+        x = X[block].astype(float).to_numpy()
+
+        if classif:
+            p = f_oneway_stats(*_classif_stats(x, classes, n_classes))
+        else:
+            p = f_regression_stats(*_regression_stats(x, y))
+
+        p[(~np.isnan(x)).sum(axis=0) < min_prop*n] = np.nan  # Not enough samples
+        results.update((f, [(f, pval)]) for f, pval in zip(block, p))
+
+    for f in categorical:
+        categories, codes = _csv_categories(X[f])
+        n_categories = categories.shape[0]
+        counts = np.bincount(codes, minlength=n_categories).astype(float)
+
+        if classif:
+            joint = np.bincount(classes*n_categories + codes,
+                                minlength=n_classes*n_categories)
+            joint = joint.reshape(n_classes, n_categories).astype(float)
+            sizes = np.repeat(class_counts[:, None], n_categories, axis=1)
+            p = f_oneway_stats(sizes, joint, counts)
+        else:
+            # All the rows are values of the one-hot columns
+            p = f_regression_stats(
+                np.full(n_categories, float(n)), counts, counts,
+                np.full(n_categories, y.sum()), np.full(n_categories, (y**2).sum()),
+                np.bincount(codes, weights=y, minlength=n_categories))
+
+        results[f] = list(zip([f'{f}_{c}' for c in categories], p))
+
+    # In the order of the features
+    names, pvals = zip(*[r for f in X.columns for r in results.get(f, [])])
+    return pd.Series(pvals, index=names, dtype=float)
@@ -8,8 +8,10 @@ from .boxplots import run_boxplot
 from .tabs import run_desc, run_scores
 from .difficulty import run_difficulty
 from .breakout import run_breakout
+from .inference import run_inference
 from .mi import run_multiple_imputation
 from .importance import run_feature_importance
+from .build import build, run_all
 
 
 plt.rcParams.update({
@@ -30,15 +32,22 @@ def run(args):
     os.makedirs(graphics_folder, exist_ok=True)
     print(f'Dump into "{graphics_folder}"')
 
+    force = getattr(args, 'force', False)
+
+    def target(func, **kwargs):
+        # Skipped if its inputs did not change since its last build
+        build(graphics_folder, args.action, func,
+              dict(graphics_folder=graphics_folder, **kwargs), force=force)
+
     if args.action == 'wilcoxon':
-        run_wilcoxon(graphics_folder, linear=args.linear,
-                     csv=args.csv, greater=not args.less)
+        target(run_wilcoxon, linear=args.linear, csv=args.csv,
+               greater=not args.less)
 
     elif args.action == 'friedman':
-        run_friedman(graphics_folder, linear=args.linear, csv=args.csv, ref=args.ref)
+        target(run_friedman, linear=args.linear, csv=args.csv, ref=args.ref)
 
     elif args.action == 'scores':
-        run_scores(graphics_folder, linear=args.linear, csv=args.csv)
+        target(run_scores, linear=args.linear, csv=args.csv)
 
     elif args.action == 'mv':
         run_mv(args, graphics_folder)
@@ -50,10 +59,10 @@ def run(args):
         run_cor(args, graphics_folder, csv=args.csv, absolute=args.abs)
 
     elif args.action == 'boxplot':
-        run_multiple_imputation(graphics_folder, linear=args.linear)
+        target(run_multiple_imputation, linear=args.linear)
 
     elif args.action == 'desc':
-        run_desc(graphics_folder)
+        target(run_desc)
 
     elif args.action == 'time':
         run_time()
@@ -62,17 +71,26 @@ def run(args):
         run_score_check()
 
     elif args.action == 'difficulty':
-        run_difficulty(graphics_folder, args.avg)
+        target(run_difficulty, averaged_scores=args.avg)
 
     elif args.action == 'breakout':
-        run_breakout(graphics_folder, linear=args.linear)
+        target(run_breakout, linear=args.linear)
+
+    elif args.action == 'inference':
+        run_inference(graphics_folder, args.filepath, linear=args.linear,
+                      csv=args.csv)
 
     elif args.action == 'mi':
-        run_multiple_imputation(graphics_folder, args.n, args.bagging_only, args.linear)
+        target(run_multiple_imputation, n=args.n,
+               bagging_only=args.bagging_only, linear=args.linear)
 
     elif args.action == 'imp':
         run_feature_importance(graphics_folder, args.root, args.n,
-                               args.average_folds, args.mode, args.hue_by_task)
+                               args.average_folds, args.mode, args.hue_by_task,
+                               n_jobs=args.n_jobs)
+
+    elif args.action == 'all':
+        run_all(graphics_folder, n_jobs=args.n_jobs, force=force)
 
     else:
         raise ValueError(f'Not known action {args.action}.')
@@ -3,12 +3,11 @@ import os
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
 
 from custom.const import get_fig_folder
 from prediction.df_utils import aggregate
-from .common import filepaths
+from .common import load_scores, output
 
 tasks_to_drop = {
     'TB': 'platelet',
@@ -29,8 +28,7 @@ def run_breakout(graphics_folder, linear):
     #     'scores/scores_mi_25000.csv',
     #     'scores/scores_mia_100000.csv',
     # ]
-    dfs = [pd.read_csv(path, index_col=0) for path in filepaths]
-    scores = pd.concat(dfs, axis=0)
+    scores = load_scores()
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -254,7 +252,7 @@ def run_breakout(graphics_folder, linear):
     fig_folder = get_fig_folder(graphics_folder)
     fig_name = 'breakout'
 
-    plt.savefig(os.path.join(fig_folder, f'{fig_name}.pdf'), bbox_inches='tight')
-    plt.savefig(os.path.join(fig_folder, f'{fig_name}.jpg'), bbox_inches='tight', dpi=400)
+    plt.savefig(output(os.path.join(fig_folder, f'{fig_name}.pdf')), bbox_inches='tight')
+    plt.savefig(output(os.path.join(fig_folder, f'{fig_name}.jpg')), bbox_inches='tight', dpi=400)
     plt.tight_layout()
     # plt.show()
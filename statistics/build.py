@@ -0,0 +1,262 @@
+"""Build the figures and tables of the paper, skipping the up to date ones."""
+import hashlib
+import inspect
+import json
+import os
+import sys
+from functools import lru_cache
+from os.path import join
+
+import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
+from prediction.file_utils import locked, write_atomic
+
+from .breakout import run_breakout
+from .common import load_scores, share, shared, track_inputs, track_outputs
+from .difficulty import run_difficulty
+from .importance import run_feature_importance
+from .mi import run_multiple_imputation
+from .tabs import run_desc, run_scores
+from .tests import run_friedman, run_wilcoxon
+
+
+def get_targets(graphics_folder):
+    """Return the figures and tables to build, as the make all recipe.
+
+    The parameters are the ones given by the figs subcommands, so that both
+    share the records of the build cache.
+
+    Returns
+    -------
+    dict
+        Map the name of the targets to the function building them and its
+        keyword arguments.
+
+    """
+    gf = graphics_folder
+    return {
+        'mi': (run_multiple_imputation, dict(
+            graphics_folder=gf, n=None, bagging_only=False, linear=False)),
+        'mi-bagging': (run_multiple_imputation, dict(
+            graphics_folder=gf, n=None, bagging_only=True, linear=False)),
+        'mi-linear': (run_multiple_imputation, dict(
+            graphics_folder=gf, n=None, bagging_only=False, linear=True)),
+        'breakout': (run_breakout, dict(graphics_folder=gf, linear=False)),
+        'difficulty': (run_difficulty, dict(graphics_folder=gf, averaged_scores=True)),
+        'importance': (run_feature_importance, dict(
+            graphics_folder=gf, results_folder='results_mia_importance', n=None,
+            average_folds=True, mode='abs', hue_by_task=True)),
+        'friedman-trees': (run_friedman, dict(
+            graphics_folder=gf, linear=False, csv=False, ref='MIA')),
+        'friedman-linear': (run_friedman, dict(
+            graphics_folder=gf, linear=True, csv=False, ref=None)),
+        'wilcoxon-trees': (run_wilcoxon, dict(
+            graphics_folder=gf, linear=False, csv=False, greater=True)),
+        'wilcoxon-linear': (run_wilcoxon, dict(
+            graphics_folder=gf, linear=True, csv=False, greater=True)),
+        'scores-trees': (run_scores, dict(graphics_folder=gf, linear=False, csv=False)),
+        'scores-linear': (run_scores, dict(graphics_folder=gf, linear=True, csv=False)),
+        'desc': (run_desc, dict(graphics_folder=gf)),
+    }
+
+
+# Record of the inputs each target was built from, in the graphics folder
+BUILD_CACHE_FILENAME = 'build_cache.json'
+
+
+@lru_cache(maxsize=None)
+def _content_hash(path, mtime_ns, size):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def file_hash(path):
+    """Return the sha256 of the content of a file, None if missing."""
+    try:
+        stat = os.stat(path)
+        return _content_hash(path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def target_key(func, kwargs):
+    """Identify a target by its function and its parameters."""
+    params = json.dumps(kwargs, sort_keys=True, default=str)
+    target = f'{func.__module__}.{func.__qualname__}({params})'
+    return hashlib.sha256(target.encode()).hexdigest()
+
+
+def load_build_cache(graphics_folder):
+    """Return the records of the targets built in the graphics folder."""
+    try:
+        with open(join(graphics_folder, BUILD_CACHE_FILENAME), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_build_cache(graphics_folder, records):
+    """Add the records of newly built targets to the build cache."""
+    with locked(graphics_folder):
+        cache = load_build_cache(graphics_folder)
+        cache.update(records)
+        write_atomic(join(graphics_folder, BUILD_CACHE_FILENAME),
+                     json.dumps(cache, indent=1, sort_keys=True))
+
+
+# Folder of the modules of the project, whose sources are inputs of the targets
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def source_files(func):
+    """Return the source files of the project modules a function depends on.
+
+    The module of func and, recursively, the project modules it imports or
+    imports objects from.
+    """
+    todo = [sys.modules[func.__module__]]
+    seen = set()
+    while todo:
+        module = todo.pop()
+        path = getattr(module, '__file__', None)
+        if module.__name__ in seen or path is None:
+            continue
+        if not os.path.abspath(path).startswith(ROOT + os.sep):
+            continue
+        seen.add(module.__name__)
+
+        for value in vars(module).values():
+            if not inspect.ismodule(value):
+                value = sys.modules.get(getattr(value, '__module__', None) or '')
+            if value is not None:
+                todo.append(value)
+
+    return sorted(inspect.getsourcefile(sys.modules[name]) for name in seen)
+
+
+def is_up_to_date(cache, key):
+    """Tell if a target was built and its inputs did not change since.
+
+    The inputs are the score files and the source of the modules building
+    the target. Only the targets reading their scores through load_scores
+    and recording their outputs are tracked, the other ones are never up to
+    date. A target whose outputs were deleted is not up to date.
+    """
+    record = cache.get(key)
+    if record is None or not record['scores'] or not record.get('outputs'):
+        return False
+
+    if not all(os.path.exists(path) for path in record['outputs']):
+        return False
+
+    return all(file_hash(path) == h for path, h in record['inputs'].items())
+
+
+def build_target(name, func, kwargs, memo=None):
+    """Build a target and return the record of the inputs it was built from.
+
+    Parameters
+    ----------
+    name : str
+        Name of the target, for display.
+    func : callable
+        Function building the target.
+    kwargs : dict
+        Parameters of func.
+    memo : dict
+        Results shared by the process launching the worker.
+
+    Returns
+    -------
+    dict
+        The score files read, the files written, and the hash of the score
+        files and of the sources of the modules func depends on.
+
+    """
+    if memo is not None:
+        share(memo)
+    inputs = track_inputs()
+    outputs = track_outputs()
+    print(f'Building {name}')
+
+    # Targets run in the same worker must not see the style set by others
+    with plt.rc_context():
+        func(**kwargs)
+    plt.close('all')
+
+    scores = sorted(inputs)
+    paths = scores + source_files(func)
+
+    return {
+        'name': name,
+        'scores': scores,
+        'outputs': sorted(outputs),
+        'inputs': {path: file_hash(path) for path in paths},
+    }
+
+
+def build(graphics_folder, name, func, kwargs, force=False):
+    """Build a target unless its inputs did not change since its last build.
+
+    Parameters
+    ----------
+    graphics_folder : str
+        Folder where the target is dumped, storing the build cache.
+    name : str
+        Name of the target, for display.
+    func : callable
+        Function building the target.
+    kwargs : dict
+        Parameters of func.
+    force : bool
+        Whether to build the target even if up to date.
+
+    """
+    key = target_key(func, kwargs)
+    if not force and is_up_to_date(load_build_cache(graphics_folder), key):
+        print(f'{name} is up to date')
+        return
+
+    record = build_target(name, func, kwargs)
+    update_build_cache(graphics_folder, {key: record})
+
+
+def run_all(graphics_folder, n_jobs=1, force=False):
+    """Build all the figures and tables of the paper.
+
+    The targets whose inputs did not change since their last build are
+    skipped. The scores are loaded and the Wilcoxon tests computed once,
+    then shared with the worker processes rendering the targets.
+
+    Parameters
+    ----------
+    graphics_folder : str
+        Folder where to dump the figures and tables.
+    n_jobs : int
+        Number of processes rendering the figures and tables.
+    force : bool
+        Whether to build all the targets even if up to date.
+
+    """
+    cache = load_build_cache(graphics_folder)
+    targets = {}
+    for name, (func, kwargs) in get_targets(graphics_folder).items():
+        key = target_key(func, kwargs)
+        if not force and is_up_to_date(cache, key):
+            print(f'{name} is up to date')
+            continue
+        targets[key] = (name, func, kwargs)
+
+    if not targets:
+        return
+
+    # Shared intermediates
+    load_scores()
+    load_scores(['scores/scores.csv'])
+    run_wilcoxon(graphics_folder=None, spacing=False, no_rename=True)
+    memo = shared()
+
+    records = Parallel(n_jobs=n_jobs)(
+        delayed(build_target)(name, func, kwargs, memo)
+        for name, func, kwargs in targets.values())
+    update_build_cache(graphics_folder, dict(zip(targets, records)))
@@ -1,3 +1,7 @@
+"""Score files of the paper and intermediates shared by its figures."""
+import pandas as pd
+
+
 filepaths = [
     'scores/scores.csv',
     'scores/scores_mi_2500.csv',
@@ -13,3 +17,68 @@ filepaths = [
     'scores/scores_mean+mask+bagging_25000.csv',
     'scores/scores_mean+mask+bagging_100000.csv',
 ]
+
+# Results computed once per process and shared by the figures and tables,
+# with the input files they were computed from
+_memo = {}
+
+# Input files read and output files written by the current target
+_inputs = set()
+_outputs = set()
+
+
+def memoize(key, compute):
+    """Return the result stored under key, computing it on first call."""
+    if key not in _memo:
+        outer_inputs = set(_inputs)
+        _inputs.clear()
+        value = compute()
+        _memo[key] = (value, frozenset(_inputs))
+        _inputs.update(outer_inputs)
+
+    value, inputs = _memo[key]
+    _inputs.update(inputs)
+
+    return value
+
+
+def shared():
+    """Return the shared results, to give them to worker processes."""
+    return dict(_memo)
+
+
+def share(memo):
+    """Set shared results computed by another process."""
+    _memo.update(memo)
+
+
+def track_inputs():
+    """Forget the input files read so far and return the set recording them."""
+    _inputs.clear()
+    return _inputs
+
+
+def track_outputs():
+    """Forget the output files written so far and return the set recording them."""
+    _outputs.clear()
+    return _outputs
+
+
+def output(path):
+    """Record a file written by the current target and return its path."""
+    _outputs.add(path)
+    return path
+
+
+def load_scores(paths=filepaths):
+    """Return the concatenated scores of the given files.
+
+    The files are read once per process and a copy is returned, so that the
+    callers may modify it.
+    """
+    def read():
+        _inputs.update(paths)
+        dfs = [pd.read_csv(path, index_col=0) for path in paths]
+        return pd.concat(dfs, axis=0)
+
+    return memoize(('scores', tuple(paths)), read).copy()
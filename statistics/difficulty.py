@@ -7,7 +7,7 @@ import itertools
 
 from prediction.df_utils import get_ranks_tab, aggregate
 from custom.const import get_fig_folder, get_tab_folder
-from .common import filepaths
+from .common import load_scores, output
 
 
 tasks_to_drop = {
@@ -29,8 +29,7 @@ def run_difficulty(graphics_folder, averaged_scores=True):
         'scores/scores_mi_25000.csv',
         'scores/scores_mia_100000.csv',
     ]
-    dfs = [pd.read_csv(path, index_col=0) for path in filepaths]
-    scores = pd.concat(dfs, axis=0)
+    scores = load_scores(filepaths)
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -158,8 +157,8 @@ def run_difficulty(graphics_folder, averaged_scores=True):
     fig_folder = get_fig_folder(graphics_folder)
     fig_name = 'rank_vs_difficulty'
 
-    fig1.savefig(os.path.join(fig_folder, f'{fig_name}_auc.pdf'), bbox_inches='tight', pad_inches=0)
-    fig1.savefig(os.path.join(fig_folder, f'{fig_name}_auc.jpg'), bbox_inches='tight', pad_inches=0)
+    fig1.savefig(output(os.path.join(fig_folder, f'{fig_name}_auc.pdf')), bbox_inches='tight', pad_inches=0)
+    fig1.savefig(output(os.path.join(fig_folder, f'{fig_name}_auc.jpg')), bbox_inches='tight', pad_inches=0)
 
-    fig2.savefig(os.path.join(fig_folder, f'{fig_name}_r2.pdf'), bbox_inches='tight', pad_inches=0)
-    fig2.savefig(os.path.join(fig_folder, f'{fig_name}_r2.jpg'), bbox_inches='tight', pad_inches=0)
+    fig2.savefig(output(os.path.join(fig_folder, f'{fig_name}_r2.pdf')), bbox_inches='tight', pad_inches=0)
+    fig2.savefig(output(os.path.join(fig_folder, f'{fig_name}_r2.jpg')), bbox_inches='tight', pad_inches=0)
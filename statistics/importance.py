@@ -1,6 +1,4 @@
 import copy
-import os
-import re
 from functools import reduce
 from os.path import join
 
@@ -9,6 +7,11 @@ import pandas as pd
 import seaborn as sns
 import statsmodels.api as sm
 from custom.const import get_fig_folder
+from joblib import Parallel, delayed
+from prediction.DumpHelper import read_folds
+from prediction.Manifest import Manifest
+
+from .common import output
 
 db_order = [
     'Traumabase',
@@ -49,86 +52,134 @@ rename_db = {
 }
 
 
-def run_feature_importance(graphics_folder, results_folder, n, average_folds,
-                           mode, hue_by_task):
+def index_importances(results_folder):
+    """Return the importance files of the results folder.
+
+    The files are listed from the manifest of the results folder, built by
+    scanning it on the first call.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns db, task, method, trial, size and kind (importances or
+        mv_props), one row per file.
+
+    """
+    df = Manifest(results_folder).load()
+    df = df[df['method'].str.startswith('RS0_')]
+
+    files = df['filename'].str.extract(r'^(\d+)_(importances|mv_props)\.csv$')
+    df = df.assign(size=files[0], kind=files[1]).dropna(subset=['kind'])
 
-    def retrive_importance(n):
+    return df[['db', 'task', 'method', 'trial', 'size', 'kind']]
 
-        filenames = [
-            f'{n}_importances.csv',
-            f'{n}_mv_props.csv',
-        ]
 
-        dfs = []
+def _read_importance(folder, n, db, task, trial):
+    """Read the importances and missing values proportions of a method.
 
-        # Aggregate feature importances of all tasks
-        for root, subdirs, files in os.walk(results_folder):
-            print(root)
+    Returns
+    -------
+    importance : pd.DataFrame
+        Long format, one row per fold, repeat and feature.
+    mv_props : pd.DataFrame
+        Long format, one row per fold and feature.
 
-            res = re.search(join(results_folder, '/(.*)/RS'), root)
+    """
+    importance = read_folds(join(folder, f'{n}_importances.csv'), index_col=0)
+    importance = pd.melt(importance.reset_index(), id_vars=['fold', 'repeat'],
+                         var_name='feature', value_name='importance_abs')
 
-            if res is None:
-                continue
+    mv_props = read_folds(join(folder, f'{n}_mv_props.csv'), index_col=0)
+    mv_props = pd.melt(mv_props, id_vars=['fold'], var_name='feature',
+                       value_name='mv_prop')
 
-            if not all([f in files for f in filenames]):
-                continue
+    keys = {
+        'task': task.replace('_', '\\_').replace('pvals', 'screening'),
+        'db': rename_db.get(db, db),
+        'trial': trial,
+    }
 
-            task = res.group(1)
-            db = task.split('/')[0]
-            res = re.search('RS0_T(.)_', root)
-            trial = res.group(1)
-            task = task.replace('_', '\\_').replace('pvals', 'screening')
+    return importance.assign(**keys), mv_props.assign(**keys)
 
-            importance = pd.read_csv(join(root, f'{n}_importances.csv'), index_col=0)
-            mv_props = pd.read_csv(join(root, f'{n}_mv_props.csv'), index_col=0)
-            mv_props.set_index('fold', inplace=True)
 
-            importance.reset_index(inplace=True)
-            importance.set_index(['fold', 'repeat'], inplace=True)
-            importance_avg = importance.groupby(level='fold').mean()
+def load_importances(results_folder, n, average_folds, index=None, n_jobs=1):
+    """Load the importances of the features of all the tasks for a size.
 
-            if average_folds:
-                importance_avg = importance_avg.mean()
-                importance_avg = importance_avg.to_frame().T
-                mv_props = mv_props.mean()
-                mv_props = mv_props.to_frame().T
-                id_vars = None
-                index = ['feature']
+    Parameters
+    ----------
+    results_folder : str
+        Folder where the results are stored.
+    n : int
+        Train size.
+    average_folds : bool
+        Whether to average the importances and proportions over the folds.
+    index : pd.DataFrame
+        Files of the results folder, as given by index_importances. Computed
+        if None.
+    n_jobs : int
+        Number of jobs reading the files.
 
-            else:
-                importance_avg.reset_index(inplace=True)
-                mv_props.reset_index(inplace=True)
-                id_vars = ['fold']
-                index = ['fold', 'feature']
+    Returns
+    -------
+    pd.DataFrame
+        Indexed by task and trial, with the feature, the fold if not
+        averaged, the absolute and relative importances and the proportion
+        of missing values.
 
-            importance_avg = pd.melt(importance_avg, id_vars=id_vars,
-                                     var_name='feature', value_name='importance_abs')
-            importance_avg.set_index(index, inplace=True)
+    """
+    if index is None:
+        index = index_importances(results_folder)
 
-            mv_props = pd.melt(mv_props, id_vars=id_vars, var_name='feature', value_name='mv_prop')
-            mv_props.set_index(index, inplace=True)
+    # Methods having both files for the size
+    files = index[index['size'] == str(n)]
+    key = ['db', 'task', 'method', 'trial']
+    methods = files.groupby(key)['kind'].nunique()
+    methods = methods[methods == 2].reset_index()
 
-            df = pd.concat([importance_avg, mv_props], axis=1)
-            assert not pd.isna(df).any().any()
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_read_importance)(join(results_folder, db, task, method), n,
+                                  db, f'{db}/{task}', trial)
+        for db, task, method, trial in methods[key].itertuples(index=False))
 
-            df['db'] = rename_db.get(db, db)
-            df['trial'] = trial
-            df = pd.concat({task: df}, names=['task'])
+    importance = pd.concat([r[0] for r in results], axis=0)
+    mv_props = pd.concat([r[1] for r in results], axis=0)
 
-            dfs.append(df)
+    # Average over the repeats, then the folds
+    index = ['fold', 'feature']
+    group = ['task', 'trial', 'db']
+    importance = importance.groupby(group + index)['importance_abs'].mean()
+    mv_props = mv_props.groupby(group + index)['mv_prop'].mean()
 
-        df = pd.concat(dfs, axis=0)
+    if average_folds:
+        index = ['feature']
+        importance = importance.groupby(level=group + index).mean()
+        mv_props = mv_props.groupby(level=group + index).mean()
+
+    df = pd.concat([importance, mv_props], axis=1)
+    assert not pd.isna(df).any().any()
+
+    df.reset_index(inplace=True)
+    df = df[['task'] + index + ['importance_abs', 'mv_prop', 'db', 'trial']]
+    df.set_index(['task', 'trial'], inplace=True)
+    df_agg = df.groupby(['task', 'trial']).agg({'importance_abs': 'mean'})
+
+    df['importance_ref'] = df_agg
+    df['importance_rel'] = df['importance_abs'] - df['importance_ref']
+    df['importance_rel_%'] = (df['importance_abs'] - df['importance_ref'])/df['importance_ref']
+    df['importance_ratio'] = df['importance_abs']/df['importance_ref']
+
+    return df
 
-        df.reset_index(inplace=True)
-        df.set_index(['task', 'trial'], inplace=True)
-        df_agg = df.groupby(['task', 'trial']).agg({'importance_abs': 'mean'})
 
-        df['importance_ref'] = df_agg
-        df['importance_rel'] = df['importance_abs'] - df['importance_ref']
-        df['importance_rel_%'] = (df['importance_abs'] - df['importance_ref'])/df['importance_ref']
-        df['importance_ratio'] = df['importance_abs']/df['importance_ref']
+def run_feature_importance(graphics_folder, results_folder, n, average_folds,
+                           mode, hue_by_task, n_jobs=-1):
+
+    # Files listed once for all the sizes
+    files = index_importances(results_folder)
 
-        return df
+    def retrive_importance(n):
+        return load_importances(results_folder, n, average_folds, index=files,
+                                n_jobs=n_jobs)
 
     plt.rcParams.update({
         'font.size': 10,
@@ -305,5 +356,5 @@ def run_feature_importance(graphics_folder, results_folder, n, average_folds,
 
     fig_name = f'importance_{n}_avg_{mode}_hue{hue_by_task}' if average_folds else f'importance_{n}_{mode}'
     fig_folder = get_fig_folder(graphics_folder)
-    fig.savefig(join(fig_folder, f'{fig_name}.pdf'), bbox_inches='tight')
-    fig.savefig(join(fig_folder, f'{fig_name}.jpg'), bbox_inches='tight', dpi=300)
+    fig.savefig(output(join(fig_folder, f'{fig_name}.pdf')), bbox_inches='tight')
+    fig.savefig(output(join(fig_folder, f'{fig_name}.jpg')), bbox_inches='tight', dpi=300)
@@ -0,0 +1,114 @@
+"""Plot the inference cost of the methods."""
+import os
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+from custom.const import get_fig_folder, get_tab_folder
+from .tests import tasks_to_drop
+
+
+method_order = [
+    'MIA',
+    'Mean',
+    'Mean+mask',
+    'Med',
+    'Med+mask',
+    'Iter',
+    'Iter+mask',
+    'KNN',
+    'KNN+mask',
+    'MI',
+    'MI+mask',
+    'MIA+bagging',
+]
+
+linear_method_order = [
+    'Linear+Mean',
+    'Linear+Mean+mask',
+    'Linear+Med',
+    'Linear+Med+mask',
+    'Linear+Iter',
+    'Linear+Iter+mask',
+    'Linear+KNN',
+    'Linear+KNN+mask',
+]
+
+
+def run_inference(graphics_folder, filepath, linear=False, csv=False):
+    """Plot throughput and latency of the inference of each method.
+
+    Parameters
+    ----------
+    graphics_folder : str
+        Folder where to dump the figure and table.
+    filepath : str
+        Path of the inference benchmarks aggregated with
+        `aggregate --inference`.
+    linear : bool
+        Whether to plot the linear methods instead of the others.
+    csv : bool
+        Whether to dump the table in csv as well.
+
+    """
+    df = pd.read_csv(filepath, index_col=0)
+
+    # Drop tasks
+    for db, task in tasks_to_drop.items():
+        df.drop(index=df[(df['db'] == db) & (df['task'] == task)].index, inplace=True)
+
+    df['task'] = df['task'].str.replace('_pvals', '_screening')
+
+    order = linear_method_order if linear else method_order
+    order = [m for m in order if m in df['method'].unique()]
+    df = df.query('method in @order and call == "predict"')
+
+    # Average the folds and trials of each task
+    df = df.groupby(['size', 'db', 'task', 'method', 'batch_size']).agg({
+        'rows_per_sec': 'mean',
+        'latency_p50': 'mean',
+        'latency_p99': 'mean',
+    }).reset_index()
+
+    fig, axes = plt.subplots(1, 2, figsize=(10, 4.5))
+
+    ax = axes[0]
+    sns.lineplot(x='batch_size', y='rows_per_sec', hue='method',
+                 hue_order=order, data=df, ax=ax, marker='o', ci=None,
+                 estimator='median')
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Batch size')
+    ax.set_ylabel('Throughput (rows/s)')
+    ax.legend(title='Method', fontsize=8)
+
+    # Latency of the predictions of a single row
+    ax = axes[1]
+    single = df.query('batch_size == 1')
+    sns.boxplot(x='latency_p99', y='method', order=order, data=single, ax=ax)
+    ax.set_xscale('log')
+    ax.set_xlabel('Single row latency, 99th percentile (s)')
+    ax.set_ylabel(None)
+
+    plt.tight_layout()
+
+    fig_folder = get_fig_folder(graphics_folder)
+    fig_name = 'inference_linear' if linear else 'inference'
+    plt.savefig(os.path.join(fig_folder, f'{fig_name}.pdf'), bbox_inches='tight')
+    plt.savefig(os.path.join(fig_folder, f'{fig_name}.jpg'), bbox_inches='tight', dpi=400)
+
+    # Table of median throughput and latency across tasks
+    tab = df.groupby(['method', 'batch_size']).agg({
+        'rows_per_sec': 'median',
+        'latency_p50': 'median',
+        'latency_p99': 'median',
+    })
+    tab = tab.reindex(order, level=0)
+    print(tab)
+
+    tab_folder = get_tab_folder(graphics_folder)
+    tab.to_latex(os.path.join(tab_folder, f'{fig_name}.tex'),
+                 float_format='%.3g')
+    if csv:
+        tab.to_csv(os.path.join(tab_folder, f'{fig_name}.csv'))
@@ -1,11 +1,10 @@
 from os.path import join
 
-import pandas as pd
 import seaborn as sns
 from custom.const import get_fig_folder
 from prediction.PlotHelper import PlotHelper
 
-from .common import filepaths
+from .common import load_scores, output
 from .tests import run_wilcoxon
 
 rename = {
@@ -148,8 +147,7 @@ def run_multiple_imputation(graphics_folder, n=None, bagging_only=False, linear=
 
     reference_method = 'MIA'
 
-    dfs = [pd.read_csv(path, index_col=0) for path in filepaths]
-    scores = pd.concat(dfs, axis=0)
+    scores = load_scores()
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -344,7 +342,7 @@ def run_multiple_imputation(graphics_folder, n=None, bagging_only=False, linear=
     fig_name = f'boxplots_{name}_scores_{n}'
     fig_time_name = f'boxplots_{name}_times_{n}'
 
-    fig.savefig(join(fig_folder, f'{fig_name}.pdf'), bbox_inches='tight')
-    fig_time.savefig(join(fig_folder, f'{fig_time_name}.pdf'), bbox_inches='tight')
-    fig.savefig(join(fig_folder, f'{fig_name}.jpg'), bbox_inches='tight')
-    fig_time.savefig(join(fig_folder, f'{fig_time_name}.jpg'), bbox_inches='tight')
+    fig.savefig(output(join(fig_folder, f'{fig_name}.pdf')), bbox_inches='tight')
+    fig_time.savefig(output(join(fig_folder, f'{fig_time_name}.pdf')), bbox_inches='tight')
+    fig.savefig(output(join(fig_folder, f'{fig_name}.jpg')), bbox_inches='tight')
+    fig_time.savefig(output(join(fig_folder, f'{fig_time_name}.jpg')), bbox_inches='tight')
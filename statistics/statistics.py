@@ -1,5 +1,7 @@
 """Compute statistics about missing values on a databse."""
 import os
+from datetime import datetime, timedelta
+from functools import lru_cache
 from os.path import join
 
 import matplotlib
@@ -12,7 +14,9 @@ from database.constants import (BINARY, CATEGORICAL, CONTINUE_R,
                                 is_categorical, is_continue, is_continuous,
                                 is_ordinal)
 from joblib import Memory
+from prediction.file_utils import fingerprint
 from prediction.tasks import tasks
+from prediction.TimerStep import PROFILE_COLUMNS
 from tqdm import tqdm
 
 from .common import filepaths
@@ -22,6 +26,10 @@ from .tests import tasks_to_drop
 
 memory = Memory('joblib_cache')
 
+# Bounds of the cache, the least recently used results are evicted first
+CACHE_MAX_BYTES = 2*1024**3
+CACHE_MAX_AGE = timedelta(days=30)
+
 
 plt.rcParams.update({
     'text.usetex': True,
@@ -64,18 +72,60 @@ db_rename = {
 }
 
 
-def get_indicators_mv(df_mv):
-    """Compute indicators about missing values. Used for plotting figures."""
+def get_indicators_mv(df_mv, chunksize=None):
+    """Compute indicators about missing values. Used for plotting figures.
+
+    The indicators are accumulated over chunks of rows in one pass on int8
+    masks. Only the non missing values mask is kept, packed as bits, for the
+    rows affected by the removal of features (5), which depends on the
+    features having missing values and needs a second pass on it.
+
+    Parameters
+    ----------
+    df_mv : pd.DataFrame or iterable of pd.DataFrame
+        Types of missing values (0: not missing, 1: not applicable,
+        2: not available), or chunks of rows of them having the same columns.
+    chunksize : int
+        If df_mv is a data frame, number of rows processed at once.
+
+    """
+    if isinstance(df_mv, pd.DataFrame):
+        n = df_mv.shape[0]
+        chunksize = chunksize or max(n, 1)
+        chunks = [df_mv.iloc[i:i+chunksize] for i in range(0, max(n, 1), chunksize)]
+    else:
+        chunks = df_mv
+
+    columns = None
+    n_rows = 0
+    n_mv1_fw = 0  # Number of MV 1 by feature
+    n_mv2_fw = 0  # Number of MV 2 by feature
+    n_r = np.zeros(4, dtype=np.int64)  # Rows without MV, MV1 only, MV2 only, both
+    not_mv_bits = []  # Mask of the non missing values, packed
+
+    for chunk in chunks:
+        if columns is None:
+            columns = chunk.columns
+        codes = chunk.to_numpy(dtype=np.int8)
+        mv1 = codes == 1
+        mv2 = codes == 2
+
+        n_rows += codes.shape[0]
+        n_mv1_fw = n_mv1_fw + mv1.sum(axis=0)
+        n_mv2_fw = n_mv2_fw + mv2.sum(axis=0)
+        n_r += np.bincount(mv1.any(axis=1) + 2*mv2.any(axis=1), minlength=4)
+        not_mv_bits.append(np.packbits(codes == 0, axis=1))
+
+    if columns is None:
+        raise ValueError('No rows of missing values given.')
+
     # 1: Statistics on the full database
-    n_rows, n_cols = df_mv.shape
+    n_cols = len(columns)
     n_values = n_rows*n_cols
-    df_mv1 = df_mv == 1
-    df_mv2 = df_mv == 2
-    df_mv_bool = df_mv != 0
 
     # Number of missing values in the DB
-    n_mv1 = df_mv1.values.sum()
-    n_mv2 = df_mv2.values.sum()
+    n_mv1 = n_mv1_fw.sum()
+    n_mv2 = n_mv2_fw.sum()
     n_mv = n_mv1 + n_mv2
     n_not_mv = n_values - n_mv
 
@@ -101,12 +151,11 @@ def get_indicators_mv(df_mv):
     })
 
     # 2: Number of features with missing values
-    # For each feature, tells if it contains MV of type 1
-    df_f_w_mv1 = df_mv1.any().rename('MV1')
-    # For each feature, tells if it contains MV of type 2
-    df_f_w_mv2 = df_mv2.any().rename('MV2')
-    # Concat previous series
-    df_f_w_mv = pd.concat([df_f_w_mv1, df_f_w_mv2], axis=1)
+    # For each feature, tells if it contains MV of type 1 and of type 2
+    df_f_w_mv = pd.DataFrame({
+        'MV1': n_mv1_fw > 0,
+        'MV2': n_mv2_fw > 0,
+    }, index=columns)
 
     # Add columns for logical combination of the two series
     df_f_w_mv['MV'] = df_f_w_mv['MV1'] | df_f_w_mv['MV2']  # MV1 or MV2
@@ -146,8 +195,8 @@ def get_indicators_mv(df_mv):
     })
 
     # 3: Statistics feature-wise
-    n_mv1_fw = df_mv1.sum().to_frame('N MV1')  # Number of MV 1 by feature
-    n_mv2_fw = df_mv2.sum().to_frame('N MV2')  # Number of MV 2 by feature
+    n_mv1_fw = pd.Series(n_mv1_fw, index=columns).to_frame('N MV1')
+    n_mv2_fw = pd.Series(n_mv2_fw, index=columns).to_frame('N MV2')
 
     n_mv_fw = pd.concat([n_mv1_fw, n_mv2_fw], axis=1)
     n_mv_fw['N MV'] = n_mv_fw['N MV1'] + n_mv_fw['N MV2']
@@ -165,28 +214,12 @@ def get_indicators_mv(df_mv):
     df_3 = n_mv_fw
 
     # 4: Rows without missing values
-    # For each row, tells if it contains MV of type 1
-    df_r_w_mv1 = df_mv1.any(axis=1).rename('MV1')
-    # For each row, tells if it contains MV of type 2
-    df_r_w_mv2 = df_mv2.any(axis=1).rename('MV2')
-    # Concat previous series
-    df_r_w_mv = pd.concat([df_r_w_mv1, df_r_w_mv2], axis=1)
-
-    # Add columns for logical combination of the two series
-    df_r_w_mv['MV'] = df_r_w_mv['MV1'] | df_r_w_mv['MV2']  # MV1 or MV2
-    df_r_w_mv['MV1a2'] = df_r_w_mv['MV1'] & df_r_w_mv['MV2']  # MV1 and MV2
-    df_r_w_mv['MV1o'] = df_r_w_mv['MV1'] & ~df_r_w_mv['MV2']  # MV1 only
-    df_r_w_mv['MV2o'] = ~df_r_w_mv['MV1'] & df_r_w_mv['MV2']  # MV2 only
-
-    # By summing, derive the number of rows with MV of a given type
-    df_n_r_w_mv = df_r_w_mv.sum()
-
     # Numbers of rows with missing values
-    n_r_w_mv = df_n_r_w_mv['MV']  # MV1 or MV2
-    n_r_w_mv1_o = df_n_r_w_mv['MV1o']  # MV1 only
-    n_r_w_mv2_o = df_n_r_w_mv['MV2o']  # MV2 only
-    n_r_w_mv_1a2 = df_n_r_w_mv['MV1a2']  # MV1 and MV2
-    n_r_wo_mv = n_rows - df_n_r_w_mv['MV']  # Without MV
+    n_r_w_mv = n_r[1:].sum()  # MV1 or MV2
+    n_r_w_mv1_o = n_r[1]  # MV1 only
+    n_r_w_mv2_o = n_r[2]  # MV2 only
+    n_r_w_mv_1a2 = n_r[3]  # MV1 and MV2
+    n_r_wo_mv = n_r[0]  # Without MV
 
     # Frequencies of rows with missing values
     f_r_w_mv1_o = 100*n_r_w_mv1_o/n_rows
@@ -210,36 +243,24 @@ def get_indicators_mv(df_mv):
     })
 
     # 5: Number of rows affected if we remove features with MV
-    df_f_w_mv1 = df_f_w_mv['MV1']  # Series of features having MV1
-    df_f_w_mv2 = df_f_w_mv['MV2']  # Series of features having MV2
-    df_f_w_mv_1o2 = df_f_w_mv['MV']  # Series of features having MV1 or MV2
-    df_f_w_mv1_o = df_f_w_mv['MV1o']  # Series of features having MV1 only
-    df_f_w_mv2_o = df_f_w_mv['MV2o']  # Series of features having MV2 only
-    df_f_w_mv_1a2 = df_f_w_mv['MV1a2']  # Series of features having MV1 and MV2
-
-    df_features = pd.Series(True, index=df_f_w_mv.index)
-
-    features_to_drop_mv1 = df_features.loc[~df_f_w_mv1].index
-    features_to_drop_mv2 = df_features.loc[~df_f_w_mv2].index
-    features_to_drop_mv_1o2 = df_features.loc[~df_f_w_mv_1o2].index
-    features_to_drop_mv1_o = df_features.loc[~df_f_w_mv1_o].index
-    features_to_drop_mv2_o = df_features.loc[~df_f_w_mv2_o].index
-    features_to_drop_mv_1a2 = df_features.loc[~df_f_w_mv_1a2].index
-
-    df_mv1_dropped = df_mv_bool.drop(features_to_drop_mv1, 1)
-    df_mv2_dropped = df_mv_bool.drop(features_to_drop_mv2, 1)
-    df_mv_1o2_dropped = df_mv_bool.drop(features_to_drop_mv_1o2, 1)
-    df_mv1_o_dropped = df_mv_bool.drop(features_to_drop_mv1_o, 1)
-    df_mv2_o_dropped = df_mv_bool.drop(features_to_drop_mv2_o, 1)
-    df_mv_1a2_dropped = df_mv_bool.drop(features_to_drop_mv_1a2, 1)
+    # Features kept for each type: MV1, MV2, MV1 or MV2, MV1 only, MV2 only,
+    # MV1 and MV2
+    kept = df_f_w_mv[['MV1', 'MV2', 'MV', 'MV1o', 'MV2o', 'MV1a2']].to_numpy()
+
+    # Rows having a non missing value on the kept features
+    n_r_a_rm = np.zeros(kept.shape[1], dtype=np.int64)
+    for bits in not_mv_bits:
+        not_mv = np.unpackbits(bits, axis=1, count=n_cols).astype(np.float32)
+        n_r_a_rm += (not_mv @ kept.astype(np.float32) > 0).sum(axis=0)
 
     # Number of rows affected if we remove feature having MV of type:
-    n_r_a_rm_mv1 = (~df_mv1_dropped).any(axis=1).sum()  # MV1
-    n_r_a_rm_mv2 = (~df_mv2_dropped).any(axis=1).sum()  # MV2
-    n_r_a_rm_mv_1o2 = (~df_mv_1o2_dropped).any(axis=1).sum()  # MV1 or MV2
-    n_r_a_rm_mv1_o = (~df_mv1_o_dropped).any(axis=1).sum()  # MV1 only
-    n_r_a_rm_mv2_o = (~df_mv2_o_dropped).any(axis=1).sum()  # MV2 only
-    n_r_a_rm_mv_1a2 = (~df_mv_1a2_dropped).any(axis=1).sum()  # MV1 and MV2
+    (n_r_a_rm_mv1,  # MV1
+     n_r_a_rm_mv2,  # MV2
+     n_r_a_rm_mv_1o2,  # MV1 or MV2
+     n_r_a_rm_mv1_o,  # MV1 only
+     n_r_a_rm_mv2_o,  # MV2 only
+     n_r_a_rm_mv_1a2,  # MV1 and MV2
+     ) = n_r_a_rm
 
     # Frequencies of rows affected if we remove feature having MV of type:
     f_r_a_rm_mv1 = 100*n_r_a_rm_mv1/n_rows  # MV1
@@ -267,12 +288,14 @@ def get_indicators_mv(df_mv):
 
     # 6: Proportion of information lost when removing features with MV
     # Number
-    n_v_lost_mv1 = (~df_mv1_dropped).sum().sum()
-    n_v_lost_mv2 = (~df_mv2_dropped).sum().sum()
-    n_v_lost_mv_1o2 = (~df_mv_1o2_dropped).sum().sum()
-    n_v_lost_mv1_o = (~df_mv1_o_dropped).sum().sum()
-    n_v_lost_mv2_o = (~df_mv2_o_dropped).sum().sum()
-    n_v_lost_mv_1a2 = (~df_mv_1a2_dropped).sum().sum()
+    n_not_mv_fw = n_rows - n_mv_fw['N MV'].reindex(columns).to_numpy()
+    (n_v_lost_mv1,
+     n_v_lost_mv2,
+     n_v_lost_mv_1o2,
+     n_v_lost_mv1_o,
+     n_v_lost_mv2_o,
+     n_v_lost_mv_1a2,
+     ) = n_not_mv_fw @ kept.astype(np.int64)
 
     # Frequencies
     f_v_lost_mv1 = 100*n_v_lost_mv1/n_values
@@ -429,16 +452,76 @@ def every_mv_distribution():
     return fig, axes
 
 
-@memory.cache
-def cached_indicators(task_tag, encode_features=False):
-    task = tasks[task_tag]
+def reduce_cache(memory=memory, max_bytes=CACHE_MAX_BYTES,
+                 max_age=CACHE_MAX_AGE):
+    """Evict the results of a joblib cache not used for long or in excess.
+
+    Parameters
+    ----------
+    memory : joblib.Memory
+        The cache to reduce.
+    max_bytes : int
+        Size of the cache above which the least recently used results are
+        removed. None for no limit.
+    max_age : datetime.timedelta
+        Results not used for longer are removed. None for no limit.
+
+    """
+    store = memory.store_backend
+    if store is None:  # No cache location
+        return
+
+    items = sorted(store.get_items(), key=lambda item: item.last_access)
+    size = sum(item.size for item in items)
+    now = datetime.now()
 
-    if not encode_features and 'pvals' in task_tag:
+    for item in items:
+        too_old = max_age is not None and now - item.last_access > max_age
+        too_big = max_bytes is not None and size > max_bytes
+        if not too_old and not too_big:
+            break
+        store.clear_location(item.path)
+        size -= item.size
+
+
+@lru_cache(maxsize=2)
+def _load_task(task_tag, T, encode):
+    """Return the task, shared by the statistics computed on it.
+
+    Always called with positional arguments: lru_cache keys the keyword ones
+    apart.
+    """
+    task = tasks.get(task_tag, T=T)
+
+    if not encode:
         task.meta.encode_select = None
         task.meta.encode_transform = None
 
+    return task
+
+
+def _fingerprint(task_tag, T=0):
+    """Identify the files a task is loaded from by their size and mtime.
+
+    Given to the cached functions, so that their results are recomputed when
+    the raw data, the pvals or the features' metadata change.
+    """
+    meta = _load_task(task_tag, T, True).meta
+    return fingerprint(meta.source_files(RS=0, T=T))
+
+
+def cached_indicators(task_tag, encode_features=False):
+    reduce_cache()
+    encode = encode_features or 'pvals' not in task_tag
+    return _cached_indicators(task_tag, encode, _fingerprint(task_tag))
+
+
+@memory.cache
+def _cached_indicators(task_tag, encode, fingerprint):
+    task = _load_task(task_tag, 0, encode)
+
     mv = task.mv
-    indicators = get_indicators_mv(mv)
+    indicators = get_indicators_mv(mv, chunksize=10000)
 
     return indicators
 
@@ -487,9 +570,14 @@ def run_mv(args, graphics_folder):
     plt.show()
 
 
-@memory.cache
 def cached_types(task_tag, encode_features=False, T=0):
-    task = tasks.get(task_tag, T=T)
+    reduce_cache()
+    return _cached_types(task_tag, T, _fingerprint(task_tag, T=T))
+
+
+@memory.cache
+def _cached_types(task_tag, T, fingerprint):
+    task = _load_task(task_tag, T, True)
     db_name = task.meta.db
     db = dbs[db_name]
     df_name = task.meta.df_name
@@ -581,15 +669,19 @@ def run_prop(args, graphics_folder):
     # plt.show()
 
 
-def compute_correlation(_X):
+def compute_correlation(_X, block_size=10000):
     """Compute the pairwise correlation from observations of a feature vector.
 
     Similar to numpy.corrcoef except that it ignores missing observations in X.
+    The sums needed for all the pairs are computed with products of the
+    masked matrices, accumulated by blocks of observations to bound memory.
 
     Parameters
     ----------
     X : np.array of shape (k, n)
         Matrix containing the n observations of the k features
+    block_size : int
+        Number of observations processed at once.
 
     Returns
     -------
@@ -597,27 +689,47 @@ def compute_correlation(_X):
         Pairwise correlation coefficients
     N : np.array of shape (k, k)
         Number of values taken for correlation computation of pair of features
-        Number of values taken for correlation computation of pair of features
 
     """
-    X = np.array(_X)
+    X = np.array(_X, dtype=np.float64)
     k, n = X.shape
-    R = np.nan*np.ones((k, k))
-    N = np.zeros((k, k))
-
-    for i in range(k):
-        for j in range(k):
-            x1 = X[i, :]
-            x2 = X[j, :]
-
-            # Select index for which no missing values are in x1 nor x2
-            idx = ~np.isnan(x1) & ~np.isnan(x2)
-            n_values = np.sum(idx)
-            if n_values < 100:
-                print(f'Warning: only {n_values} values taken for correlation.')
-
-            R[i, j] = np.nan if n_values < 3 else np.corrcoef([x1[idx], x2[idx]])[0, 1]
-            N[i, j] = n_values
+    blocks = [slice(b, b + block_size) for b in range(0, n, block_size)]
+
+    # Center the features to limit the cancellation in the sums below
+    S = np.zeros(k)
+    C = np.zeros(k)
+    for b in blocks:
+        S += np.nansum(X[:, b], axis=1)
+        C += np.sum(~np.isnan(X[:, b]), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(C > 0, S/C, 0)
+
+    N = np.zeros((k, k))  # Number of values of the pairs
+    S1 = np.zeros((k, k))  # Sum of feature i where j observed
+    S2 = np.zeros((k, k))  # Sum of squares of feature i where j observed
+    S12 = np.zeros((k, k))  # Sum of products
+    for b in blocks:
+        M = ~np.isnan(X[:, b])
+        Mf = M.astype(np.float64)
+        Z = np.where(M, X[:, b] - mean[:, None], 0)
+        N += Mf @ Mf.T
+        S1 += Z @ Mf.T
+        S2 += (Z*Z) @ Mf.T
+        S12 += Z @ Z.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = S12 - S1*S1.T/N
+        var = S2 - S1**2/N
+        var[var <= 1e-12*S2] = 0  # Constant on the values of the pair
+        R = cov/np.sqrt(var*var.T)
+
+    R[(N < 3) | ~np.isfinite(R)] = np.nan
+    R = np.clip(R, -1, 1)
+
+    n_few = np.sum(N < 100)
+    if n_few > 0:
+        print(f'Warning: only {int(N.min())} values taken for correlation '
+              f'({n_few} pairs with less than 100 values).')
 
     if isinstance(_X, pd.DataFrame):
         features = _X.index
@@ -626,14 +738,19 @@ def compute_correlation(_X):
     return R, N
 
 
-@memory.cache
 def cached_task_correlation(task_tag, encode_features=False, T=0):
-    task = tasks.get(task_tag, T=T)
+    reduce_cache()
+    return _cached_task_correlation(task_tag, T, _fingerprint(task_tag, T=T))
+
+
+@memory.cache
+def _cached_task_correlation(task_tag, T, fingerprint):
+    task = _load_task(task_tag, T, True)
     db_name = task.meta.db
     db = dbs[db_name]
     df_name = task.meta.df_name
 
-    task_types = cached_types(task_tag, encode_features=encode_features, T=T)
+    task_types = cached_types(task_tag, T=T)
 
 
     f_categorical = task_types.map(is_categorical)
@@ -782,6 +899,7 @@ def run_time():
         f'\tCPU time: {int(total_pt/3600)} hours\n'
         f'\tWall-clock time: {int(total_wct/3600)} hours'
     )
+    df_all = df
     method = 'MIA'
 
     df = df.query('method == @method')
@@ -799,6 +917,22 @@ def run_time():
         f'\tWall-clock time: {int(total_wct/3600)} hours'
     )
 
+    # Profile of the steps, only available for recent results
+    cols = [c for c in PROFILE_COLUMNS if c in df_all.columns]
+    if not cols:
+        return
+
+    df = df_all.dropna(subset=cols, how='all')
+    prof = df.groupby('method')[cols].agg(['mean', 'max'])
+    prof = prof.loc[:, [(c, 'max' if c.endswith('_RSS') else 'mean') for c in cols]]
+    prof.columns = prof.columns.droplevel(1)
+
+    print(
+        'Mean profile of the steps per fold (perf_counter and thread time '
+        'in seconds, max increase of the peak RSS in MB):'
+    )
+    print(prof.round(3).to_string())
+
 
 def run_score_check():
      for path in filepaths:
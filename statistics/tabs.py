@@ -1,5 +1,4 @@
 """Create tabs of the article"""
-import os
 from os.path import join
 import pandas as pd
 
@@ -7,7 +6,7 @@ from prediction.PlotHelper import PlotHelper
 from .tests import tasks_to_drop, db_rename, db_order
 from prediction.df_utils import get_scores_tab, get_ranks_tab
 from custom.const import get_tab_folder
-from .common import filepaths
+from .common import load_scores, output
 
 
 def run_scores(graphics_folder, linear, csv=False, relative=True):
@@ -28,8 +27,7 @@ def run_scores(graphics_folder, linear, csv=False, relative=True):
     #     'scores/scores_mean+mask+bagging_10000.csv',
     #     'scores/scores_mean+mask+bagging_25000.csv',
     # ]
-    dfs = [pd.read_csv(path, index_col=0) for path in filepaths]
-    df = pd.concat(dfs, axis=0)
+    df = load_scores()
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -156,19 +154,18 @@ def run_scores(graphics_folder, linear, csv=False, relative=True):
     tab1_name = f'scores_linear{abs}' if linear else f'scores{abs}'
     tab2_name = f'ranks_linear{abs}' if linear else f'ranks{abs}'
 
-    scores.to_latex(join(tab_folder, f'{tab1_name}.tex'), na_rep='', escape=False)#, table_env='tabularx') #, column_format='L'*scores.shape[1])
-    ranks.to_latex(join(tab_folder, f'{tab2_name}.tex'), na_rep='', escape=False,
+    scores.to_latex(output(join(tab_folder, f'{tab1_name}.tex')), na_rep='', escape=False)#, table_env='tabularx') #, column_format='L'*scores.shape[1])
+    ranks.to_latex(output(join(tab_folder, f'{tab2_name}.tex')), na_rep='', escape=False,
     #table_env='tabularx',
     column_format=column_format)
 
     if csv:
-        scores.to_csv(join(tab_folder, f'{tab1_name}.csv'))
-        ranks.to_csv(join(tab_folder, f'{tab2_name}.csv'))
+        scores.to_csv(output(join(tab_folder, f'{tab1_name}.csv')))
+        ranks.to_csv(output(join(tab_folder, f'{tab2_name}.csv')))
 
 
 def run_desc(graphics_folder):
-    path = os.path.abspath('scores/scores.csv')
-    df = pd.read_csv(path, index_col=0)
+    df = load_scores(['scores/scores.csv'])
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -239,7 +236,7 @@ def run_desc(graphics_folder):
     column_format = 'l'*df.index.nlevels+'l'*(n-2)+'X'*2
 
     with pd.option_context("max_colwidth", None):
-        df.to_latex(join(tab_folder, 'task_description.tex'),
+        df.to_latex(output(join(tab_folder, 'task_description.tex')),
                     # table_env='tabularx',
                     bold_rows=False, na_rep=None, escape=False,
                     column_format=column_format,
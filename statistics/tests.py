@@ -10,7 +10,7 @@ from prediction.df_utils import get_ranks_tab, get_scores_tab
 from prediction.PlotHelper import PlotHelper
 from scipy.stats import chi2, f, wilcoxon
 
-from .common import filepaths
+from .common import load_scores, memoize, output
 
 tasks_to_drop = {
     'TB': 'platelet',
@@ -239,13 +239,72 @@ def run_wilcoxon_():
     print(W_test)
 
 
-    W_test.to_csv('scores/wilcoxon.csv')
-    W_test.to_latex('scores/wilcoxon.tex', na_rep='')
+    W_test.to_csv(output('scores/wilcoxon.csv'))
+    W_test.to_latex(output('scores/wilcoxon.tex'), na_rep='')
 
     # W_test1 = W_test.loc[half1]
     # W_test2 = W_test.loc[half2]
 
 
+def _wilcoxon_mia_tests(method_order, db_order):
+    """Wilcoxon tests between MIA and every other method, on each size.
+
+    Computed once per process, the greater and less tables share them.
+    """
+    def compute():
+        df = load_scores()
+
+        # Drop tasks
+        for db, task in tasks_to_drop.items():
+            df.drop(index=df[(df['db'] == db) & (df['task'] == task)].index, inplace=True)
+
+        df['task'] = df['task'].str.replace('_pvals', '_screening')
+
+        df = get_scores_tab(df, method_order=method_order, db_order=db_order,
+                            average_sizes=False, formatting=False, add_empty_methods=False)
+        sizes = df.index.get_level_values(0).unique()
+
+        rows = []
+        for size in sizes:
+            scores = df.loc[size]
+            ref_scores = scores.loc['MIA']
+
+            methods = scores.index.unique()
+            methods = [m for m in methods if m != 'MIA']
+
+            for method in methods:
+                m_scores = scores.loc[method]
+                idx = m_scores.notnull()
+
+                x = ref_scores[idx]
+                y = m_scores[idx]
+
+                assert not x.isnull().any()
+                assert not y.isnull().any()
+
+                w_double = wilcoxon(x=x, y=y, alternative='two-sided')
+                w_greater = wilcoxon(x=x, y=y, alternative='greater')
+                w_less = wilcoxon(x=x, y=y, alternative='less')
+
+                rows.append([size, method, w_double[0], w_double[1], w_greater[0], w_greater[1], w_less[0], w_less[1]])
+
+        W_test = pd.DataFrame(rows, columns=[
+            'size',
+            'method',
+            'two-sided_stat',
+            'two-sided_pval',
+            'greater_stat',
+            'greater_pval',
+            'less_stat',
+            'less_pval',
+            ]).set_index(['size', 'method'])
+
+        return W_test
+
+    key = ('wilcoxon_mia', tuple(method_order), tuple(db_order))
+    return memoize(key, compute).copy()
+
+
 def run_wilcoxon_mia(graphics_folder, csv=False, greater=True, spacing=True, no_rename=False):
     """Wilcoxon test between MIA and every other methods (including linear)."""
     # path = os.path.abspath('scores/scores.csv')
@@ -266,26 +325,9 @@ def run_wilcoxon_mia(graphics_folder, csv=False, greater=True, spacing=True, no_
     #     'scores/scores_mean+mask+bagging_25000.csv',
     #     'scores/scores_mean+mask+bagging_100000.csv',
     # ]
-    dfs = [pd.read_csv(os.path.abspath(path), index_col=0) for path in filepaths]
-    df = pd.concat(dfs, axis=0)
-
     which = 'greater' if greater else 'less'
     other = 'less' if greater else 'greater'
 
-    # # Drop tasks
-    # df = df.set_index(['db', 'task'])
-    # for db, task in tasks_to_drop.items():
-    #     df = df.drop((db, task), axis=0)
-    # df = df.reset_index()
-
-
-    # Drop tasks
-    for db, task in tasks_to_drop.items():
-        df.drop(index=df[(df['db'] == db) & (df['task'] == task)].index, inplace=True)
-
-
-    df['task'] = df['task'].str.replace('_pvals', '_screening')
-
     method_order1 = [
         'Mean',
         'Mean+mask',
@@ -320,44 +362,7 @@ def run_wilcoxon_mia(graphics_folder, csv=False, greater=True, spacing=True, no_
         'NHIS',
     ]
 
-    df = get_scores_tab(df, method_order=method_order, db_order=db_order,
-                        average_sizes=False, formatting=False, add_empty_methods=False)
-    sizes = df.index.get_level_values(0).unique()
-
-    rows = []
-    for size in sizes:
-        scores = df.loc[size]
-        ref_scores = scores.loc['MIA']
-
-        methods = scores.index.unique()
-        methods = [m for m in methods if m != 'MIA']
-
-        for method in methods:
-            m_scores = scores.loc[method]
-            idx = m_scores.notnull()
-
-            x = ref_scores[idx]
-            y = m_scores[idx]
-
-            assert not x.isnull().any()
-            assert not y.isnull().any()
-
-            w_double = wilcoxon(x=x, y=y, alternative='two-sided')
-            w_greater = wilcoxon(x=x, y=y, alternative='greater')
-            w_less = wilcoxon(x=x, y=y, alternative='less')
-
-            rows.append([size, method, w_double[0], w_double[1], w_greater[0], w_greater[1], w_less[0], w_less[1]])
-
-    W_test = pd.DataFrame(rows, columns=[
-        'size',
-        'method',
-        'two-sided_stat',
-        'two-sided_pval',
-        'greater_stat',
-        'greater_pval',
-        'less_stat',
-        'less_pval',
-        ]).set_index(['size', 'method'])
+    W_test = _wilcoxon_mia_tests(method_order, db_order)
 
     W_other = W_test[[f'{other}_stat', f'{other}_pval']]
 
@@ -391,7 +396,7 @@ def run_wilcoxon_mia(graphics_folder, csv=False, greater=True, spacing=True, no_
         tab_folder = get_tab_folder(graphics_folder)
 
         if csv:
-            W_test.to_csv(join(tab_folder, f'wilcoxon_{which}.csv'))
+            W_test.to_csv(output(join(tab_folder, f'wilcoxon_{which}.csv')))
 
         symbols = {}
 
@@ -441,15 +446,14 @@ def run_wilcoxon_mia(graphics_folder, csv=False, greater=True, spacing=True, no_
 
         print(W_test)
 
-        W_test.to_latex(join(tab_folder, f'wilcoxon_{which}.tex'), na_rep='', escape=False)#, table_env='tabularx')
+        W_test.to_latex(output(join(tab_folder, f'wilcoxon_{which}.tex')), na_rep='', escape=False)#, table_env='tabularx')
 
     return W_test
 
 
 def run_wilcoxon_linear(graphics_folder, csv=False, greater=True):
     """Wilcoxon test between trees and linear methods, pairwise."""
-    path = os.path.abspath('scores/scores.csv')
-    df = pd.read_csv(path, index_col=0)
+    df = load_scores(['scores/scores.csv'])
 
     which = 'greater' if greater else 'less'
 
@@ -578,13 +582,13 @@ def run_wilcoxon_linear(graphics_folder, csv=False, greater=True):
         tab_folder = get_tab_folder(graphics_folder)
 
         if csv:
-            W_test.to_csv(join(tab_folder, f'wilcoxon_linear_{which}.csv'))
+            W_test.to_csv(output(join(tab_folder, f'wilcoxon_linear_{which}.csv')))
 
         print(f'Apply Bonferroni correction with {W_test.shape[0]} values.')
         # print(W_test)
         # exit()
         W_test = W_test.applymap(lambda x: pvalue_formatter(x, alpha=0.05, n_bonferroni=W_test.shape[0]))
-        W_test.to_latex(join(tab_folder, f'wilcoxon_linear_{which}.tex'), na_rep='', escape=False)#, table_env='tabularx')
+        W_test.to_latex(output(join(tab_folder, f'wilcoxon_linear_{which}.tex')), na_rep='', escape=False)#, table_env='tabularx')
 
     return W_test
 
@@ -611,8 +615,7 @@ def run_friedman(graphics_folder, linear=False, csv=False, ref=None):
     #     'scores/scores_mia_100000.csv',
     #     'scores/scores_mean+mask+bagging_2500.csv',
     # ]
-    dfs = [pd.read_csv(path, index_col=0) for path in filepaths]
-    df = pd.concat(dfs, axis=0)
+    df = load_scores()
 
     # Drop tasks
     for db, task in tasks_to_drop.items():
@@ -716,12 +719,12 @@ def run_friedman(graphics_folder, linear=False, csv=False, ref=None):
     tab_name = 'friedman_linear' if linear else 'friedman'
     fig_name = 'critical_distance_linear' if linear else 'critical_distance'
 
-    plt.savefig(join(fig_folder, f'{fig_name}.pdf'), bbox_inches='tight', pad_inches=0)
+    plt.savefig(output(join(fig_folder, f'{fig_name}.pdf')), bbox_inches='tight', pad_inches=0)
 
     print(df_statistic)
 
     if csv:
-        df_statistic.to_csv(join(tab_folder, f'{tab_name}.csv'))
+        df_statistic.to_csv(output(join(tab_folder, f'{tab_name}.csv')))
 
     # Preprocessing for latex dump
     df_statistic.rename({
@@ -742,8 +745,8 @@ def run_friedman(graphics_folder, linear=False, csv=False, ref=None):
     df_statistic.rename(
         {v: f'\hphantom{{-}}{v}' for v in df_statistic.columns}, axis=1, inplace=True)
 
-    df_statistic.to_latex(join(
-        tab_folder, f'{tab_name}.tex'), na_rep='', escape=False)#, table_env='tabularx')
+    df_statistic.to_latex(output(join(
+        tab_folder, f'{tab_name}.tex')), na_rep='', escape=False)#, table_env='tabularx')
 
     return df_statistic
 
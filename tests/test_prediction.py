@@ -0,0 +1,627 @@
+"""Test the prediction helpers."""
+import os
+from itertools import count
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Parallel, delayed
+from sklearn.ensemble import BaggingRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score, roc_auc_score
+from sklearn.model_selection import StratifiedShuffleSplit
+from sklearn.pipeline import Pipeline
+
+from prediction import benchmark
+from prediction.benchmark import benchmark_inference
+from prediction.DumpHelper import DumpHelper, append_binary, read_folds
+from prediction.FoldData import FoldData
+from prediction.Manifest import Manifest
+from prediction.PlotHelper import PlotHelper
+from prediction.ResultsDB import ResultsDB
+from prediction.df_utils import get_ranks_tab, get_scores_tab
+from prediction.SplitStore import SplitStore
+from database import dbs
+from database.constants import BINARY, CONTINUE_R, ORDINAL
+from prediction.persist import align_columns, dump_model, load_model, predict_batch
+from prediction.tasks import MIMIC, tasks
+from prediction.tasks import task as task_module
+from prediction.tasks.task import TaskMeta
+from prediction.tasks.transform import Transform
+from prediction.scoring import (bootstrap_by_fold, r2_by_fold, roc_auc_by_fold,
+                                weighted_r2_by_fold, weighted_roc_auc_by_fold)
+from prediction.TimerStep import TimerStep, profile
+
+
+def test_timer_step_bagging():
+    """Test that the timers of the bagged pipelines record in the originals."""
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(50, 3))
+    X[rng.uniform(size=X.shape) < 0.2] = np.nan
+    y = rng.normal(size=50)
+
+    timer_start = TimerStep('start')
+    timer_mid = TimerStep('mid')
+    pipeline = Pipeline([
+        ('timer_start', timer_start),
+        ('imputer', SimpleImputer()),
+        ('timer_mid', timer_mid),
+        ('estimator', LinearRegression()),
+    ])
+    estimator = BaggingRegressor(pipeline, n_estimators=3, random_state=0)
+    estimator.fit(X, y)
+
+    assert len(timer_start.fit_records) == 3
+    assert len(timer_mid.fit_records) == 3
+
+    imputation = profile(timer_start.fit_records, timer_mid.fit_records)
+    assert set(imputation) == {'WCT', 'PT', 'PC', 'TT', 'RSS'}
+    assert imputation['PC'] >= 0
+
+    timer_start.reset()
+    timer_mid.reset()
+    estimator.predict(X)
+    assert len(timer_start.transform_records) == 3
+    assert profile([], []) is None
+
+
+def test_fold_data():
+    """Test the folds gathered in buffers against the ones of X.iloc."""
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.normal(size=(20, 3)), columns=['A', 'B', 'C'],
+                     index=pd.Index(np.arange(100, 120), name='id'))
+    X.iloc[[0, 2, 4], 1] = np.nan
+    y = pd.Series(rng.normal(size=20), index=X.index, name='y')
+    data = FoldData(X, y)
+
+    idx = np.array([4, 0, 7, 2])
+    X_train, y_train = data.train(idx)
+    assert np.array_equal(X_train, X.iloc[idx].to_numpy(), equal_nan=True)
+    assert np.array_equal(y_train, y.iloc[idx])
+    assert data.mv_props(X_train).equals(pd.Series([0, 0.75, 0], index=X.columns))
+
+    X_test, y_test = data.test(np.array([1, 3]))
+    assert np.array_equal(X_test, X.iloc[[1, 3]].to_numpy())
+    assert y_test.equals(y.iloc[[1, 3]])
+    assert y_test.index.name == 'id' and y_test.name == 'y'
+
+    # A later call with the same size overwrites the earlier result
+    X_train_next, _ = data.train(np.array([1, 3, 5, 6]))
+    assert np.shares_memory(X_train, X_train_next)
+    assert np.array_equal(X_train, X.iloc[[1, 3, 5, 6]].to_numpy())
+    assert data.mv_props(X_train).equals(pd.Series(0., index=X.columns))
+
+
+def test_benchmark_inference(monkeypatch):
+    """Test the calls and latencies timed by the inference benchmark."""
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(30, 2))
+    estimator = LinearRegression().fit(X, rng.normal(size=30))
+
+    # Each call of the clock advances it by one second: calls last 1 second
+    clock = count()
+    monkeypatch.setattr(benchmark, 'time', SimpleNamespace(perf_counter=lambda: float(next(clock))))
+
+    df = benchmark_inference(estimator, X, batch_sizes=[1, 10, 100], max_calls=7,
+                             max_time=1e6)
+    assert list(df.columns) == ['call', 'batch_size', 'n_calls', 'rows_per_sec',
+                                'latency_p50', 'latency_p99']
+    assert list(df['call']) == ['predict']*3
+    assert list(df['batch_size']) == [1, 10, 30]  # Batches larger than X are X
+    assert list(df['n_calls']) == [7]*3
+    assert np.allclose(df['rows_per_sec'], [1, 10, 30])
+    assert np.allclose(df['latency_p50'], 1) and np.allclose(df['latency_p99'], 1)
+
+    # Out of time: stops after min_calls
+    df = benchmark_inference(estimator, X, calls=['predict'], batch_sizes=[40],
+                             max_calls=7, min_calls=3, max_time=0)
+    assert list(df['batch_size']) == [30]
+    assert list(df['n_calls']) == [3]
+
+
+def test_persist_model(tmp_path):
+    """Test the dump and load of a model and the alignment of new rows."""
+    X = np.arange(10.).reshape(-1, 2)
+    y = np.arange(5.)
+    estimator = LinearRegression().fit(X, y)
+    filepath = str(tmp_path / 'models' / '100_fold0.joblib')
+
+    dump_model(estimator, ['A', 'C_a'], filepath, task='TB/task', fold=0)
+    payload = load_model(filepath)
+
+    assert payload['columns'] == ['A', 'C_a']
+    assert payload['infos'] == {'task': 'TB/task', 'fold': 0}
+    assert np.allclose(payload['estimator'].predict(X), estimator.predict(X))
+
+    # Category a of C is absent from the new rows: one hot column set to 0
+    X_new = pd.DataFrame({'C_b': [1, 0]})
+    with pytest.warns(UserWarning, match="missing from the rows.*'A'"):
+        X_new = align_columns(X_new, ['A', 'C_a', 'C_b'], ['A', 'C'])
+    assert list(X_new.columns) == ['A', 'C_a', 'C_b']
+    assert X_new['A'].isna().all()
+    assert (X_new['C_a'] == 0).all()
+
+
+def test_predict_batch(tmp_path, monkeypatch):
+    """Test the rows are encoded as at training whatever the chunks."""
+    rng = np.random.RandomState(0)
+    B = rng.choice(['low', 'mid', 'high', 'NA'], size=40)
+    C = rng.choice(['no', 'yes'], size=40)
+    df = pd.DataFrame({
+        'id': np.arange(40),
+        'A': rng.normal(size=40),
+        'B': B,
+        'C': C,
+        'y': (B == 'low') + 2*(B == 'mid') - (C == 'yes') + rng.normal(size=40),
+    })
+    csv_path = str(tmp_path / 'raw.csv')
+    df.to_csv(csv_path, sep=';', index=False)
+
+    meta = TaskMeta(name='raw', db='TB', df_name='raw', classif=False,
+                    predict=Transform(input_features=['y'], output_features=['y']),
+                    select=Transform(input_features=['A', 'B', 'C']),
+                    idx_column='id', encode_select='ordinal')
+    types = pd.Series({'A': CONTINUE_R, 'B': ORDINAL, 'C': BINARY})
+    monkeypatch.setitem(dbs['TB'].frame_paths, 'raw', csv_path)
+    monkeypatch.setitem(tasks.task_metas['TB'], 'raw', lambda **kwargs: meta)
+    monkeypatch.setattr(task_module, '_load_feature_types', lambda *args, **kwargs: types)
+
+    task = tasks.get('TB/raw', n_top_pvals=None)
+    X, y = task.X, task.y
+    estimator = Pipeline([('imputer', SimpleImputer()), ('estimator', LinearRegression())])
+    estimator.fit(X.to_numpy(), y)
+    model_path = str(tmp_path / 'model.joblib')
+    dump_model(estimator, X.columns, model_path, task='TB/raw', RS=0, T=0,
+               n_top_pvals=None, encodings=task.encodings)
+
+    predictions = []
+    for chunksize in [1, len(df)]:
+        out_path = str(tmp_path / f'predictions_{chunksize}.csv')
+        assert predict_batch(model_path, csv_path, out_path, chunksize=chunksize) == len(df)
+        predictions.append(pd.read_csv(out_path, index_col=0)['y_pred'])
+
+    expected = estimator.predict(X.to_numpy())
+    assert np.allclose(predictions[0], predictions[1])
+    assert np.allclose(predictions[0].loc[X.index], expected)
+
+
+class _LoadCounter:
+    """Task counting the loads of its data."""
+
+    def __init__(self, X, y, source):
+        self._X, self.y, self.loads = X, y, 0
+        self.meta = SimpleNamespace(db='DB', name='task_pvals',
+                                    source_files=lambda RS, T: [source])
+
+    @property
+    def X(self):
+        self.loads += 1
+        return self._X
+
+    def is_classif(self):
+        return True
+
+
+def test_split_store(tmp_path):
+    """Test that stored splits are the ones of the splitter and reloaded."""
+    X = pd.DataFrame({'A': np.arange(50.)}, index=pd.Index(np.arange(100, 150), name='id'))
+    y = pd.Series(np.arange(50) % 2, index=X.index)
+    source = tmp_path / 'raw.csv'
+    source.write_text('raw')
+    task = _LoadCounter(X, y, str(source))
+
+    store = SplitStore(task, RS=0, T=1, root_folder=str(tmp_path))
+    folds = store.generate([20, 45], n_splits=3, min_test_set=0.2)
+    assert list(folds) == [20]
+    assert task.loads > 0
+
+    ss = StratifiedShuffleSplit(n_splits=3, test_size=30, random_state=0)
+    for (train_idx, test_idx), (train_ref, test_ref) in zip(folds[20], ss.split(X, y)):
+        assert np.array_equal(train_idx, train_ref)
+        assert np.array_equal(test_idx, test_ref)
+
+    # Stored splits are checked without loading the task
+    task.loads = 0
+    store = SplitStore(task, RS=0, T=1, root_folder=str(tmp_path))
+    assert store.sizes() == [20]
+    folds_again = store.generate([20, 45], n_splits=3, min_test_set=0.2)
+    assert task.loads == 0
+    assert all(np.array_equal(a, b) for f, g in zip(folds[20], folds_again[20]) for a, b in zip(f, g))
+
+    # Computed again when the source files change
+    source.write_text('raw changed')
+    SplitStore(task, RS=0, T=1, root_folder=str(tmp_path)).generate([20], n_splits=3, min_test_set=0.2)
+    assert task.loads > 0
+
+    store.export_csv(20, 0, folder=str(tmp_path / 'ids'))
+    ids = pd.read_csv(tmp_path / 'ids' / 'DB-task_screening-size20-trial2-fold1-test-idx.csv')
+    assert list(ids['id']) == list(X.index[folds[20][0][1]])
+
+
+def test_append_fold(tmp_path):
+    """Test that the last dump of a fold replaces the previous ones."""
+    filepath = str(tmp_path / '100_prediction.csv')
+
+    # File dumped by a previous version, without write id
+    legacy = pd.DataFrame({'y_pred': [0., 1.], 'fold': [0, 0]})
+    legacy.to_csv(filepath)
+
+    DumpHelper._append_fold(filepath, pd.DataFrame({'y_pred': [2., 3.]}), fold=1)
+    DumpHelper._append_fold(filepath, pd.DataFrame({'y_pred': [4.]}), fold=0)
+    DumpHelper._append_fold(filepath, pd.DataFrame({'y_pred': [5.]}), fold=0)
+
+    df = read_folds(filepath, index_col=0)
+    assert list(df.columns) == ['y_pred', 'fold']
+    assert list(df['y_pred']) == [2., 3., 5.]
+    assert list(df['fold']) == [1, 1, 0]
+
+
+def test_versions(tmp_path):
+    """Test that reruns switch the method folder to new versions."""
+    X = pd.DataFrame({'A': [0.]})
+    task = SimpleNamespace(X=X, get_infos=dict,
+                           meta=SimpleNamespace(db='DB', name='task'))
+    strat = SimpleNamespace(name='Regression', get_infos=dict)
+    method_folder = tmp_path / 'DB' / 'task' / 'RS0_T0_Regression'
+
+    # Method folder dumped by a previous version
+    os.makedirs(method_folder)
+    (method_folder / '100_prediction.csv').write_text('')
+
+    folders = []
+    for _ in range(3):
+        dh = DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path),
+                        keep_versions=2)
+        folders.append(dh.strat_folder)
+        assert os.path.realpath(method_folder) == os.path.realpath(dh.strat_folder)
+        assert (method_folder / 'strat_infos.yml').exists()
+
+    versions_folder = tmp_path / 'DB' / 'task' / 'versions' / 'RS0_T0_Regression'
+    assert sorted(os.listdir(versions_folder)) == [os.path.basename(f) for f in folders[1:]]
+
+    # The processes of a run share its version, held ones are not pruned
+    held = DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path), keep_versions=1)
+    dh = DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path), keep_versions=1,
+                    run_id='run')
+    dh.dump_prediction([0.], [0.], fold=0, tag='100')
+    dh = DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path), keep_versions=1,
+                    run_id='run')
+    assert sorted(os.listdir(versions_folder)) == sorted([os.path.basename(held.strat_folder), 'run'])
+    assert os.path.realpath(method_folder) == os.path.realpath(dh.strat_folder)
+    assert 'DB/task/RS0_T0_Regression/100_prediction.csv' in Manifest(str(tmp_path)).paths()
+
+    del held
+    DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path), keep_versions=1, run_id='run')
+    assert os.listdir(versions_folder) == ['run']
+
+
+def test_manifest(tmp_path):
+    """Test that the manifest lists the latest files of the methods."""
+    method_folder = tmp_path / 'DB' / 'task' / 'RS0_T2_Regression'
+    os.makedirs(method_folder)
+    (method_folder / 'strat_infos.yml').write_text('')
+    (method_folder / '100_prediction.csv').write_text('')
+
+    # Built by walking the folder when missing
+    manifest = Manifest(str(tmp_path))
+    assert sorted(manifest.paths()) == ['DB/task/RS0_T2_Regression/100_prediction.csv',
+                                        'DB/task/RS0_T2_Regression/strat_infos.yml']
+
+    manifest.reset('DB', 'task', 'RS0_T2_Regression')
+    manifest.add('DB', 'task', 'RS0_T2_Regression', '200_times.csv', 1.)
+    manifest.add('DB', 'task', 'RS0_T2_Regression', '200_times.csv', 2.)
+
+    df = Manifest(str(tmp_path)).load()
+    assert df.shape[0] == 1
+    assert df.iloc[0].to_dict() == {'db': 'DB', 'task': 'task', 'method': 'RS0_T2_Regression',
+                                    'filename': '200_times.csv', 'size': '200',
+                                    'trial': '2', 'mtime': 2.}
+
+
+def _dump_method(root, name):
+    task = SimpleNamespace(X=pd.DataFrame({'A': [0.]}), get_infos=lambda: {'X.shape': '(10, 1)'},
+                           meta=SimpleNamespace(db='DB', name='task_pvals'))
+    strat = SimpleNamespace(name=name, get_infos=lambda: {'classification': False})
+    dh = DumpHelper(task, strat, RS=0, T=0, results_folder=root)
+    for fold in range(2):
+        y_true = np.arange(10.)
+        dh.dump_prediction(y_true + fold, y_true, fold=fold, tag='100')
+        dh.dump_times(1., 2., 1., 2., fold=fold, tag='100')
+
+
+def test_dump_scores_cache(tmp_path, monkeypatch):
+    """Test that the scores of unchanged methods are not computed again."""
+    root = str(tmp_path / 'results')
+    filepath = str(tmp_path / 'scores.csv')
+    _dump_method(root, 'Regression')
+
+    computed = []
+    dump_rows = PlotHelper._dump_rows
+
+    def spy(self, db, t, m, size):
+        computed.append(m)
+        return dump_rows(self, db, t, m, size)
+
+    monkeypatch.setattr(PlotHelper, '_dump_rows', spy)
+
+    PlotHelper(root).dump(filepath)
+    _dump_method(root, 'Regression_imputed_Mean')
+    PlotHelper(root).dump(filepath)
+
+    assert computed == ['RS0_T0_Regression', 'RS0_T0_Regression_imputed_Mean']
+    df = pd.read_csv(filepath, index_col=0)
+    assert list(df['method'].fillna('')) == ['', '', '_imputed_Mean', '_imputed_Mean']
+    assert np.allclose(df['score'], [1., 1 - 10/82.5] * 2)
+
+
+def test_reference_score(tmp_path, monkeypatch):
+    """Test that the reference scores are computed lazily, once."""
+    root = str(tmp_path / 'results')
+    filepath = str(tmp_path / 'scores.csv')
+    _dump_method(root, 'Regression')
+    _dump_method(root, 'Regression_imputed_Mean')
+
+    calls = []
+    score = PlotHelper.score
+    monkeypatch.setattr(PlotHelper, 'score', lambda self, *args, **kwargs: calls.append(args) or score(self, *args, **kwargs))
+
+    ph = PlotHelper(root, rename={'': 'MIA'}, reference_method='MIA', scores_filepath=filepath)
+    assert calls == []
+    assert ph.reference_score('DB', 'task_pvals', 100) == (1 - 5/82.5, 'r2_score')
+    assert ph.reference_score('DB', 'task_pvals', '100') == (1 - 5/82.5, 'r2_score')
+    assert len(calls) == 1
+
+    # Read from the aggregated scores once dumped
+    ph.dump(filepath)
+    ph = PlotHelper(root, rename={'': 'MIA'}, reference_method='_imputed_Mean', scores_filepath=filepath)
+    calls.clear()
+    score, scorer = ph.reference_score('DB', 'task_pvals', 100)
+    assert np.isclose(score, 1 - 5/82.5) and scorer == 'r2_score'
+    assert calls == []
+
+
+def test_mimic_labels(tmp_path, monkeypatch):
+    """Test the positives are cached until the diagnoses change."""
+    patients = str(tmp_path / 'PATIENTS.csv')
+    diagnoses = str(tmp_path / 'DIAGNOSES_ICD.csv')
+    pd.DataFrame({'SUBJECT_ID': [1, 2, 3, 4]}).to_csv(patients)
+    pd.DataFrame({'SUBJECT_ID': [1, 2, 2, 5], 'ICD9_CODE': ['78552', '9584', '78552', '78552']}).to_csv(diagnoses)
+    monkeypatch.setattr(MIMIC, 'LABELS_CACHE_FOLDER', str(tmp_path / 'labels'))
+    monkeypatch.setitem(MIMIC.MIMIC.frame_paths, 'patients', patients)
+    monkeypatch.setitem(MIMIC.MIMIC.frame_paths, 'diagnoses_icd', diagnoses)
+
+    df = pd.DataFrame(index=pd.Index([1, 2, 3, 4]))
+    assert list(MIMIC.define_y(df, MIMIC.SEPTIC_SHOCK_CODES)['y']) == [1, 1, 0, 0]
+    assert list(MIMIC.define_y(df, MIMIC.HEMO_SHOCK_CODES)['y']) == [0, 1, 0, 0]
+    assert len(os.listdir(tmp_path / 'labels')) == 2
+
+    MIMIC._load_positives.cache_clear()
+    with monkeypatch.context() as m:
+        m.setattr(pd, 'read_csv', None)  # Read from the cache
+        assert list(MIMIC.get_positives(MIMIC.SEPTIC_SHOCK_CODES)) == [1, 2]
+
+    pd.DataFrame({'SUBJECT_ID': [3], 'ICD9_CODE': ['78552']}).to_csv(diagnoses)
+    assert list(MIMIC.get_positives(MIMIC.SEPTIC_SHOCK_CODES)) == [3]
+
+
+def test_scores_by_fold():
+    """Test the vectorized scores against the ones of scikit-learn."""
+    rng = np.random.RandomState(0)
+    folds = rng.randint(0, 4, size=500)
+    y_true = rng.randint(0, 2, size=500)
+    y_score = np.round(rng.uniform(size=500), 1)  # With ties
+
+    unique_folds, scores = roc_auc_by_fold(folds, y_true, y_score)
+    assert list(unique_folds) == [0, 1, 2, 3]
+    for fold, score in zip(unique_folds, scores):
+        mask = folds == fold
+        assert np.isclose(score, roc_auc_score(y_true[mask], y_score[mask]))
+
+    y_pred = y_true + rng.normal(size=500)
+    _, scores = r2_by_fold(folds, y_true, y_pred)
+    for fold, score in zip(unique_folds, scores):
+        mask = folds == fold
+        assert np.isclose(score, r2_score(y_true[mask], y_pred[mask]))
+
+
+def test_bootstrap_by_fold():
+    """Test the resamples scored at once against a loop on the resamples."""
+    rng = np.random.RandomState(0)
+    folds = rng.randint(0, 3, size=300)
+    y_true = rng.randint(0, 2, size=300)
+    y_score = np.round(rng.uniform(size=300), 1)  # With ties
+    weights = rng.randint(0, 3, size=(5, 300))
+
+    _, scores = weighted_roc_auc_by_fold(folds, y_true, y_score, weights)
+    y_pred = y_true + rng.normal(size=300)
+    _, r2_scores = weighted_r2_by_fold(folds, y_true, y_pred, weights)
+    for w, s, r2 in zip(weights, scores, r2_scores):
+        for fold in range(3):
+            mask = folds == fold
+            assert np.isclose(s[fold], roc_auc_score(y_true[mask], y_score[mask], sample_weight=w[mask]))
+            assert np.isclose(r2[fold], r2_score(y_true[mask], y_pred[mask], sample_weight=w[mask]))
+
+    # Resamples of the rows of each fold, drawn as in bootstrap_by_fold
+    means = bootstrap_by_fold('roc_auc_score', folds, y_true, y_score,
+                              n_bootstrap=20, random_state=0, max_values=1000)
+    rng = np.random.default_rng(0)
+    for b in range(20):
+        if b % 3 == 0:  # Blocks of 3 resamples
+            rows = [np.flatnonzero(folds == fold) for fold in range(3)]
+            draws = [idx[rng.integers(0, idx.shape[0], size=(min(3, 20 - b), idx.shape[0]))]
+                     for idx in rows]
+        resample = [d[b % 3] for d in draws]
+        expected = np.mean([roc_auc_score(y_true[idx], y_score[idx]) for idx in resample])
+        assert np.isclose(means[b], expected)
+
+    # A single trial is the same as no trials, and trials are resampled together
+    same = bootstrap_by_fold('roc_auc_score', folds, y_true, y_score, n_bootstrap=20,
+                             random_state=0, max_values=1000, trials=np.zeros(300))
+    assert np.allclose(same, means)
+    trials = np.where(np.arange(300) % 2, 7, 3)
+    pooled = bootstrap_by_fold('roc_auc_score', folds, y_true, y_score, n_bootstrap=20,
+                               random_state=0, trials=trials)
+
+    # The rows of each fold of each trial are resampled, in one block here
+    rng = np.random.default_rng(0)
+    rows = {(t, f): np.flatnonzero((trials == t) & (folds == f)) for t in [3, 7] for f in range(3)}
+    draws = {k: idx[rng.integers(0, idx.shape[0], size=(20, idx.shape[0]))] for k, idx in rows.items()}
+    for b in range(20):
+        w = np.bincount(np.concatenate([d[b] for d in draws.values()]), minlength=300)
+        expected = np.mean([
+            np.mean([roc_auc_score(y_true[rows[t, f]], y_score[rows[t, f]], sample_weight=w[rows[t, f]])
+                     for f in range(3)])
+            for t in [3, 7]])
+        assert np.isclose(pooled[b], expected)
+
+
+def test_binary_folds(tmp_path):
+    """Test that binary dumps are read as the csv ones."""
+    filepath = str(tmp_path / '100_probas.csv')
+    index = pd.Index(['a', 'b'], name='id')
+
+    append_binary(f'{filepath[:-4]}.npy.gz', pd.DataFrame({'y_true': [0, 1], 'proba_1': [.1, .8]}, index=index), fold=0)
+    append_binary(f'{filepath[:-4]}.npy.gz', pd.DataFrame({'y_true': [1], 'proba_1': [.3]}, index=index[:1]), fold=1)
+    append_binary(f'{filepath[:-4]}.npy.gz', pd.DataFrame({'y_true': [1, 0], 'proba_1': [.6, .2]}, index=index), fold=0)
+
+    df = read_folds(filepath, index_col=0)
+    assert df.index.name == 'id'
+    assert list(df.index) == ['a', 'a', 'b']
+    assert list(df.columns) == ['y_true', 'proba_1', 'fold']
+    assert np.allclose(df['proba_1'], [.3, .6, .2])
+    assert list(df['fold']) == [1, 0, 0]
+
+
+def _dump_fold(root, fold):
+    task = SimpleNamespace(X=pd.DataFrame({'A': [0.]}), get_infos=lambda: {'X.shape': '(50, 1)'},
+                           meta=SimpleNamespace(db='DB', name='task_pvals'))
+    strat = SimpleNamespace(name='Regression', get_infos=lambda: {'classification': False})
+    dh = DumpHelper(task, strat, RS=0, T=0, results_folder=root, binary=True,
+                    keep_versions=1, run_id='run')
+    y_true = np.arange(50.)
+    for _ in range(2):  # The last dump of a fold is read
+        dh.dump_prediction(y_true + fold, y_true, fold=fold, tag='100')
+        dh.dump_times(fold, 1., 1., 1., fold=fold, tag='100')
+        dh.dump_best_params({'fold': fold}, fold=fold)
+
+
+def test_concurrent_dumps(tmp_path):
+    """Test that processes dumping the folds of a run do not lose any."""
+    root = str(tmp_path / 'results')
+
+    # Method folder dumped by a previous version, moved aside by the run
+    method_folder = os.path.join(root, 'DB', 'task_pvals', 'RS0_T0_Regression')
+    os.makedirs(method_folder)
+    pd.DataFrame({'y_pred': [-1.], 'fold': [-1]}).to_csv(os.path.join(method_folder, '100_times.csv'))
+
+    # A previous run, pruned by the workers of the new one
+    DumpHelper(SimpleNamespace(X=pd.DataFrame({'A': [0.]}), get_infos=dict,
+                               meta=SimpleNamespace(db='DB', name='task_pvals')),
+               SimpleNamespace(name='Regression', get_infos=dict), RS=0, T=0,
+               results_folder=root, run_id='previous')
+
+    # Each worker dumps its own fold
+    Parallel(n_jobs=4)(delayed(_dump_fold)(root, fold) for fold in range(8))
+
+    versions = os.listdir(os.path.join(root, 'DB', 'task_pvals', 'versions', 'RS0_T0_Regression'))
+    assert versions == ['run']
+
+    ph = PlotHelper(root)
+    assert ph.methods('DB', 'task_pvals') == ['RS0_T0_Regression']
+    scores, _ = ph.score('DB', 'task_pvals', 'RS0_T0_Regression', '100')
+    assert sorted(scores) == list(range(8))
+    assert np.allclose([scores[fold] for fold in range(8)],
+                       [1 - 50*fold**2/10412.5 for fold in range(8)])
+
+    times = ph._read_csv('DB', 'task_pvals', 'RS0_T0_Regression', '100_times.csv')
+    assert sorted(times['fold']) == list(range(8))
+    assert list(times.sort_values('fold')['imputation_WCT']) == list(range(8))
+
+    best_params = DumpHelper._load_content(os.path.join(method_folder, 'best_params.yml'))
+    assert best_params == {fold: {'fold': fold} for fold in range(8)}
+
+
+def _write_folds(filepath, method):
+    store = ResultsDB(filepath)
+    for fold in range(5):
+        df = pd.DataFrame({'y_pred': [fold, fold+1.], 'y_true': [0, 1]})
+        store.put_frame('prediction', 'DB', 'task', method, '100', 0, fold, df)
+    store.close()
+
+
+def test_results_db(tmp_path):
+    """Test concurrent writes and reads of the SQLite results store."""
+    filepath = str(tmp_path / 'results.sqlite')
+    methods = [f'RS0_T0_Method{i}' for i in range(8)]
+    Parallel(n_jobs=4)(delayed(_write_folds)(filepath, m) for m in methods)
+
+    store = ResultsDB(filepath)
+    store.put_infos('DB', 'task', methods[0], 'strat_infos', {'classification': False})
+    assert store.get_infos('DB', 'task', methods[0], 'strat_infos') == {'classification': False}
+
+    for m in methods:
+        df = store.get_frame('prediction', 'DB', 'task', m, '100')
+        assert list(df['fold']) == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+        assert list(df['y_pred']) == [0, 1, 1, 2, 2, 3, 3, 4, 4, 5]
+
+    # Fold dumped again replaces the previous one
+    df = pd.DataFrame({'y_pred': [9.], 'y_true': [1]})
+    store.put_frame('prediction', 'DB', 'task', methods[0], '100', 0, 2, df)
+    df = store.get_frame('prediction', 'DB', 'task', methods[0], '100')
+    assert list(df.loc[df['fold'] == 2, 'y_pred']) == [9.]
+
+    assert 'DB/task/RS0_T0_Method0/100_prediction.csv' in store.listing()
+
+    # A rerun with fewer folds discards the previous one, its processes share it
+    task = SimpleNamespace(X=pd.DataFrame({'A': [0.]}), get_infos=dict,
+                           meta=SimpleNamespace(db='DB', name='task'))
+    strat = SimpleNamespace(name='Method0', get_infos=dict)
+    for fold in range(2):
+        dh = DumpHelper(task, strat, RS=0, T=0, results_folder=str(tmp_path),
+                        backend='sqlite', run_id='rerun')
+        dh.dump_prediction([fold], [0], fold=fold, tag='100')
+    df = dh.store.get_frame('prediction', 'DB', 'task', methods[0], '100')
+    assert list(df['fold']) == [0, 1]
+    assert store.get_infos('DB', 'task', methods[0], 'strat_infos') == {'n_bagging': None}
+    assert store.get_frame('prediction', 'DB', 'task', methods[1], '100').shape[0] == 10
+
+
+def test_scores_tab():
+    """Test the tables of scores and ranks add the methods without scores."""
+    scores = pd.DataFrame({
+        'size': [100, 100, 100, 100, 200],
+        'db': 'DB',
+        'task': 'task',
+        'method': ['A', 'A', 'B', 'B', 'A'],
+        'trial': 0,
+        'fold': [0, 1, 0, 1, 0],
+        'score': [0.5, 0.7, -0.3, -0.1, 0.9],
+        'scorer': 'r2_score',
+        'selection': 'manual',
+        'n': 1000,
+        'p': 10,
+        'type': 'Regression',
+        'imputation_WCT': 0.,
+        'tuning_WCT': 0.,
+        'imputation_PT': 0.,
+        'tuning_PT': 0.,
+    })
+
+    tab = get_scores_tab(scores, method_order=['A', 'B'])
+    assert list(tab[('DB', 'task')].fillna('')) == [
+        '+0.60', '-0.20', '\\hphantom{-}0.20', '+0.90', '',
+        '\\hphantom{-}0.90', '\\hphantom{-}0.55']
+
+    # One interval per method and size, repeated on its rows
+    scores['score_ci_low'] = [0.5, 0.5, -0.3, -0.3, 0.8]
+    scores['score_ci_high'] = [0.7, 0.7, -0.1, -0.1, 1.0]
+    tab = get_scores_tab(scores, method_order=['A', 'B'], average_sizes=False, ci=True)
+    assert list(tab[('DB', 'task')].fillna('')) == [
+        '+0.60 [0.50, 0.70]', '-0.20 [-0.30, -0.10]', '+0.90 [0.80, 1.00]', '']
+
+    ranks = get_ranks_tab(scores, method_order=['A', 'B'], average_on_dbs=False)
+    assert list(ranks[('DB', 'task')].iloc[:4].fillna('')) == ['1', '2', '1', '']
+    assert list(ranks[('DB', 'task')].iloc[4:]) == [1., 2.]
+
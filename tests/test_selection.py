@@ -0,0 +1,43 @@
+"""Test the ANOVA feature selection."""
+import numpy as np
+import pandas as pd
+from sklearn.feature_selection import f_classif, f_regression
+
+from database.constants import CATEGORICAL, CONTINUE_R, ORDINAL, NOT_A_FEATURE
+from selection import anova_pvals
+
+
+def test_anova_pvals():
+    """Test the p-values against f_classif and f_regression on each feature."""
+    rng = np.random.RandomState(0)
+    n = 300
+    X = pd.DataFrame(rng.normal(size=(n, 4)), columns=['A', 'B', 'C', 'D'])
+    X[rng.uniform(size=X.shape) < 0.3] = np.nan
+    X['B'] = X['B'].round()
+    X.loc[:296, 'D'] = np.nan  # Too few values
+    X['E'] = rng.choice([1, 2, np.nan], size=n)
+    X['F'] = rng.choice(['a', 'b', 'c'], size=n)
+    X['id'] = np.arange(n)
+    types = pd.Series({'A': CONTINUE_R, 'B': ORDINAL, 'C': CONTINUE_R,
+                       'D': CONTINUE_R, 'E': CATEGORICAL, 'F': CATEGORICAL,
+                       'id': NOT_A_FEATURE})
+
+    for classif, y, f_callable in [
+        (True, rng.randint(0, 3, size=n), f_classif),
+        (False, rng.normal(size=n), f_regression),
+    ]:
+        y = y + (classif or X['A'].fillna(0))
+        pvals = anova_pvals(X, y, types, classif=classif, max_values=2*n)
+
+        assert list(pvals.index) == ['A', 'B', 'C', 'D', 'E_1.0', 'E_2.0',
+                                     'E_nan', 'F_a', 'F_b', 'F_c']
+        for f in ['A', 'B', 'C']:
+            idx = X[f].notna()
+            _, expected = f_callable(X.loc[idx, [f]], y[idx])
+            assert np.isclose(pvals[f], expected[0])
+        assert np.isnan(pvals['D'])
+
+        for f, value in [('E_1.0', 1), ('E_nan', np.nan), ('F_b', 'b')]:
+            x = X[[f[0]]].isin([value]) | (X[[f[0]]].isna() & pd.isna(value))
+            _, expected = f_callable(x.astype(float), y)
+            assert np.isclose(pvals[f], expected[0])
@@ -1,8 +1,20 @@
 """Test the statistics computation."""
+import os
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
 import numpy as np
 import pandas as pd
+from joblib import Memory
+from prediction.DumpHelper import DumpHelper
 
-from statistics.statistics import get_indicators_mv, compute_correlation
+from statistics.build import build
+from statistics.common import load_scores, output
+from statistics.importance import load_importances
+from statistics import statistics
+from statistics.statistics import (get_indicators_mv, compute_correlation,
+                                   reduce_cache)
 
 
 mv = pd.DataFrame({
@@ -132,10 +144,153 @@ def test_indicators():
     assert df.at[0, 'f_v_lost_mv_1a2'] == 10
 
 
+def test_indicators_chunks():
+    """Test the indicators computed by chunks of rows are the same."""
+    indicators = get_indicators_mv(mv)
+
+    for chunksize in [1, 3]:
+        chunked = get_indicators_mv(mv, chunksize=chunksize)
+        for key, df in indicators.items():
+            pd.testing.assert_frame_equal(df, chunked[key])
+
+    chunks = (mv.iloc[i:i+2] for i in range(0, mv.shape[0], 2))
+    chunked = get_indicators_mv(chunks)
+    for key, df in indicators.items():
+        pd.testing.assert_frame_equal(df, chunked[key])
+
+
 def test_correlation():
     np.random.seed(0)
     X = np.random.uniform(-100, 100, size=(10000, 100))
-    R1 = compute_correlation(X.T)
+    R1, N = compute_correlation(X.T)
     R2 = np.corrcoef(X.T)
 
     assert np.isclose(R1, R2).all()
+    assert (N == 10000).all()
+
+
+def test_correlation_missing_values():
+    """Test the pairwise-complete correlations against a loop on the pairs."""
+    np.random.seed(0)
+    X = np.random.normal(size=(8, 500))*10 + 50
+    X[np.random.uniform(size=X.shape) < 0.4] = np.nan
+    X[0, :] = 1  # Constant feature
+    X[1, 2:] = np.nan  # Too few values
+    R, N = compute_correlation(X, block_size=64)
+
+    for i in range(8):
+        for j in range(8):
+            idx = ~np.isnan(X[i]) & ~np.isnan(X[j])
+            assert N[i, j] == idx.sum()
+            if i in [0, 1] or j in [0, 1]:
+                assert np.isnan(R[i, j])
+            else:
+                assert np.isclose(R[i, j], np.corrcoef(X[i, idx], X[j, idx])[0, 1])
+
+
+def test_reduce_cache(tmpdir):
+    """Test the least recently used results are evicted from the cache."""
+    memory = Memory(str(tmpdir), verbose=0)
+    f = memory.cache(np.ones)
+
+    now = time.time()
+    for i in range(4):
+        f(1000*(i+1))
+    for item in memory.store_backend.get_items():
+        # Accessed i days ago for the array of 1000*(i+1) values
+        i = os.path.getsize(os.path.join(item.path, 'output.pkl'))//8000 - 1
+        t = now - i*24*3600
+        os.utime(os.path.join(item.path, 'output.pkl'), (t, t))
+
+    def sizes():
+        return sorted(item.size//8000 for item in memory.store_backend.get_items())
+
+    reduce_cache(memory, max_bytes=None, max_age=timedelta(days=2.5))
+    assert sizes() == [1, 2, 3]
+
+    reduce_cache(memory, max_bytes=8000*3.5, max_age=None)
+    assert sizes() == [1, 2]
+
+
+def test_build_cache(tmpdir):
+    """Test a target is built again only when its scores or output change."""
+    graphics_folder = str(tmpdir.mkdir('graphics'))
+    path = str(tmpdir.join('scores.csv'))
+    out_path = os.path.join(graphics_folder, 'tab.csv')
+    pd.DataFrame({'score': [0.5, 0.7]}).to_csv(path)
+    calls = []
+
+    def run_target(graphics_folder):
+        calls.append(load_scores([path]))
+        calls[-1].to_csv(output(out_path))
+
+    def run():
+        build(graphics_folder, 'target', run_target,
+              {'graphics_folder': graphics_folder})
+
+    run()
+    run()
+    assert len(calls) == 1
+
+    os.utime(path)  # Same content
+    run()
+    assert len(calls) == 1
+
+    pd.DataFrame({'score': [0.5, 0.8]}).to_csv(path)
+    run()
+    assert len(calls) == 2
+
+    build(graphics_folder, 'target', run_target,
+          {'graphics_folder': graphics_folder}, force=True)
+    assert len(calls) == 3
+
+    os.remove(out_path)
+    run()
+    assert len(calls) == 4
+    run()
+    assert len(calls) == 4
+
+
+def test_load_importances(tmpdir):
+    """Test the importances are averaged over the repeats and the folds."""
+    folder = tmpdir.mkdir('TB').mkdir('death_pvals').mkdir('RS0_T0_MIA')
+    for fold in range(2):
+        importances = pd.DataFrame({'a': [1., 3.], 'b': [fold, fold]})
+        importances.index.rename('repeat', inplace=True)
+        DumpHelper._append_fold(str(folder.join('100_importances.csv')),
+                                importances, fold=fold)
+        mv_props = pd.DataFrame({'a': [0.5*fold], 'b': [0.1]}, index=[fold])
+        DumpHelper._append_fold(str(folder.join('100_mv_props.csv')),
+                                mv_props, fold=fold)
+
+    df = load_importances(str(tmpdir), 100, average_folds=True)
+    df = df.set_index('feature', append=True)
+    df = df.loc[('TB/death\\_screening', '0')]
+
+    assert list(df['importance_abs']) == [2., 0.5]
+    assert list(df['mv_prop']) == [0.25, 0.1]
+    assert list(df['importance_ref']) == [1.25, 1.25]
+    assert (df['db'] == 'Traumabase').all()
+
+    df = load_importances(str(tmpdir), 100, average_folds=False)
+    assert df.shape[0] == 4
+
+
+def test_load_task_shared(monkeypatch, tmpdir):
+    """Test that the statistics of a task load it once."""
+    source = tmpdir.join('raw.csv')
+    source.write('raw')
+    task = SimpleNamespace(mv=mv, meta=SimpleNamespace(source_files=lambda RS, T: [str(source)]))
+    calls = []
+    monkeypatch.setattr(statistics, 'tasks', SimpleNamespace(get=lambda *args, **kwargs: calls.append(args) or task))
+    monkeypatch.setattr(statistics, 'reduce_cache', lambda: None)
+    monkeypatch.setattr(statistics, 'memory', Memory(str(tmpdir), verbose=0))
+    monkeypatch.setattr(statistics, '_cached_indicators',
+                        statistics.memory.cache(statistics._cached_indicators.func))
+    statistics._load_task.cache_clear()
+
+    # Fingerprint and indicators of a task without pvals, as types and correlation
+    indicators = statistics.cached_indicators('DB/task')
+    assert indicators['global'].equals(get_indicators_mv(mv)['global'])
+    statistics._fingerprint('DB/task', T=0)
+    assert len(calls) == 1
@@ -1,9 +1,9 @@
 """Helper to knwo what strategies and tasks are availables."""
-from prediction.tasks import tasks
-from prediction.strategies import strategies
 
 
 def strategies_available():
+    from prediction.strategies import strategies
+
     print('\nModels available:')
     for i, name in enumerate(strategies.keys()):
         print(f'\t{i}: '+name)
@@ -11,6 +11,8 @@ def strategies_available():
 
 
 def tasks_available():
+    from prediction.tasks import tasks
+
     print('\nTasks available:')
     for name in tasks.keys():
         print('\t'+name)